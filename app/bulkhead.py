@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from fastapi import HTTPException
+
+
+# Geração de roadmap pode ficar presa na Groq por dezenas de segundos: roda num pool próprio,
+# e o threadpool padrão (CRUD, auth) nunca fica sem threads por causa dela
+ROADMAP_MAX_CONCORRENCIA = int(os.getenv("ROADMAP_MAX_CONCORRENCIA", "8"))
+ROADMAP_MAX_FILA = int(os.getenv("ROADMAP_MAX_FILA", "32"))
+# Tempo máximo esperando uma thread livre; depois disso a requisição recebe 503
+ROADMAP_ESPERA_SEGUNDOS = float(os.getenv("ROADMAP_ESPERA_SEGUNDOS", "5"))
+# Tamanho do threadpool padrão do anyio (rotas síncronas); vazio = padrão do anyio (40)
+THREADPOOL_PADRAO = os.getenv("THREADPOOL_PADRAO")
+
+
+class Bulkhead:
+    """
+    Executor limitado com fila limitada. Quem encontra a fila cheia é recusado na hora;
+    quem espera mais que `espera` por uma thread é recusado sem chegar a executar.
+    """
+
+    def __init__(self, nome: str, max_concorrencia: int, max_fila: int, espera: float):
+        self.nome = nome
+        self.max_concorrencia = max_concorrencia
+        self.max_fila = max_fila
+        self.espera = espera
+        self._executor = ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix=f"bulkhead-{nome}")
+        self._lock = threading.Lock()
+        self._em_execucao = 0
+        self._na_fila = 0
+        self._stats = {"concluidas": 0, "rejeitadas_fila_cheia": 0, "rejeitadas_espera": 0}
+        self._espera_total = 0.0
+
+    async def executar(self, func: Callable, *args):
+        with self._lock:
+            if self._em_execucao + self._na_fila >= self.max_concorrencia + self.max_fila:
+                self._stats["rejeitadas_fila_cheia"] += 1
+                raise self._recusa()
+            self._na_fila += 1
+
+        # Propaga os contextvars (span do tracing, profiler) para a thread do pool
+        contexto = contextvars.copy_context()
+        enfileirada = time.perf_counter()
+        futuro = self._executor.submit(contexto.run, self._rodar, enfileirada, func, *args)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), self.espera)
+        except asyncio.TimeoutError:
+            # Ainda na fila: sai dela sem executar. Já começou: espera terminar normalmente
+            if futuro.cancel():
+                with self._lock:
+                    self._na_fila -= 1
+                    self._stats["rejeitadas_espera"] += 1
+                raise self._recusa()
+            return await asyncio.wrap_future(futuro)
+        except asyncio.CancelledError:
+            # Cliente desconectou: se ainda não começou, não ocupa uma thread à toa
+            if futuro.cancel():
+                with self._lock:
+                    self._na_fila -= 1
+            raise
+
+    def _rodar(self, enfileirada: float, func: Callable, *args):
+        with self._lock:
+            self._na_fila -= 1
+            self._em_execucao += 1
+            self._espera_total += time.perf_counter() - enfileirada
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._em_execucao -= 1
+                self._stats["concluidas"] += 1
+
+    def _recusa(self) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail="Serviço de roadmap sobrecarregado. Tente novamente em instantes.",
+            headers={"Retry-After": str(max(1, round(self.espera)))},
+        )
+
+    def metricas(self) -> Dict[str, float]:
+        with self._lock:
+            iniciadas = self._stats["concluidas"] + self._em_execucao
+            return {
+                **self._stats,
+                "max_concorrencia": self.max_concorrencia,
+                "max_fila": self.max_fila,
+                "em_execucao": self._em_execucao,
+                "na_fila": self._na_fila,
+                "saturacao": round(self._em_execucao / self.max_concorrencia, 4),
+                "espera_media_ms": round(self._espera_total / iniciadas * 1000, 2) if iniciadas else 0.0,
+            }
+
+
+bulkhead_roadmap = Bulkhead("roadmap", ROADMAP_MAX_CONCORRENCIA, ROADMAP_MAX_FILA, ROADMAP_ESPERA_SEGUNDOS)
+
+
+def configurar_threadpool_padrao() -> None:
+    # Precisa rodar dentro do event loop (lifespan): o limiter é por loop
+    if THREADPOOL_PADRAO:
+        from anyio import to_thread
+
+        to_thread.current_default_thread_limiter().total_tokens = int(THREADPOOL_PADRAO)
+
+
+def metricas_threadpool_padrao() -> Dict[str, float]:
+    from anyio import to_thread
+
+    limiter = to_thread.current_default_thread_limiter()
+    estatisticas = limiter.statistics()
+    return {
+        "max_concorrencia": limiter.total_tokens,
+        "em_execucao": estatisticas.borrowed_tokens,
+        "na_fila": estatisticas.tasks_waiting,
+        "saturacao": round(estatisticas.borrowed_tokens / limiter.total_tokens, 4),
+    }
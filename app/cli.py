@@ -0,0 +1,113 @@
+import argparse
+import time
+
+from app.models.database import SessionLocal, create_tables
+from app.models.sharding import obter_roteador
+from app.schemas.pydantic import PurgeRequest
+from app.services.analytics import recalcular_agregados
+from app.services.service import Service
+
+
+def cmd_recalcular_analytics(args) -> None:
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        linhas = recalcular_agregados(db)
+    finally:
+        db.close()
+
+    print(f"Agregados recalculados: {linhas} linhas em {time.perf_counter() - inicio:.2f}s")
+
+
+def cmd_purge_usuarios(args) -> None:
+    dados = PurgeRequest(
+        ids=[int(i) for i in args.ids.split(",")] if args.ids else None,
+        currentProfession=args.profissao,
+        experienceLevel=args.nivel,
+        emailDomain=args.dominio,
+        batchSize=args.lote,
+    )
+
+    db = SessionLocal()
+    try:
+        resultado = Service.purge_users(dados, db)
+    finally:
+        db.close()
+
+    print(
+        f"Usuários removidos: {resultado.usersDeleted} | linhas removidas: {resultado.rowsDeleted} "
+        f"| {resultado.seconds:.2f}s ({resultado.rowsPerSecond:.0f} linhas/s)"
+    )
+
+
+def cmd_rebalancear_shards(args) -> None:
+    from app.services.rebalanceamento import planejar, rebalancear
+
+    roteador = obter_roteador()
+    if roteador is None:
+        raise SystemExit("SHARD_URLS não configurado: não há shards para rebalancear")
+
+    if args.simular:
+        plano = planejar(roteador)
+        print(f"Usuários a mover: {len(plano)}")
+        for user_id, destino in sorted(plano.items())[:args.limite]:
+            print(f"  {user_id} -> shard {destino}")
+        return
+
+    inicio = time.perf_counter()
+    movidos = rebalancear(roteador, limite=args.limite)
+    print(f"Usuários movidos: {len(movidos)} em {time.perf_counter() - inicio:.2f}s")
+
+
+def cmd_indexar_pares(args) -> None:
+    from app.services.pares import indexar_usuarios
+
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        total = indexar_usuarios(db)
+    finally:
+        db.close()
+
+    print(f"Perfis indexados: {total} em {time.perf_counter() - inicio:.2f}s")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Tarefas de manutenção da ReSkill API")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    recalcular = subparsers.add_parser(
+        "recalcular-analytics",
+        help="Reconstrói os agregados de progresso a partir do StatusStep (rodar diariamente via cron)"
+    )
+    recalcular.set_defaults(func=cmd_recalcular_analytics)
+
+    purge = subparsers.add_parser("purge-usuarios", help="Remove usuários em lote por ids ou filtro")
+    purge.add_argument("--ids", help="Lista de ids separados por vírgula")
+    purge.add_argument("--profissao")
+    purge.add_argument("--nivel")
+    purge.add_argument("--dominio", help="Domínio do email, ex.: empresa.com")
+    purge.add_argument("--lote", type=int, default=500)
+    purge.set_defaults(func=cmd_purge_usuarios)
+
+    rebalancear = subparsers.add_parser(
+        "rebalancear-shards",
+        help="Move usuários para o shard id %% N depois de mudar SHARD_URLS (ex.: ao adicionar um shard)"
+    )
+    rebalancear.add_argument("--limite", type=int, help="Máximo de usuários movidos nesta execução")
+    rebalancear.add_argument("--simular", action="store_true", help="Só mostra o plano, sem mover nada")
+    rebalancear.set_defaults(func=cmd_rebalancear_shards)
+
+    indexar = subparsers.add_parser(
+        "indexar-pares",
+        help="Reconstrói a matriz de perfis usada em GET /users/{id}/peers (requer numpy)"
+    )
+    indexar.set_defaults(func=cmd_indexar_pares)
+
+    args = parser.parse_args(argv)
+    create_tables()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Abaixo disso o custo de CPU e os headers extras não compensam os bytes economizados
+COMPRESSAO_MINIMO_BYTES = int(os.getenv("COMPRESSAO_MINIMO_BYTES", "1024"))
+COMPRESSAO_NIVEL_GZIP = int(os.getenv("COMPRESSAO_NIVEL_GZIP", "6"))
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv("COMPRESSAO_NIVEL_BROTLI", "4"))
+COMPRESSAO_NIVEL_ZSTD = int(os.getenv("COMPRESSAO_NIVEL_ZSTD", "3"))
+# Corpos em streaming até esse tamanho são juntados e saem com Content-Length; acima disso, comprime por pedaço
+COMPRESSAO_BUFFER_BYTES = 64 * 1024
+
+# Formatos já comprimidos ou que precisam chegar sem buffer (SSE)
+TIPOS_IGNORADOS = ("text/event-stream", "application/vnd.apache.parquet", "image/", "video/", "application/zip",
+                   "application/gzip")
+
+
+class _Compressor:
+    """Interface comum de compressão incremental: comprimir() por pedaço e finalizar() no último."""
+
+    def __init__(self, comprimir: Callable[[bytes], bytes], finalizar: Callable[[], bytes]):
+        self.comprimir = comprimir
+        self.finalizar = finalizar
+
+
+def _gzip(nivel: int) -> _Compressor:
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    return _Compressor(compressor.compress, compressor.flush)
+
+
+def _brotli(nivel: int) -> Optional[_Compressor]:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    compressor = brotli.Compressor(quality=nivel)
+    return _Compressor(compressor.process, compressor.finish)
+
+
+def _zstd(nivel: int) -> Optional[_Compressor]:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    compressor = zstandard.ZstdCompressor(level=nivel).compressobj()
+    return _Compressor(compressor.compress, compressor.flush)
+
+
+# Preferência do servidor em caso de empate no q do cliente: zstd e brotli comprimem mais com menos CPU
+CODIFICACOES = {
+    "zstd": lambda: _zstd(COMPRESSAO_NIVEL_ZSTD),
+    "br": lambda: _brotli(COMPRESSAO_NIVEL_BROTLI),
+    "gzip": lambda: _gzip(COMPRESSAO_NIVEL_GZIP),
+}
+
+
+def codificacoes_disponiveis() -> List[str]:
+    return [nome for nome, fabrica in CODIFICACOES.items() if fabrica() is not None]
+
+
+def negociar(accept_encoding: str, disponiveis: List[str]) -> Optional[str]:
+    """Escolhe a codificação de maior q aceita pelo cliente; empates seguem a ordem de `disponiveis`."""
+    pesos: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.strip().partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        pesos[nome] = q
+
+    candidatos: List[Tuple[float, int, str]] = []
+    for posicao, nome in enumerate(disponiveis):
+        q = pesos.get(nome, pesos.get("*", 0.0))
+        if q > 0:
+            candidatos.append((-q, posicao, nome))
+    return min(candidatos)[2] if candidatos else None
+
+
+class MiddlewareCompressao:
+    """
+    Comprime a resposta conforme o Accept-Encoding. Corpos pequenos (mesmo em pedaços) são comprimidos
+    de uma vez; streams grandes, como os exports, são comprimidos conforme os pedaços chegam.
+    """
+
+    def __init__(self, app, minimo: int = None):
+        self.app = app
+        self.minimo = COMPRESSAO_MINIMO_BYTES if minimo is None else minimo
+        self.disponiveis = codificacoes_disponiveis()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        codificacao = negociar(headers.get(b"accept-encoding", b"").decode("latin-1"), self.disponiveis)
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        resposta = _RespostaComprimida(send, codificacao, self.minimo)
+        await self.app(scope, receive, resposta.enviar)
+
+
+class _RespostaComprimida:
+    def __init__(self, send, codificacao: str, minimo: int):
+        self.send = send
+        self.codificacao = codificacao
+        self.minimo = minimo
+        self.inicio = None
+        self.pendente = b""
+        self.compressor: Optional[_Compressor] = None
+        self.ignorar = False
+
+    async def enviar(self, mensagem) -> None:
+        if mensagem["type"] == "http.response.start":
+            self.inicio = mensagem
+            self.ignorar = not _compressivel(mensagem["headers"])
+            if self.ignorar:
+                await self.send(mensagem)
+            return
+
+        if mensagem["type"] != "http.response.body" or self.ignorar:
+            await self.send(mensagem)
+            return
+
+        corpo = mensagem.get("body", b"")
+        mais = mensagem.get("more_body", False)
+
+        if self.compressor is not None:
+            dados = self.compressor.comprimir(corpo) + (b"" if mais else self.compressor.finalizar())
+            await self.send({"type": "http.response.body", "body": dados, "more_body": mais})
+            return
+
+        self.pendente += corpo
+        if mais and len(self.pendente) < COMPRESSAO_BUFFER_BYTES:
+            return
+
+        if not mais and len(self.pendente) < self.minimo:
+            # Corpo pequeno: sai como veio
+            await self.send(self.inicio)
+            await self.send({"type": "http.response.body", "body": self.pendente, "more_body": False})
+            return
+
+        self.compressor = CODIFICACOES[self.codificacao]()
+        dados = self.compressor.comprimir(self.pendente) + (b"" if mais else self.compressor.finalizar())
+        self.pendente = b""
+        await self.send(self._inicio_comprimido(len(dados) if not mais else None))
+        await self.send({"type": "http.response.body", "body": dados, "more_body": mais})
+
+    def _inicio_comprimido(self, tamanho: Optional[int]):
+        headers = [(k, v) for k, v in self.inicio["headers"] if k.lower() not in (b"content-length", b"vary")]
+        vary = [v for k, v in self.inicio["headers"] if k.lower() == b"vary"]
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        headers.append((b"content-encoding", self.codificacao.encode()))
+        if tamanho is not None:
+            headers.append((b"content-length", str(tamanho).encode()))
+        return {**self.inicio, "headers": headers}
+
+
+def _compressivel(headers) -> bool:
+    for chave, valor in headers:
+        chave = chave.lower()
+        if chave == b"content-encoding":
+            return False
+        if chave == b"content-type" and valor.decode("latin-1").lower().startswith(TIPOS_IGNORADOS):
+            return False
+    return True
@@ -1,11 +1,16 @@
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.models.database import get_db
+from app.models.database import UsuarioEmMovimento, erro_usuario_em_movimento, get_db
 from app.schemas.pydantic import (
-    UsuarioCreate, UsuarioUpdate, UsuarioResponse, MessageResponse, RoadmapResponse, RoadmapStepUpdate
+    UsuarioCreate, UsuarioUpdate, UsuarioResponse, MessageResponse, RoadmapResponse, RoadmapStepUpdate, PurgeRequest,
+    BatchGetRequest
 )
 from app.services.service import Service
+from app.services.analytics import obter_analytics
+from app.services.exportacao import preparar_exportacao
+from app.services.pares import IndiceEmConstrucao
 
 
 def create_user(dados: UsuarioCreate, db: Session = Depends(get_db)):
@@ -38,6 +43,47 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
         )
 
 
+def get_users_batch(dados: BatchGetRequest, db: Session = Depends(get_db)):
+    try:
+        return Service.get_users_batch(dados, db)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
+def get_peers(user_id: int, k: int, db: Session = Depends(get_db)):
+    try:
+        return Service.get_peers(user_id, k, db)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except ImportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except IndiceEmConstrucao as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
 def update_user(user_id: int, dados: UsuarioUpdate, db: Session = Depends(get_db)):
     try:
         return Service.update_user(user_id, dados, db)
@@ -46,6 +92,8 @@ def update_user(user_id: int, dados: UsuarioUpdate, db: Session = Depends(get_db
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except UsuarioEmMovimento:
+        raise erro_usuario_em_movimento()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -61,6 +109,8 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    except UsuarioEmMovimento:
+        raise erro_usuario_em_movimento()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -68,9 +118,17 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
         )
 
 
-def get_roadmap(user_id: int, db: Session = Depends(get_db)):
+async def get_roadmap(user_id: int, bulkhead, db: Session = Depends(get_db)):
+    # Banco no threadpool padrão; só a chamada à IA ocupa o pool próprio do roadmap (bulkhead)
     try:
-        return Service.get_roadmap(user_id, db)
+        preparo = await run_in_threadpool(Service.preparar_roadmap, user_id, db)
+        resultado_ia = await bulkhead.executar(Service.chamar_ia_roadmap, preparo) if preparo.precisa_ia else None
+        return await run_in_threadpool(Service.concluir_roadmap, preparo, resultado_ia, db)
+    except HTTPException:
+        # Recusa do bulkhead (503)
+        raise
+    except UsuarioEmMovimento:
+        raise erro_usuario_em_movimento()
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -83,6 +141,21 @@ def get_roadmap(user_id: int, db: Session = Depends(get_db)):
         )
 
 
+def get_roadmaps_batch(dados: BatchGetRequest, db: Session = Depends(get_db)):
+    try:
+        return Service.get_roadmaps_batch(dados, db)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
 def toggle_step_status(user_id: int, step_id: int, dados: RoadmapStepUpdate, db: Session = Depends(get_db)):
     try:
         return Service.toggle_step_status(user_id, step_id, dados, db)
@@ -91,6 +164,63 @@ def toggle_step_status(user_id: int, step_id: int, dados: RoadmapStepUpdate, db:
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except UsuarioEmMovimento:
+        raise erro_usuario_em_movimento()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
+def get_analytics(db: Session = Depends(get_db)):
+    try:
+        return obter_analytics(db)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
+def get_progresso(user_id: int, db: Session = Depends(get_db)):
+    try:
+        return Service.get_progresso(user_id, db)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
+def purge_users(dados: PurgeRequest, db: Session = Depends(get_db)):
+    try:
+        return Service.purge_users(dados, db)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno no servidor"
+        )
+
+
+def exportar(tabela: str, formato: str, since, db: Session = Depends(get_db)):
+    try:
+        return preparar_exportacao(tabela, formato, since, db)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
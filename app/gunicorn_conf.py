@@ -0,0 +1,78 @@
+"""
+Configuração do gunicorn para produção:
+
+    gunicorn -c app/gunicorn_conf.py app.main:app
+
+ou `python -m app.server`, que usa estes mesmos valores. Todos podem ser trocados por variável de ambiente.
+"""
+import multiprocessing
+import os
+
+
+def _workers_padrao() -> int:
+    # As rotas são síncronas e passam pelo threadpool de cada worker: um processo por núcleo
+    # já ocupa as CPUs; mais que isso só multiplica pools de banco e memória
+    return max(multiprocessing.cpu_count(), 1)
+
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(_workers_padrao())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Importa o app uma vez no master: os workers nascem por fork com o código já carregado
+# (copy-on-write) e um worker que falha ao importar derruba o deploy antes de aceitar tráfego
+preload_app = True
+
+# Fila de conexões do socket de escuta durante picos, antes do accept dos workers
+backlog = int(os.getenv("WEB_BACKLOG", "2048"))
+# Maior que o idle timeout do load balancer (60s no ALB/nginx): quem fecha a conexão é o balanceador,
+# nunca o app no meio de uma requisição reaproveitada
+keepalive = int(os.getenv("WEB_KEEPALIVE", "75"))
+
+# Worker sem dar sinal de vida por mais que isso é reiniciado. Com UvicornWorker o sinal vem do event loop,
+# não das requisições: uma chamada à Groq presa numa thread do bulkhead não dispara este timeout.
+# O limite de cada chamada à IA é o timeout do cliente HTTP (GROQ_TIMEOUT_SEGUNDOS em ai_roadmap)
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+# No restart (HUP) ou no deploy, cada worker termina o que está em andamento antes de sair
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+# Recicla workers aos poucos para conter crescimento de memória; o jitter evita todos de uma vez
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+
+def verificar_workers(total: int) -> None:
+    """
+    Estado que só existe na memória de cada worker não combina com vários workers.
+    Write-behind, ou pub/sub em memória (cache de perfis sem invalidação entre workers), impedem o start.
+    """
+    from app.services import write_behind
+
+    if total <= 1:
+        return
+    if write_behind.WRITE_BEHIND_ATIVO:
+        raise SystemExit(
+            f"TOGGLE_WRITE_BEHIND=1 exige um worker só (WEB_CONCURRENCY=1), mas há {total}: o buffer de "
+            "toggles é por worker e outro processo leria o progresso sem eles até o flush"
+        )
+    if not os.getenv("PUBSUB_URL"):
+        raise SystemExit(
+            f"{total} workers exigem PUBSUB_URL (Redis), ou WEB_CONCURRENCY=1: sem ele, o cache de perfis de "
+            "um worker não recebe as invalidações dos outros e serve perfis antigos até o TTL, e eventos do "
+            "/roadmap/stream e o read-your-writes das réplicas não chegam aos outros workers"
+        )
+
+
+def on_starting(server):
+    # No master, antes do fork: também cobre `gunicorn -c app/gunicorn_conf.py` sem o app.server
+    verificar_workers(server.cfg.workers)
+
+
+def post_fork(server, worker):
+    from app.models.database import descartar_pools_herdados
+
+    descartar_pools_herdados()
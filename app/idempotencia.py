@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+
+# Arquivo compartilhado pelos workers da máquina, como o do rate limit: uma repetição que cai
+# em outro worker encontra a resposta guardada ou a reserva em andamento
+IDEMPOTENCIA_DB = os.getenv("IDEMPOTENCIA_DB", "./idempotencia.db")
+IDEMPOTENCIA_TTL_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+IDEMPOTENCIA_MAX_ENTRADAS = int(os.getenv("IDEMPOTENCIA_MAX_ENTRADAS", "10000"))
+# Tempo máximo que uma repetição concorrente espera a primeira requisição terminar
+IDEMPOTENCIA_ESPERA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_ESPERA_SEGUNDOS", "30"))
+# Reserva sem resposta há mais que isso é de um worker que morreu no meio: a próxima tentativa assume
+IDEMPOTENCIA_RESERVA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_RESERVA_SEGUNDOS", "120"))
+INTERVALO_ESPERA_SEGUNDOS = 0.05
+
+HEADER_CHAVE = "Idempotency-Key"
+
+# Rotas em que o app aceita a chave: criação de usuário e toggle de etapa
+ROTAS_IDEMPOTENTES = [
+    ("POST", re.compile(r"^/users/?$")),
+    ("PUT", re.compile(r"^/roadmap/steps/\d+/toggle/?$")),
+]
+
+# Resultado de ArmazemIdempotencia.reservar
+NOVA, REPETIR, CONFLITO, EM_ANDAMENTO = "nova", "repetir", "conflito", "em_andamento"
+
+RespostaGuardada = Tuple[int, List[Tuple[str, str]], bytes]
+
+
+class ArmazemIdempotencia:
+    """
+    Respostas já dadas por chave, num SQLite local compartilhado pelos workers. A reserva da chave
+    é uma transação IMMEDIATE: entre duplicatas concorrentes, em qualquer worker, só uma executa.
+    """
+
+    LIMPEZA_A_CADA = 1000
+
+    def __init__(self, caminho: str = IDEMPOTENCIA_DB, max_entradas: int = IDEMPOTENCIA_MAX_ENTRADAS,
+                 ttl: float = IDEMPOTENCIA_TTL_SEGUNDOS, reserva: float = IDEMPOTENCIA_RESERVA_SEGUNDOS):
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.reserva = reserva
+        self._local = threading.local()
+        self._chamadas = 0
+
+    def reservar(self, chave: str, impressao: str,
+                 agora: Optional[float] = None) -> Tuple[str, Optional[RespostaGuardada]]:
+        """Reserva a chave para esta requisição (NOVA) ou diz o que já existe nela."""
+        agora = time.time() if agora is None else agora
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            linha = conexao.execute(
+                "SELECT impressao, criada_em, status, headers, corpo FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is not None:
+                expirada = agora - linha[1] > self.ttl
+                abandonada = linha[2] is None and agora - linha[1] > self.reserva
+                if expirada or abandonada:
+                    conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                    linha = None
+
+            if linha is None:
+                conexao.execute(
+                    "INSERT INTO respostas (chave, impressao, criada_em) VALUES (?, ?, ?)", (chave, impressao, agora)
+                )
+                resultado = (NOVA, None)
+            elif linha[0] != impressao:
+                resultado = (CONFLITO, None)
+            elif linha[2] is None:
+                resultado = (EM_ANDAMENTO, None)
+            else:
+                headers = [tuple(par) for par in json.loads(linha[3])]
+                resultado = (REPETIR, (linha[2], headers, bytes(linha[4])))
+
+            self._chamadas += 1
+            if self._chamadas % self.LIMPEZA_A_CADA == 0:
+                self._limpar_antigas(conexao, agora)
+
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+        return resultado
+
+    def concluir(self, chave: str, resposta: RespostaGuardada) -> None:
+        status, headers, corpo = resposta
+        self._conexao().execute(
+            "UPDATE respostas SET status = ?, headers = ?, corpo = ? WHERE chave = ?",
+            (status, json.dumps(headers), corpo, chave),
+        )
+
+    def liberar(self, chave: str) -> None:
+        # Só a reserva em andamento: uma resposta já guardada continua valendo
+        self._conexao().execute("DELETE FROM respostas WHERE chave = ? AND status IS NULL", (chave,))
+
+    def limpar(self) -> None:
+        self._conexao().execute("DELETE FROM respostas")
+
+    def __len__(self) -> int:
+        return self._conexao().execute("SELECT count(*) FROM respostas").fetchone()[0]
+
+    def _limpar_antigas(self, conexao: sqlite3.Connection, agora: float) -> None:
+        conexao.execute("DELETE FROM respostas WHERE criada_em < ?", (agora - self.ttl,))
+        # Acima do limite saem as respostas mais antigas; reservas em andamento nunca
+        conexao.execute(
+            "DELETE FROM respostas WHERE chave IN (SELECT chave FROM respostas WHERE status IS NOT NULL "
+            "ORDER BY criada_em LIMIT max((SELECT count(*) FROM respostas) - ?, 0))",
+            (self.max_entradas,),
+        )
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS respostas (chave TEXT PRIMARY KEY, impressao TEXT NOT NULL, "
+                "criada_em REAL NOT NULL, status INTEGER, headers TEXT, corpo BLOB)"
+            )
+            self._local.conexao = conexao
+        return conexao
+
+
+def _rota_idempotente(metodo: str, caminho: str) -> bool:
+    return any(metodo == m and padrao.match(caminho) for m, padrao in ROTAS_IDEMPOTENTES)
+
+
+def _escopo(request, chave: str) -> str:
+    # A chave vale por cliente e por endpoint: dois clientes que escolhem a mesma chave não se enxergam.
+    # O cliente é o token (Authorization) quando houver, senão o IP
+    cliente = request.headers.get("authorization") or (request.client.host if request.client else "desconhecido")
+    dados = f"{cliente}\n{request.method} {request.url.path}\n{chave}"
+    return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+
+def _impressao(request, corpo: bytes) -> str:
+    # Mesmo endpoint, mesma query e mesmo corpo: só assim a repetição recebe a resposta guardada
+    dados = f"{request.method} {request.url.path}?{request.url.query}\n".encode() + corpo
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _headers_da_resposta(response: Response) -> List[Tuple[str, str]]:
+    # Pelos raw_headers: headers repetidos (vários Set-Cookie) continuam separados
+    return [(nome.decode("latin-1"), valor.decode("latin-1")) for nome, valor in response.raw_headers]
+
+
+def _montar_resposta(status: int, headers: List[Tuple[str, str]], corpo: bytes) -> Response:
+    resposta = Response(content=corpo, status_code=status)
+    # O Content-Length é o calculado para o corpo; o resto vai na ordem e com as repetições originais
+    resposta.raw_headers = [
+        (nome.encode("latin-1"), valor.encode("latin-1")) for nome, valor in headers if nome.lower() != "content-length"
+    ] + [par for par in resposta.raw_headers if par[0] == b"content-length"]
+    return resposta
+
+
+def _repetir(resposta: RespostaGuardada) -> Response:
+    replay = _montar_resposta(*resposta)
+    replay.headers["Idempotent-Replayed"] = "true"
+    return replay
+
+
+async def middleware_idempotencia(request, call_next):
+    chave = request.headers.get(HEADER_CHAVE)
+    if not chave or not _rota_idempotente(request.method, request.url.path):
+        return await call_next(request)
+
+    armazem = obter_armazem_idempotencia()
+    escopo = _escopo(request, chave)
+    impressao = _impressao(request, await request.body())
+    limite = time.monotonic() + IDEMPOTENCIA_ESPERA_SEGUNDOS
+
+    while True:
+        situacao, resposta = await run_in_threadpool(armazem.reservar, escopo, impressao)
+        if situacao == NOVA:
+            break
+        if situacao == CONFLITO:
+            return JSONResponse(status_code=422, content={
+                "detail": "Idempotency-Key já usada com outra requisição"
+            })
+        if situacao == REPETIR:
+            return _repetir(resposta)
+
+        # Repetição concorrente (neste ou em outro worker): espera a primeira em vez de correr junto com ela
+        if time.monotonic() >= limite:
+            return JSONResponse(status_code=409, content={
+                "detail": "Requisição com esta Idempotency-Key ainda em processamento"
+            }, headers={"Retry-After": "1"})
+        await asyncio.sleep(INTERVALO_ESPERA_SEGUNDOS)
+        # Se a primeira falhou com 5xx a chave foi liberada e esta tentativa executa de verdade
+
+    try:
+        response = await call_next(request)
+        corpo = b"".join([pedaco async for pedaco in response.body_iterator])
+    except BaseException:
+        await _liberar_protegido(armazem, escopo)
+        raise
+
+    guardada = (response.status_code, _headers_da_resposta(response), corpo)
+    if response.status_code >= 500:
+        # Erro do servidor não é o "resultado" da operação: a próxima tentativa roda de novo
+        await run_in_threadpool(armazem.liberar, escopo)
+    else:
+        await run_in_threadpool(armazem.concluir, escopo, guardada)
+
+    return _montar_resposta(*guardada)
+
+
+async def _liberar_protegido(armazem: ArmazemIdempotencia, escopo: str) -> None:
+    # O SQLite pode esperar a trava de outro worker: fora do loop, e protegido do cancelamento
+    # (cliente desconectado), senão a reserva fica presa até IDEMPOTENCIA_RESERVA_SEGUNDOS
+    liberacao = asyncio.ensure_future(run_in_threadpool(armazem.liberar, escopo))
+    try:
+        await asyncio.shield(liberacao)
+    except BaseException:
+        # Quem chamou relança a exceção original; a liberação continua em background
+        pass
+
+
+_armazem: Optional[ArmazemIdempotencia] = None
+
+
+def obter_armazem_idempotencia() -> ArmazemIdempotencia:
+    global _armazem
+    if _armazem is None:
+        _armazem = ArmazemIdempotencia()
+    return _armazem
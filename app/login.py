@@ -1,11 +1,10 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 from fastapi import FastAPI, HTTPException, Depends, Header, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
 from pydantic import BaseModel, EmailStr
-import bcrypt
 from fastapi import Depends
 
 # ----------------- CONFIG JWT -----------------
@@ -48,24 +47,36 @@ class CurrentUser(BaseModel):
 # ----------------- MOCK USERS -----------------
 
 def hash_password(plain_password: str) -> str:
+    import bcrypt
+
     return bcrypt.hashpw(plain_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 MOCK_USERS = {
     "aluno@fiap.com": {
-        "password_hash": hash_password("123456"),
         "name": "Aluno FIAP",
         "role": "user"
     },
     "admin@fiap.com": {
-        "password_hash": hash_password("senhaSegura"),
         "name": "Admin",
         "role": "admin"
     },
 }
 
+_MOCK_PASSWORDS = {
+    "aluno@fiap.com": "123456",
+    "admin@fiap.com": "senhaSegura",
+}
+
+@lru_cache(maxsize=None)
+def mock_password_hash(email: str) -> str:
+    # bcrypt é lento de propósito: o hash sai do import e é feito no primeiro login de cada usuário
+    return hash_password(_MOCK_PASSWORDS[email])
+
 # ----------------- FUNÇÃO PRA CRIAR TOKEN -----------------
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
@@ -74,6 +85,8 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
 # ----- SENHA ----
 def verify_password(plain_password: str, password_hash: str) -> bool:
+    import bcrypt
+
     return bcrypt.checkpw(plain_password.encode("utf-8"), password_hash.encode("utf-8"))
 
 # ----------------- LOGIN -----------------
@@ -82,7 +95,7 @@ def verify_password(plain_password: str, password_hash: str) -> bool:
 def login(payload: LoginRequest):
     user = MOCK_USERS.get(payload.email)
 
-    if not user or not verify_password(payload.password, user["password_hash"]):
+    if not user or not verify_password(payload.password, mock_password_hash(payload.email)):
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
 
     access_token = create_access_token({
@@ -106,6 +119,8 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Token não enviado"
         )
 
+    from jose import JWTError, jwt
+
     token = credentials.credentials
 
     try:
@@ -151,6 +166,7 @@ def read_me(current_user: CurrentUser = Depends(get_current_user)):
 def profile(user: CurrentUser = Depends(get_current_user)):
     return user
 
+# Em produção estas rotas ficam montadas em /auth no app principal (python -m app.server)
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("login:app", host="127.0.0.1", port=8000, reload=True)
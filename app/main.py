@@ -1,16 +1,138 @@
-from fastapi import FastAPI, Depends
-from app.models.database import create_tables, get_db
-from app.schemas.pydantic import UsuarioCreate, UsuarioUpdate, UsuarioResponse, MessageResponse, RoadmapResponse, RoadmapStepUpdate
+import time
+
+_INICIO_IMPORTS = time.perf_counter()
+
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from app.models.database import (
+    DATABASE_URL, SessionLocal, aquecer_pool, create_tables, criar_steps_padrao, get_db_escrita, get_db_leitura
+)
+from app.models.replicas import (
+    DATABASE_REPLICA_SYNC_SEGUNDOS,
+    DATABASE_REPLICA_URLS,
+    SincronizadorReplicas,
+    verificar_janela_replicas,
+)
+from app.schemas.pydantic import (
+    UsuarioCreate, UsuarioUpdate, UsuarioResponse, MessageResponse, RoadmapResponse, RoadmapStepUpdate, AnalyticsResponse,
+    PurgeRequest, PurgeResponse, CacheStatsResponse, BatchGetRequest, UsuariosBatchResponse, RoadmapsBatchResponse,
+    ParesResponse
+)
+from app.login import CurrentUser, require_admin
+from app.login import app as app_login
 from app.controllers.controller import (
     create_user,
     get_user,
+    get_users_batch,
+    get_peers,
     update_user,
     delete_user,
     get_roadmap,
+    get_roadmaps_batch,
     toggle_step_status,
+    get_analytics,
+    get_progresso,
+    purge_users,
+    exportar,
 )
+from app.services.ai_roadmap import aquecer_cliente_http
+from app.services.pares import indexar_em_background
+from app.services.eventos import assinar_usuario, cancelar_assinatura, stream_eventos_usuario
+from app.services.cache import obter_cache_perfis
+from app.services.service import Service
+from app.services.snapshot import SnapshotPeriodico, carregar_snapshot
+from app.services.write_behind import WRITE_BEHIND_ATIVO, iniciar_write_behind, parar_write_behind
+from app.bulkhead import bulkhead_roadmap, configurar_threadpool_padrao, metricas_threadpool_padrao
+from app.compressao import MiddlewareCompressao
+from app.idempotencia import middleware_idempotencia
+from app.profiler import middleware_profiler, obter_profiler
+from app.rate_limit import limite_leitura, limite_roadmap
+from app.tracing import middleware_tracing
+
+TEMPO_IMPORTS_MS = (time.perf_counter() - _INICIO_IMPORTS) * 1000
+# Conexões abertas no start; o worker só fica pronto depois delas
+DB_POOL_AQUECER = int(os.getenv("DB_POOL_AQUECER", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def inicializar(app: FastAPI) -> None:
+    fases = {"imports": round(TEMPO_IMPORTS_MS, 2)}
+    inicio = time.perf_counter()
+
+    def medir(nome, func, *args):
+        antes = time.perf_counter()
+        func(*args)
+        fases[nome] = round((time.perf_counter() - antes) * 1000, 2)
+
+    medir("create_tables", create_tables)
+
+    # StatusStep referencia Steps; com as foreign keys ativas os passos padrão precisam existir
+    db = SessionLocal()
+    try:
+        medir("steps_padrao", criar_steps_padrao, db)
+    finally:
+        db.close()
+
+    # Réplicas SQLite locais começam como cópia do primário (já com tabelas e passos padrão)
+    if DATABASE_REPLICA_URLS and DATABASE_REPLICA_SYNC_SEGUNDOS > 0:
+        verificar_janela_replicas()
+        app.state.sincronizador_replicas = SincronizadorReplicas(DATABASE_URL, DATABASE_REPLICA_URLS)
+        medir("replicas", app.state.sincronizador_replicas.iniciar)
+
+    medir("pool_db", aquecer_pool, None, DB_POOL_AQUECER)
+
+    # Caches de perfis e roadmaps do snapshot do deploy anterior: sem rajada de chamadas à Groq
+    medir("snapshot_caches", carregar_snapshot)
+    app.state.snapshot = SnapshotPeriodico()
+    app.state.snapshot.iniciar()
+
+    if WRITE_BEHIND_ATIVO:
+        medir("write_behind", iniciar_write_behind, SessionLocal, Service.aplicar_toggles_em_lote)
+
+    # O cliente HTTP da Groq (import do requests + TLS) aquece em background, sem atrasar o start
+    threading.Thread(target=aquecer_cliente_http, name="aquecer-http", daemon=True).start()
+    # Sem índice de pares (primeiro deploy, arquivo apagado), o build também roda em background
+    indexar_em_background(SessionLocal)
+
+    app.state.startup = {
+        "fases_ms": fases,
+        "total_ms": round(fases["imports"] + (time.perf_counter() - inicio) * 1000, 2),
+    }
+    logger.info("Startup em %.1f ms: %s", app.state.startup["total_ms"], fases)
 
-app = FastAPI(title="ReSkill API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configurar_threadpool_padrao()
+    inicializar(app)
+    yield
+    # Grava o que ainda estiver no buffer antes do worker sair
+    parar_write_behind()
+    if getattr(app.state, "sincronizador_replicas", None) is not None:
+        app.state.sincronizador_replicas.parar()
+    app.state.snapshot.parar()
+
+
+app = FastAPI(title="ReSkill API", version="1.0.0", lifespan=lifespan)
+# O tracing fica por fora: quando a requisição já está amostrada, o profiler reaproveita o trace
+app.middleware("http")(middleware_profiler)
+app.middleware("http")(middleware_tracing)
+# Repetições com a mesma Idempotency-Key voltam daqui, sem chegar ao Service
+app.middleware("http")(middleware_idempotencia)
+# Por último = mais externo: comprime o corpo final, depois de tracing e profiling
+app.add_middleware(MiddlewareCompressao)
+
+# Login e rotas de token no mesmo processo (POST /auth/, GET /auth/me), sem um segundo servidor
+app.mount("/auth", app_login)
 
 @app.get("/")
 def read_root():
@@ -20,30 +142,102 @@ def read_root():
 def read_item(item_id: int, q: str = None):
     return {"item_id": item_id, "q": q}
 
-@app.on_event("startup")
-def on_startup():
-    create_tables()
-
 @app.post("/users", response_model=UsuarioResponse, status_code=201)
-def endpoint_create_user(dados: UsuarioCreate, db = Depends(get_db)):
+def endpoint_create_user(dados: UsuarioCreate, db = Depends(get_db_escrita)):
     return create_user(dados, db)
 
 @app.get("/users/{user_id}", response_model=UsuarioResponse)
-def endpoint_get_user(user_id: int, db = Depends(get_db)):
+def endpoint_get_user(user_id: int, db = Depends(get_db_leitura), _limite = Depends(limite_leitura)):
     return get_user(user_id, db)
 
+@app.post("/users:batchGet", response_model=UsuariosBatchResponse)
+def endpoint_batch_get_users(dados: BatchGetRequest, db = Depends(get_db_leitura), _limite = Depends(limite_leitura)):
+    return get_users_batch(dados, db)
+
+@app.get("/users/{user_id}/peers", response_model=ParesResponse)
+def endpoint_get_peers(user_id: int, k: int = Query(10, ge=1, le=50), db = Depends(get_db_leitura),
+                       _limite = Depends(limite_leitura)):
+    return get_peers(user_id, k, db)
+
 @app.put("/users/{user_id}", response_model=UsuarioResponse)
-def endpoint_update_user(user_id: int, dados: UsuarioUpdate, db = Depends(get_db)):
+def endpoint_update_user(user_id: int, dados: UsuarioUpdate, db = Depends(get_db_escrita)):
     return update_user(user_id, dados, db)
 
 @app.delete("/users/{user_id}", response_model=MessageResponse)
-def endpoint_delete_user(user_id: int, db = Depends(get_db)):
+def endpoint_delete_user(user_id: int, db = Depends(get_db_escrita)):
     return delete_user(user_id, db)
 
 @app.get("/roadmap", response_model=RoadmapResponse)
-def endpoint_get_roadmap(user_id: int, db = Depends(get_db)):
-    return get_roadmap(user_id, db)
+async def endpoint_get_roadmap(user_id: int, db = Depends(get_db_escrita), _limite = Depends(limite_roadmap)):
+    # Sessão do primário: o GET grava o roadmap gerado e decide gerar ou não pelo que já está salvo,
+    # o que numa réplica atrasada levaria a gerar de novo ou regenerar sobre um perfil antigo
+    # Pool próprio (bulkhead) só para a chamada à IA: uma Groq lenta não ocupa as threads das outras rotas,
+    # e quem já tem roadmap salvo é atendido mesmo com o bulkhead cheio
+    return await get_roadmap(user_id, bulkhead_roadmap, db)
+
+@app.post("/roadmap:batchGet", response_model=RoadmapsBatchResponse)
+def endpoint_batch_get_roadmaps(dados: BatchGetRequest, db = Depends(get_db_leitura), _limite = Depends(limite_leitura)):
+    return get_roadmaps_batch(dados, db)
+
+@app.get("/roadmap/stream")
+async def endpoint_stream_roadmap(user_id: int, request: Request, db = Depends(get_db_leitura),
+                                  _limite = Depends(limite_leitura)):
+    # Assina antes de ler o snapshot: um toggle commitado entre os dois chega como evento
+    assinatura = assinar_usuario(user_id)
+    try:
+        progresso = await run_in_threadpool(get_progresso, user_id, db)
+    except BaseException:
+        cancelar_assinatura(assinatura)
+        raise
+    return StreamingResponse(
+        stream_eventos_usuario(assinatura, request, progresso.model_dump()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.put("/roadmap/steps/{step_id}/toggle", response_model=MessageResponse)
-def endpoint_toggle_step_status(step_id: int, user_id: int, dados: RoadmapStepUpdate, db = Depends(get_db)):
-    return toggle_step_status(user_id, step_id, dados, db)
\ No newline at end of file
+def endpoint_toggle_step_status(step_id: int, user_id: int, dados: RoadmapStepUpdate, db = Depends(get_db_escrita)):
+    return toggle_step_status(user_id, step_id, dados, db)
+
+@app.get("/admin/analytics", response_model=AnalyticsResponse)
+def endpoint_admin_analytics(admin: CurrentUser = Depends(require_admin), db = Depends(get_db_leitura)):
+    return get_analytics(db)
+
+@app.post("/admin/users/purge", response_model=PurgeResponse)
+def endpoint_admin_purge_users(dados: PurgeRequest, admin: CurrentUser = Depends(require_admin), db = Depends(get_db_escrita)):
+    return purge_users(dados, db)
+
+@app.get("/admin/cache", response_model=CacheStatsResponse)
+def endpoint_admin_cache(admin: CurrentUser = Depends(require_admin)):
+    return CacheStatsResponse.do_cache(obter_cache_perfis().estatisticas())
+
+@app.get("/admin/pools")
+async def endpoint_admin_pools(admin: CurrentUser = Depends(require_admin)):
+    return {"padrao": metricas_threadpool_padrao(), "roadmap": bulkhead_roadmap.metricas()}
+
+@app.get("/admin/startup")
+def endpoint_admin_startup(request: Request, admin: CurrentUser = Depends(require_admin)):
+    return getattr(request.app.state, "startup", {})
+
+@app.get("/admin/profiles")
+def endpoint_admin_profiles(admin: CurrentUser = Depends(require_admin)):
+    return {"profiles": obter_profiler().listar()}
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+def endpoint_admin_profile(profile_id: str, admin: CurrentUser = Depends(require_admin)):
+    perfil = obter_profiler().ler(profile_id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return perfil
+
+@app.get("/export/users")
+def endpoint_export_users(format: str = "ndjson", since: Optional[datetime] = None,
+                          admin: CurrentUser = Depends(require_admin), db = Depends(get_db_leitura)):
+    corpo, media_type, watermark = exportar("usuarios", format, since, db)
+    return StreamingResponse(corpo, media_type=media_type, headers={"X-Export-Watermark": watermark.isoformat()})
+
+@app.get("/export/progress")
+def endpoint_export_progress(format: str = "ndjson", since: Optional[datetime] = None,
+                             admin: CurrentUser = Depends(require_admin), db = Depends(get_db_leitura)):
+    corpo, media_type, watermark = exportar("progresso", format, since, db)
+    return StreamingResponse(corpo, media_type=media_type, headers={"X-Export-Watermark": watermark.isoformat()})
\ No newline at end of file
@@ -5,9 +5,15 @@ from .database import (
     UsuarioStep,
     StatusStep,
     StatusStepEnum,
+    Roadmap,
+    ProgressoRoadmap,
+    AgregadoProgresso,
     get_db,
+    get_db_leitura,
+    get_db_escrita,
     create_tables,
     criar_steps_padrao,
+    aquecer_pool,
     qualidades_to_json,
     qualidades_from_json
 )
@@ -19,9 +25,15 @@ __all__ = [
     "UsuarioStep",
     "StatusStep",
     "StatusStepEnum",
+    "Roadmap",
+    "ProgressoRoadmap",
+    "AgregadoProgresso",
     "get_db",
+    "get_db_leitura",
+    "get_db_escrita",
     "create_tables",
     "criar_steps_padrao",
+    "aquecer_pool",
     "qualidades_to_json",
     "qualidades_from_json"
 ]
\ No newline at end of file
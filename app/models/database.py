@@ -1,18 +1,38 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Boolean, ForeignKey, Enum, Double
+from sqlalchemy import create_engine, event, insert, select, text, Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Enum, Double, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import relationship, sessionmaker
+from fastapi import HTTPException, Request
+from datetime import datetime
 from enum import Enum as PyEnum
 import os
 import json
 
+from app.models.migracoes import atualizar_schema
+from app.models.replicas import obter_replicas, registrar_escrita
+from app.models.sharding import (
+    SessaoRoteada, UsuarioEmMovimento, obter_roteador, para_cada_shard, rotear_requisicao
+)
+
 # Configuração do Banco SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./reskill.db")
 
 engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Com SHARD_URLS configurado, cada sessão é roteada para o shard do usuário (ver app/models/sharding.py)
+SessionLocal = sessionmaker(class_=SessaoRoteada, autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+# SQLite só respeita ON DELETE CASCADE com as foreign keys habilitadas em cada conexão
+@event.listens_for(Engine, "connect")
+def _habilitar_foreign_keys_sqlite(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__.startswith("sqlite3"):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
 # Enum para Status do Step
 class StatusStepEnum(PyEnum):
     PENDENTE = "pendente"
@@ -32,10 +52,13 @@ class Usuario(Base):
     tempo_estudo_semanal = Column(Double, nullable=False)
     interesses = Column(String(255), nullable=False)
     qualidades = Column(String(255), nullable=False)  # JSON string: '["Dedicado", "Proativo"]'
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # Relacionamentos
-    usuario_steps = relationship("UsuarioStep", back_populates="usuario", cascade="all, delete-orphan")
-    status_steps = relationship("StatusStep", back_populates="usuario", cascade="all, delete-orphan")
+    usuario_steps = relationship("UsuarioStep", back_populates="usuario", cascade="all, delete-orphan", passive_deletes=True)
+    status_steps = relationship("StatusStep", back_populates="usuario", cascade="all, delete-orphan", passive_deletes=True)
+    roadmap = relationship("Roadmap", back_populates="usuario", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    progresso = relationship("ProgressoRoadmap", back_populates="usuario", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Steps(Base):
@@ -54,7 +77,7 @@ class UsuarioStep(Base):
     __tablename__ = "UsuarioStep"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    id_usuario = Column(Integer, ForeignKey("Usuario.id"), nullable=False)
+    id_usuario = Column(Integer, ForeignKey("Usuario.id", ondelete="CASCADE"), nullable=False, index=True)
     id_step = Column(Integer, ForeignKey("Steps.id"), nullable=False)
 
     # Relacionamentos
@@ -66,31 +89,119 @@ class StatusStep(Base):
     __tablename__ = "StatusStep"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    id_usuario = Column(Integer, ForeignKey("Usuario.id"), nullable=False)
+    id_usuario = Column(Integer, ForeignKey("Usuario.id", ondelete="CASCADE"), nullable=False, index=True)
     id_step = Column(Integer, ForeignKey("Steps.id"), nullable=False)
     descricao = Column(String(100), nullable=False)
     status = Column(Enum(StatusStepEnum), nullable=False, default=StatusStepEnum.PENDENTE)
     data_conclusao = Column(Date, nullable=True)
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # Relacionamentos
     usuario = relationship("Usuario", back_populates="status_steps")
     step = relationship("Steps", back_populates="status_steps")
 
 
+class Roadmap(Base):
+    __tablename__ = "Roadmap"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    id_usuario = Column(Integer, ForeignKey("Usuario.id", ondelete="CASCADE"), nullable=False, unique=True)
+    steps = Column(Text, nullable=False)  # JSON string com os 7 passos gerados
+    perfil = Column(Text, nullable=False)  # JSON string com o perfil usado na geração
+
+    # Relacionamentos
+    usuario = relationship("Usuario", back_populates="roadmap")
+
+
+class ProgressoRoadmap(Base):
+    __tablename__ = "ProgressoRoadmap"
+
+    # Resumo desnormalizado do StatusStep, mantido na mesma transação do toggle
+    id_usuario = Column(Integer, ForeignKey("Usuario.id", ondelete="CASCADE"), primary_key=True)
+    concluidos = Column(Integer, nullable=False, default=0)  # bitmask: bit (n - 1) = passo n concluído
+    em_andamento = Column(String(100), nullable=False, default="[]")  # JSON string: '[2, 4]'
+
+    # Relacionamentos
+    usuario = relationship("Usuario", back_populates="progresso")
+
+
+class AgregadoProgresso(Base):
+    __tablename__ = "AgregadoProgresso"
+
+    # Contadores de StatusStep por passo e perfil, atualizados a cada transição de status
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    id_step = Column(Integer, nullable=False)
+    profissao = Column(String(100), nullable=False)
+    nivel_experience = Column(String(100), nullable=False)
+    pendentes = Column(Integer, nullable=False, default=0)
+    em_andamento = Column(Integer, nullable=False, default=0)
+    concluidos = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (UniqueConstraint("id_step", "profissao", "nivel_experience"),)
+
+
 # Função para criar as tabelas
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    roteador = obter_roteador()
+    if roteador is not None:
+        roteador.criar_tabelas(Base.metadata)
+    else:
+        Base.metadata.create_all(bind=engine)
+        atualizar_schema(engine, Base.metadata)
+
+
+def erro_usuario_em_movimento() -> HTTPException:
+    # Escrita na origem durante a cópia se perderia quando a origem for apagada. Vem do get_db ou,
+    # se o rebalanceamento marcou o usuário no meio da requisição, do commit (controllers)
+    return HTTPException(
+        status_code=503,
+        detail="Usuário em manutenção (mudança de shard). Tente novamente em instantes.",
+        headers={"Retry-After": "5"},
+    )
+
+
+# Função para obter sessão do banco (escrita: sempre no primário)
+def get_db(request: Request = None):
+    db = SessionLocal()
+    try:
+        rotear_requisicao(db, request, escrita=True)
+    except UsuarioEmMovimento:
+        db.close()
+        raise erro_usuario_em_movimento()
+    # Depois do commit, as leituras deste usuário ficam no primário até a réplica alcançar
+    registrar_escrita(db, db.info["usuario"])
+    try:
+        yield db
+    finally:
+        db.close()
+
 
+get_db_escrita = get_db
 
-# Função para obter sessão do banco
-def get_db():
+
+# Sessão para endpoints de leitura: SELECTs numa réplica (DATABASE_REPLICA_URLS), em rodízio
+def get_db_leitura(request: Request = None):
     db = SessionLocal()
+    rotear_requisicao(db, request)
+    replicas = obter_replicas()
+    if replicas is not None and db.roteador is None and not replicas.preso_ao_primario(db.info["usuario"]):
+        db.replica = replicas.proxima()
     try:
         yield db
     finally:
         db.close()
 
 
+def insert_com_upsert(sessao, modelo):
+    """INSERT com ON CONFLICT do dialeto da sessão (SQLite e Postgres); None nos bancos sem suporte."""
+    dialeto = sessao.get_bind().dialect.name
+    if dialeto == "sqlite":
+        return sqlite.insert(modelo)
+    if dialeto == "postgresql":
+        return postgresql.insert(modelo)
+    return None
+
+
 # Criar steps padrão (mockados)
 def criar_steps_padrao(db):
     steps_padrao = [
@@ -124,13 +235,48 @@ def criar_steps_padrao(db):
         }
     ]
 
-    for step_data in steps_padrao:
-        step_existente = db.query(Steps).filter(Steps.nome == step_data["nome"]).first()
-        if not step_existente:
-            novo_step = Steps(**step_data)
-            db.add(novo_step)
-
-    db.commit()
+    # Os passos são dados de referência: cada shard tem a sua cópia, com os mesmos ids
+    for sessao in para_cada_shard(db):
+        # Um único INSERT para todos os passos; os que já existem (nome é único) são ignorados pelo banco
+        insert_upsert = insert_com_upsert(sessao, Steps)
+        if insert_upsert is not None:
+            sessao.execute(insert_upsert.values(steps_padrao).on_conflict_do_nothing(index_elements=["nome"]))
+        else:
+            nomes = [step["nome"] for step in steps_padrao]
+            existentes = set(sessao.scalars(select(Steps.nome).where(Steps.nome.in_(nomes))))
+            faltantes = [step for step in steps_padrao if step["nome"] not in existentes]
+            if faltantes:
+                sessao.execute(insert(Steps), faltantes)
+
+        sessao.commit()
+
+
+def aquecer_pool(bind=None, conexoes: int = 1) -> None:
+    """Abre as conexões do pool antes da primeira requisição (connect, PRAGMAs, TLS do Postgres)."""
+    roteador = obter_roteador()
+    replicas = obter_replicas()
+    binds = [bind] if bind is not None else (
+        roteador.engines if roteador is not None else [engine] + (replicas.engines if replicas else [])
+    )
+    abertas = [b.connect() for b in binds for _ in range(conexoes)]
+    try:
+        for conexao in abertas:
+            conexao.execute(text("SELECT 1"))
+    finally:
+        for conexao in abertas:
+            conexao.close()
+
+
+def descartar_pools_herdados() -> None:
+    """
+    Depois do fork (gunicorn com preload), o worker não pode reusar conexões abertas pelo master:
+    os pools são trocados por novos sem fechar os sockets, que continuam sendo do processo pai.
+    """
+    roteador = obter_roteador()
+    replicas = obter_replicas()
+    engines = [engine] + (roteador.engines + [roteador.diretorio] if roteador else []) + (replicas.engines if replicas else [])
+    for e in engines:
+        e.dispose(close=False)
 
 
 # Funções auxiliares para qualidades
@@ -0,0 +1,126 @@
+"""
+Atualizações de schema para bancos criados por versões anteriores dos modelos.
+
+O create_all só cria tabelas que não existem: colunas e foreign keys novas em tabelas já
+existentes (ex.: um reskill.db antigo) passam por aqui. Cada passo olha o estado do banco
+antes de agir, então rodar de novo em um banco atualizado não faz nada.
+"""
+import logging
+from typing import Callable, List
+
+from sqlalchemy import MetaData, Table, inspect
+from sqlalchemy.engine import Connection, Engine
+
+
+logger = logging.getLogger(__name__)
+
+
+def colunas_atualizado_em(conexao: Connection, metadata: MetaData) -> List[str]:
+    """Watermark dos exports incrementais: coluna e índice em tabelas anteriores a ele."""
+    alteradas = []
+    inspetor = inspect(conexao)
+    existentes = set(inspetor.get_table_names())
+    for tabela in metadata.sorted_tables:
+        coluna = tabela.columns.get("atualizado_em")
+        if coluna is None or tabela.name not in existentes:
+            continue
+        if coluna.name in {c["name"] for c in inspetor.get_columns(tabela.name)}:
+            continue
+
+        tipo = coluna.type.compile(dialect=conexao.dialect)
+        conexao.exec_driver_sql(f'ALTER TABLE "{tabela.name}" ADD COLUMN "{coluna.name}" {tipo}')
+        # Linhas antigas contam como alteradas agora: o próximo export incremental leva todas
+        conexao.exec_driver_sql(f'UPDATE "{tabela.name}" SET "{coluna.name}" = CURRENT_TIMESTAMP')
+        if conexao.dialect.name != "sqlite":
+            # SQLite não aceita ADD COLUMN NOT NULL sem default constante; lá o app sempre preenche
+            conexao.exec_driver_sql(f'ALTER TABLE "{tabela.name}" ALTER COLUMN "{coluna.name}" SET NOT NULL')
+        for indice in tabela.indexes:
+            if coluna.name in indice.columns:
+                indice.create(conexao)
+        alteradas.append(tabela.name)
+    return alteradas
+
+
+def _fks_sem_cascade(conexao: Connection, tabela: Table) -> List[dict]:
+    """Foreign keys declaradas com ON DELETE CASCADE no modelo e que no banco ainda não têm."""
+    esperadas = {
+        (fk.parent.name, fk.column.table.name)
+        for fk in tabela.foreign_keys if (fk.ondelete or "").upper() == "CASCADE"
+    }
+    return [
+        fk for fk in inspect(conexao).get_foreign_keys(tabela.name)
+        if (fk["constrained_columns"][0], fk["referred_table"]) in esperadas
+        and (fk.get("options") or {}).get("ondelete", "").upper() != "CASCADE"
+    ]
+
+
+def _recriar_tabela_sqlite(conexao: Connection, tabela: Table) -> None:
+    # SQLite não altera constraints: renomeia, cria a tabela do modelo, copia as linhas e apaga a antiga
+    antiga = f"_{tabela.name}_antiga"
+    inspetor = inspect(conexao)
+    colunas_antigas = {coluna["name"] for coluna in inspetor.get_columns(tabela.name)}
+    for indice in inspetor.get_indexes(tabela.name):
+        conexao.exec_driver_sql(f'DROP INDEX "{indice["name"]}"')
+
+    conexao.exec_driver_sql(f'ALTER TABLE "{tabela.name}" RENAME TO "{antiga}"')
+    tabela.create(conexao)
+    colunas = ", ".join(f'"{coluna.name}"' for coluna in tabela.columns if coluna.name in colunas_antigas)
+    conexao.exec_driver_sql(f'INSERT INTO "{tabela.name}" ({colunas}) SELECT {colunas} FROM "{antiga}"')
+    conexao.exec_driver_sql(f'DROP TABLE "{antiga}"')
+
+
+def cascade_nas_foreign_keys(conexao: Connection, metadata: MetaData) -> List[str]:
+    """Exclusão de usuário depende do ON DELETE CASCADE no banco."""
+    alteradas = []
+    existentes = set(inspect(conexao).get_table_names())
+    for tabela in metadata.sorted_tables:
+        if tabela.name not in existentes:
+            continue
+        pendentes = _fks_sem_cascade(conexao, tabela)
+        if not pendentes:
+            continue
+
+        if conexao.dialect.name == "sqlite":
+            _recriar_tabela_sqlite(conexao, tabela)
+        else:
+            for fk in pendentes:
+                coluna = fk["constrained_columns"][0]
+                referida = fk["referred_columns"][0]
+                conexao.exec_driver_sql(f'ALTER TABLE "{tabela.name}" DROP CONSTRAINT "{fk["name"]}"')
+                conexao.exec_driver_sql(
+                    f'ALTER TABLE "{tabela.name}" ADD CONSTRAINT "{fk["name"]}" FOREIGN KEY ("{coluna}") '
+                    f'REFERENCES "{fk["referred_table"]}" ("{referida}") ON DELETE CASCADE'
+                )
+        alteradas.append(tabela.name)
+    return alteradas
+
+
+# Em ordem: cada passo recebe o banco já com os anteriores aplicados
+PASSOS: List[Callable[[Connection, MetaData], List[str]]] = [
+    # Antes do cascade: a tabela recriada pelo SQLite já exige a coluna preenchida
+    colunas_atualizado_em,
+    cascade_nas_foreign_keys,
+]
+
+
+def atualizar_schema(engine: Engine, metadata: MetaData) -> List[str]:
+    """Aplica os passos pendentes; devolve o que foi alterado (para o log do startup)."""
+    alteracoes = []
+    with engine.connect() as conexao:
+        sqlite = conexao.dialect.name == "sqlite"
+        if sqlite:
+            # Recriar tabelas com as foreign keys ligadas apagaria em cascata as linhas filhas
+            conexao.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            conexao.commit()
+        try:
+            with conexao.begin():
+                for passo in PASSOS:
+                    alteracoes += [f"{passo.__name__}: {alvo}" for alvo in passo(conexao, metadata)]
+        finally:
+            if sqlite:
+                conexao.exec_driver_sql("PRAGMA foreign_keys=ON")
+                conexao.commit()
+
+    for alteracao in alteracoes:
+        logger.warning("Schema atualizado (%s)", alteracao)
+    return alteracoes
@@ -0,0 +1,214 @@
+import fcntl
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+# Réplicas de leitura do DATABASE_URL, separadas por vírgula (não se aplica ao modo com shards)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Depois de uma escrita do usuário, as leituras dele vão ao primário por esse tempo (atraso da réplica)
+LEITURA_APOS_ESCRITA_SEGUNDOS = float(os.getenv("LEITURA_APOS_ESCRITA_SEGUNDOS", "5"))
+# Ambiente local: réplicas SQLite recebem uma cópia do primário a cada N segundos (0 desliga)
+DATABASE_REPLICA_SYNC_SEGUNDOS = float(os.getenv("DATABASE_REPLICA_SYNC_SEGUNDOS", "0"))
+
+CANAL_ESCRITAS = "db:escritas"
+
+
+def verificar_janela_replicas(intervalo: float = DATABASE_REPLICA_SYNC_SEGUNDOS,
+                              janela: float = LEITURA_APOS_ESCRITA_SEGUNDOS) -> None:
+    """
+    A janela de read-your-writes precisa cobrir o atraso da réplica. Com a cópia periódica, o atraso
+    chega ao intervalo inteiro: uma janela menor manda o usuário a uma réplica que ainda não tem a escrita.
+    """
+    if intervalo > 0 and intervalo >= janela:
+        raise RuntimeError(
+            f"DATABASE_REPLICA_SYNC_SEGUNDOS={intervalo:g} precisa ser menor que "
+            f"LEITURA_APOS_ESCRITA_SEGUNDOS={janela:g}"
+        )
+
+
+class ConjuntoReplicas:
+    """Engines de leitura com rodízio e a janela de read-your-writes por usuário."""
+
+    def __init__(self, urls: List[str], janela: float = LEITURA_APOS_ESCRITA_SEGUNDOS, **engine_kwargs):
+        self.urls = urls
+        self.engines = [create_engine(url, **engine_kwargs) for url in urls]
+        self.janela = janela
+        self._rodizio = itertools.cycle(self.engines)
+        self._lock = threading.Lock()
+        self._presos: Dict[int, float] = {}
+        self._canal_ativo = False
+
+    def proxima(self):
+        with self._lock:
+            return next(self._rodizio)
+
+    def preso_ao_primario(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            limite = self._presos.get(user_id)
+            if limite is not None and limite < time.time():
+                del self._presos[user_id]
+                limite = None
+        return limite is not None
+
+    def marcar_escrita(self, ids: Iterable[int], propagar: bool = True) -> None:
+        ids = list(ids)
+        limite = time.time() + self.janela
+        with self._lock:
+            for user_id in ids:
+                self._presos[user_id] = limite
+            # Limpeza barata: a janela é curta, então o mapa só guarda quem escreveu há pouco
+            if len(self._presos) > 10000:
+                agora = time.time()
+                self._presos = {k: v for k, v in self._presos.items() if v >= agora}
+
+        if propagar and ids:
+            try:
+                from app.services.eventos import obter_pubsub
+
+                # Os outros workers também precisam mandar as próximas leituras desse usuário ao primário
+                obter_pubsub().publicar(CANAL_ESCRITAS, {"ids": ids})
+            except Exception:
+                pass
+
+    def ativar_canal(self) -> None:
+        if self._canal_ativo:
+            return
+        self._canal_ativo = True
+        try:
+            from app.services.eventos import obter_pubsub
+
+            obter_pubsub().ouvir(CANAL_ESCRITAS, lambda mensagem: self.marcar_escrita(mensagem.get("ids", []), False))
+        except Exception:
+            pass
+
+
+_replicas: Optional[ConjuntoReplicas] = None
+
+
+def obter_replicas() -> Optional[ConjuntoReplicas]:
+    global _replicas
+    if _replicas is None and DATABASE_REPLICA_URLS:
+        _replicas = ConjuntoReplicas(DATABASE_REPLICA_URLS)
+        _replicas.ativar_canal()
+    return _replicas
+
+
+def configurar_replicas(replicas: Optional[ConjuntoReplicas]) -> None:
+    global _replicas
+    _replicas = replicas
+    if replicas is not None:
+        replicas.ativar_canal()
+
+
+def somente_leitura(clause) -> bool:
+    # Só SELECT sem FOR UPDATE pode ir à réplica; SQL cru, DML e get_bind sem cláusula vão ao primário
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+def registrar_escrita(db: Session, user_id: Optional[int]) -> None:
+    """Marca o usuário como autor de escrita nesta sessão; ele fica preso ao primário depois do commit."""
+    if user_id is not None:
+        db.info.setdefault("usuarios_escrita", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apos_commit(db: Session) -> None:
+    ids = db.info.pop("usuarios_escrita", None)
+    replicas = obter_replicas() if ids else None
+    if ids and replicas is not None:
+        replicas.marcar_escrita(ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _apos_rollback(db: Session) -> None:
+    db.info.pop("usuarios_escrita", None)
+
+
+# ----------------- RÉPLICA SQLITE LOCAL -----------------
+
+def _caminho_sqlite(url: str) -> Optional[str]:
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    return url.database
+
+
+def sincronizar_sqlite(url_primario: str, url_replica: str) -> None:
+    """Copia o primário sobre a réplica pela backup API do SQLite (consistente mesmo com escritas em curso)."""
+    origem = sqlite3.connect(_caminho_sqlite(url_primario))
+    destino = sqlite3.connect(_caminho_sqlite(url_replica), timeout=30)
+    try:
+        origem.backup(destino)
+    finally:
+        destino.close()
+        origem.close()
+
+
+class SincronizadorReplicas:
+    """
+    Cada worker inicia o seu, mas só um copia: todos disputam uma trava (flock) ao lado do primário
+    a cada intervalo, e quem a tem sincroniza. Se esse worker sai (reciclagem, crash), outro assume.
+    """
+
+    def __init__(self, url_primario: str, urls_replicas: List[str], intervalo: float = DATABASE_REPLICA_SYNC_SEGUNDOS):
+        self.url_primario = url_primario
+        self.urls_replicas = [url for url in urls_replicas if _caminho_sqlite(url)]
+        self.intervalo = intervalo
+        primario = _caminho_sqlite(url_primario)
+        self.caminho_trava = f"{primario}.sync.lock" if primario else None
+        self._trava = None
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sincronizar(self) -> None:
+        for url in self.urls_replicas:
+            try:
+                sincronizar_sqlite(self.url_primario, url)
+            except Exception:
+                logger.exception("Falha ao sincronizar a réplica %s", url)
+
+    def sincronizar_se_dono(self) -> bool:
+        """Sincroniza se este processo tem (ou conseguiu agora) a trava; False se outro worker tem."""
+        if self._trava is None:
+            arquivo = open(self.caminho_trava, "a")
+            try:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                arquivo.close()
+                return False
+            self._trava = arquivo
+        self.sincronizar()
+        return True
+
+    def iniciar(self) -> None:
+        if not self.urls_replicas or self.caminho_trava is None:
+            return
+        self.sincronizar_se_dono()
+        self._thread = threading.Thread(target=self._loop, name="sincronizador-replicas", daemon=True)
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._trava is not None:
+            # Fechar solta o flock: outro worker assume no próximo intervalo
+            self._trava.close()
+            self._trava = None
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self.sincronizar_se_dono()
@@ -0,0 +1,290 @@
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Boolean, Column, Integer, String, create_engine, delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+
+from app.models.migracoes import atualizar_schema
+from app.models.replicas import registrar_escrita, somente_leitura
+
+# URLs dos shards separadas por vírgula; vazio = um banco só (DATABASE_URL), sem roteamento
+SHARD_URLS = [url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+# Banco global pequeno: só id, email e shard de cada usuário
+SHARD_DIRETORIO_URL = os.getenv("SHARD_DIRETORIO_URL", "sqlite:///./diretorio.db")
+
+BaseDiretorio = declarative_base()
+
+
+class DiretorioUsuario(BaseDiretorio):
+    __tablename__ = "DiretorioUsuario"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    email = Column(String(100), nullable=False, unique=True)
+    shard = Column(Integer, nullable=False, index=True)
+    # Ligado pelo rebalanceamento enquanto os dados do usuário são copiados: escritas recebem 503
+    em_movimento = Column(Boolean, nullable=False, default=False)
+
+
+class UsuarioEmMovimento(Exception):
+    """Escrita de um usuário que o rebalanceamento está mudando de shard."""
+
+
+class RoteadorShards:
+    """
+    Mapeia cada usuário para um dos N bancos. Usuario, StatusStep, Roadmap e progresso do usuário
+    ficam juntos no mesmo shard; o diretório global aloca os ids e garante a unicidade do email.
+    """
+
+    def __init__(self, urls: List[str], url_diretorio: str, **engine_kwargs):
+        self.engines = [create_engine(url, **engine_kwargs) for url in urls]
+        self.diretorio = create_engine(url_diretorio, **engine_kwargs)
+
+    @property
+    def total(self) -> int:
+        return len(self.engines)
+
+    def shard_padrao(self, user_id: int) -> int:
+        return user_id % self.total
+
+    def criar_tabelas(self, metadata) -> None:
+        BaseDiretorio.metadata.create_all(bind=self.diretorio)
+        for engine in self.engines:
+            metadata.create_all(bind=engine)
+            atualizar_schema(engine, metadata)
+
+    def shard_do_usuario(self, user_id: int) -> int:
+        return self.estado_do_usuario(user_id)[0]
+
+    def estado_do_usuario(self, user_id: int) -> Tuple[int, bool]:
+        """Shard do usuário e se ele está sendo movido pelo rebalanceamento."""
+        with self.diretorio.connect() as conexao:
+            linha = conexao.execute(
+                select(DiretorioUsuario.shard, DiretorioUsuario.em_movimento).where(DiretorioUsuario.id == user_id)
+            ).first()
+        # Usuário fora do diretório não existe em shard nenhum: qualquer um responde "não encontrado"
+        return (self.shard_padrao(user_id), False) if linha is None else (linha[0], linha[1])
+
+    def shards_dos_usuarios(self, ids: List[int]) -> Dict[int, int]:
+        with self.diretorio.connect() as conexao:
+            linhas = dict(conexao.execute(
+                select(DiretorioUsuario.id, DiretorioUsuario.shard).where(DiretorioUsuario.id.in_(ids))
+            ).all())
+        return {user_id: linhas.get(user_id, self.shard_padrao(user_id)) for user_id in ids}
+
+    def localizar_email(self, email: str) -> Optional[Tuple[int, int]]:
+        with self.diretorio.connect() as conexao:
+            linha = conexao.execute(
+                select(DiretorioUsuario.id, DiretorioUsuario.shard).where(DiretorioUsuario.email == email)
+            ).first()
+        return tuple(linha) if linha else None
+
+    def alocar_usuario(self, email: str) -> Tuple[int, int]:
+        with self.diretorio.begin() as conexao:
+            try:
+                user_id = conexao.execute(
+                    insert(DiretorioUsuario).values(email=email, shard=-1).returning(DiretorioUsuario.id)
+                ).scalar_one()
+            except IntegrityError:
+                raise ValueError("Email já cadastrado no sistema")
+            shard = self.shard_padrao(user_id)
+            conexao.execute(update(DiretorioUsuario).where(DiretorioUsuario.id == user_id).values(shard=shard))
+        return user_id, shard
+
+    def liberar_usuarios(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        if ids:
+            with self.diretorio.begin() as conexao:
+                conexao.execute(delete(DiretorioUsuario).where(DiretorioUsuario.id.in_(ids)))
+
+    def marcar_em_movimento(self, ids: Iterable[int], em_movimento: bool) -> None:
+        ids = list(ids)
+        if ids:
+            with self.diretorio.begin() as conexao:
+                conexao.execute(
+                    update(DiretorioUsuario).where(DiretorioUsuario.id.in_(ids)).values(em_movimento=em_movimento)
+                )
+
+    def mudar_shard(self, user_id: int, shard: int) -> None:
+        # Vira o shard e libera as escritas no mesmo update: a próxima escrita já vai para o destino
+        with self.diretorio.begin() as conexao:
+            conexao.execute(
+                update(DiretorioUsuario).where(DiretorioUsuario.id == user_id).values(shard=shard, em_movimento=False)
+            )
+
+    def usuarios_por_shard(self) -> Dict[int, List[int]]:
+        with self.diretorio.connect() as conexao:
+            linhas = conexao.execute(select(DiretorioUsuario.id, DiretorioUsuario.shard)).all()
+        grupos: Dict[int, List[int]] = {}
+        for user_id, shard in linhas:
+            grupos.setdefault(shard, []).append(user_id)
+        return grupos
+
+    def sessao(self, shard: Optional[int] = None) -> "SessaoRoteada":
+        return SessaoRoteada(roteador=self, shard=shard, autocommit=False, autoflush=False)
+
+
+_roteador: Optional[RoteadorShards] = None
+
+
+def obter_roteador() -> Optional[RoteadorShards]:
+    global _roteador
+    if _roteador is None and SHARD_URLS:
+        _roteador = RoteadorShards(SHARD_URLS, SHARD_DIRETORIO_URL)
+    return _roteador
+
+
+def configurar_roteador(roteador: Optional[RoteadorShards]) -> None:
+    global _roteador
+    _roteador = roteador
+
+
+class SessaoRoteada(Session):
+    """
+    Session do app. Sem shards configurados se comporta como uma Session comum;
+    com shards, cada sessão trabalha num shard só, escolhido pelo usuário da requisição.
+    Com `replica` definida (sessões de leitura, sem shards), os SELECTs vão para a réplica até
+    a primeira escrita; dali em diante a sessão inteira usa o primário.
+    """
+
+    def __init__(self, roteador: Optional[RoteadorShards] = None, shard: Optional[int] = None,
+                 replica=None, **kwargs):
+        super().__init__(**kwargs)
+        self.roteador = roteador if roteador is not None else obter_roteador()
+        self.shard = shard
+        self.replica = replica
+
+    def rotear_usuario(self, user_id: int, escrita: bool = False) -> None:
+        if self.roteador is not None:
+            shard, em_movimento = self.roteador.estado_do_usuario(user_id)
+            if escrita and em_movimento:
+                raise UsuarioEmMovimento(user_id)
+            self.rotear_shard(shard)
+
+    def rotear_shard(self, shard: int) -> None:
+        if self.shard not in (None, shard) and self.in_transaction():
+            raise RuntimeError("Sessão já tem transação aberta em outro shard")
+        self.shard = shard
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.roteador is None:
+            if self.replica is not None:
+                if not self._flushing and somente_leitura(clause):
+                    return self.replica
+                self.replica = None
+                registrar_escrita(self, self.info.get("usuario"))
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self.shard is None:
+            raise RuntimeError("Sessão sem shard: informe o usuário ou use para_cada_shard()")
+        if self._flushing or not somente_leitura(clause):
+            self.info["escreveu"] = True
+        return self.roteador.engines[self.shard]
+
+    def connection(self, *args, **kwargs):
+        # Conexão pedida direto (SQL cru, exportação por cursor) não tem como ser classificada: primário
+        self.replica = None
+        return super().connection(*args, **kwargs)
+
+
+@event.listens_for(SessaoRoteada, "before_commit")
+def _conferir_movimento(db: SessaoRoteada) -> None:
+    # O get_db só olha o diretório no começo da requisição, e o GET /roadmap segura a sessão durante a
+    # chamada à IA: a marcação do rebalanceamento é conferida de novo antes de gravar na origem
+    user_id = db.info.get("usuario")
+    escreveu = db.info.pop("escreveu", False) or db.new or db.dirty or db.deleted
+    if db.roteador is None or user_id is None or db.shard is None or not escreveu:
+        return
+    shard, em_movimento = db.roteador.estado_do_usuario(user_id)
+    if em_movimento or shard != db.shard:
+        raise UsuarioEmMovimento(user_id)
+
+
+def _roteador_da_sessao(db: Session) -> Optional[RoteadorShards]:
+    return getattr(db, "roteador", None)
+
+
+def para_cada_shard(db: Session) -> Iterator[Session]:
+    """
+    Percorre os shards para operações que não são de um usuário só.
+    Sem sharding, ou com a sessão já presa a um shard, é só a própria `db`.
+    """
+    roteador = _roteador_da_sessao(db)
+    if roteador is None or db.shard is not None:
+        yield db
+        return
+
+    for shard in range(roteador.total):
+        sessao = roteador.sessao(shard)
+        try:
+            yield sessao
+        finally:
+            sessao.close()
+
+
+def engines_de(db: Session) -> List:
+    if getattr(db, "replica", None) is not None:
+        return [db.replica]
+    roteador = _roteador_da_sessao(db)
+    return [db.get_bind()] if roteador is None or db.shard is not None else list(roteador.engines)
+
+
+def agrupar_por_shard(db: Session, ids: Iterable[int]) -> Iterator[Tuple[Session, List[int]]]:
+    roteador = _roteador_da_sessao(db)
+    ids = sorted(set(ids))
+    if roteador is None:
+        yield db, ids
+        return
+
+    grupos: Dict[int, List[int]] = {}
+    for user_id, shard in roteador.shards_dos_usuarios(ids).items():
+        grupos.setdefault(shard, []).append(user_id)
+    for shard, ids_shard in sorted(grupos.items()):
+        sessao = roteador.sessao(shard)
+        try:
+            yield sessao, ids_shard
+        finally:
+            sessao.close()
+
+
+def usuario_da_requisicao(request) -> Optional[int]:
+    # O usuário vem do path (/users/{user_id}) ou da query (?user_id=)
+    if request is None:
+        return None
+    user_id = request.path_params.get("user_id") or request.query_params.get("user_id")
+    return int(user_id) if user_id is not None and str(user_id).isdigit() else None
+
+
+def rotear_requisicao(db: Session, request, escrita: bool = False) -> None:
+    user_id = usuario_da_requisicao(request)
+    db.info["usuario"] = user_id
+    if _roteador_da_sessao(db) is not None and user_id is not None:
+        db.rotear_usuario(user_id, escrita=escrita)
+
+
+def alocar_usuario(db: Session, email: str) -> Optional[int]:
+    """Reserva id e email no diretório e aponta a sessão para o shard do novo usuário (None sem sharding)."""
+    roteador = _roteador_da_sessao(db)
+    if roteador is None:
+        return None
+    user_id, shard = roteador.alocar_usuario(email)
+    db.rotear_shard(shard)
+    return user_id
+
+
+def liberar_usuarios(db: Session, ids: Iterable[int]) -> None:
+    roteador = _roteador_da_sessao(db)
+    if roteador is not None:
+        roteador.liberar_usuarios(ids)
+
+
+def localizar_email(db: Session, email: str) -> Optional[Session]:
+    """Sessão posicionada no shard do email, pelo diretório global; None se o email não existe."""
+    roteador = _roteador_da_sessao(db)
+    if roteador is None:
+        return db
+    localizado = roteador.localizar_email(email)
+    if localizado is None:
+        return None
+    db.rotear_shard(localizado[1])
+    return db
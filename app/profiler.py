@@ -0,0 +1,210 @@
+import contextvars
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app import tracing
+
+
+# Intervalo entre amostras de pilha; 5 ms custa pouco e já separa bem SQL, Groq e Python
+PROFILER_INTERVALO_MS = float(os.getenv("PROFILER_INTERVALO_MS", "5"))
+PROFILER_DIR = os.getenv("PROFILER_DIR", "./profiles")
+# Perfis guardados no diretório; os mais antigos são apagados a cada perfil novo
+PROFILER_MAX_ARQUIVOS = int(os.getenv("PROFILER_MAX_ARQUIVOS", "200"))
+# Modo automático: requisições ainda em andamento após o limiar passam a ser amostradas (0 desliga)
+PROFILER_AUTO_LIMIAR_MS = float(os.getenv("PROFILER_AUTO_LIMIAR_MS", "0"))
+# Fração das requisições candidatas ao modo automático
+PROFILER_AUTO_FRACAO = float(os.getenv("PROFILER_AUTO_FRACAO", "0.01"))
+
+HEADER_PROFILE = "X-Profile"
+ID_VALIDO = re.compile(r"^[0-9a-f]{32}$")
+
+
+class PerfilRequisicao:
+    def __init__(self, perfil_id: str, trace_id: str, rota: str, atraso: float = 0.0, automatico: bool = False):
+        self.id = perfil_id
+        self.trace_id = trace_id
+        self.rota = rota
+        self.inicio = time.monotonic()
+        self.atraso = atraso
+        self.automatico = automatico
+        self.threads: Set[int] = set()
+        self.pilhas: Counter = Counter()
+        self.amostras = 0
+
+    def collapsed(self) -> str:
+        # Formato "collapsed stacks": cada linha é raiz;...;folha <contagem>, aceito por flamegraph.pl e speedscope
+        return "".join(f"{pilha} {total}\n" for pilha, total in self.pilhas.most_common())
+
+
+_perfil_atual: contextvars.ContextVar[Optional[PerfilRequisicao]] = contextvars.ContextVar("perfil_atual", default=None)
+
+
+def _registrar_thread(span) -> None:
+    # Cada span aberto dentro da requisição diz em qual thread ela está rodando (loop ou threadpool)
+    perfil = _perfil_atual.get()
+    if perfil is not None:
+        perfil.threads.add(span.thread)
+
+
+tracing._ao_abrir_span.append(_registrar_thread)
+
+
+class Profiler:
+    """
+    Amostrador de pilhas numa thread única, compartilhada por todas as requisições em profiling.
+    Só amostra as threads registradas pela requisição; sem perfis ativos, fica parado.
+    """
+
+    def __init__(self, intervalo_ms: float = PROFILER_INTERVALO_MS, diretorio: str = PROFILER_DIR,
+                 max_arquivos: int = PROFILER_MAX_ARQUIVOS):
+        self.intervalo = intervalo_ms / 1000
+        self.diretorio = diretorio
+        self.max_arquivos = max_arquivos
+        self._ativos: Dict[str, PerfilRequisicao] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self, perfil: PerfilRequisicao) -> None:
+        with self._cond:
+            self._ativos[perfil.id] = perfil
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def finalizar(self, perfil: PerfilRequisicao) -> bool:
+        with self._cond:
+            self._ativos.pop(perfil.id, None)
+
+        # Perfil automático sem amostras é uma requisição que terminou antes do limiar
+        if perfil.automatico and not perfil.amostras:
+            return False
+
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(self._caminho(perfil.id), "w", encoding="utf-8") as f:
+            f.write(perfil.collapsed())
+        self._aplicar_retencao()
+        return True
+
+    def ler(self, perfil_id: str) -> Optional[str]:
+        if not ID_VALIDO.match(perfil_id):
+            return None
+        try:
+            with open(self._caminho(perfil_id), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def listar(self) -> List[str]:
+        if not os.path.isdir(self.diretorio):
+            return []
+        arquivos = [nome for nome in os.listdir(self.diretorio) if nome.endswith(".folded")]
+        arquivos.sort(key=lambda nome: os.path.getmtime(os.path.join(self.diretorio, nome)), reverse=True)
+        return [nome[:-len(".folded")] for nome in arquivos]
+
+    def _aplicar_retencao(self) -> None:
+        for antigo in self.listar()[self.max_arquivos:]:
+            try:
+                os.remove(self._caminho(antigo))
+            except FileNotFoundError:
+                # Outro worker apagou primeiro
+                pass
+
+    def _caminho(self, perfil_id: str) -> str:
+        return os.path.join(self.diretorio, f"{perfil_id}.folded")
+
+    def _loop(self) -> None:
+        proprio = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._ativos:
+                    self._cond.wait()
+
+                # Amostra com o lock: finalizar() só grava o perfil depois da última amostra
+                agora = time.monotonic()
+                prontos = [p for p in self._ativos.values() if agora - p.inicio >= p.atraso]
+                if prontos:
+                    frames = sys._current_frames()
+                    for perfil in prontos:
+                        for thread_id in list(perfil.threads):
+                            frame = frames.get(thread_id)
+                            if frame is not None and thread_id != proprio:
+                                perfil.pilhas[_pilha(frame)] += 1
+                                perfil.amostras += 1
+                    del frames
+
+            time.sleep(self.intervalo)
+
+
+def _pilha(frame) -> str:
+    quadros = []
+    while frame is not None:
+        codigo = frame.f_code
+        quadros.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(quadros))
+
+
+def _verificar_admin(request) -> Optional[JSONResponse]:
+    from app.login import get_current_user, require_admin
+
+    autorizacao = request.headers.get("authorization", "")
+    esquema, _, token = autorizacao.partition(" ")
+    try:
+        if esquema.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Token não enviado")
+        require_admin(get_current_user(HTTPAuthorizationCredentials(scheme=esquema, credentials=token)))
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+    return None
+
+
+def _pedido_explicito(request) -> bool:
+    return request.headers.get(HEADER_PROFILE) == "1" or request.query_params.get("profile") == "1"
+
+
+async def middleware_profiler(request, call_next):
+    if _pedido_explicito(request):
+        negado = _verificar_admin(request)
+        if negado is not None:
+            return negado
+        atraso, automatico = 0.0, False
+    elif PROFILER_AUTO_LIMIAR_MS > 0 and random.random() < PROFILER_AUTO_FRACAO:
+        atraso, automatico = PROFILER_AUTO_LIMIAR_MS / 1000, True
+    else:
+        return await call_next(request)
+
+    # A requisição sob profiling é sempre rastreada. O id do perfil é próprio: várias requisições
+    # podem continuar o mesmo traceparent de quem chamou e teriam o mesmo trace_id
+    with tracing.span(f"{request.method} {request.url.path}", raiz=tracing.span_atual() is None) as atual:
+        perfil = PerfilRequisicao(uuid.uuid4().hex, atual.trace_id, request.url.path, atraso, automatico)
+        token = _perfil_atual.set(perfil)
+        _profiler.iniciar(perfil)
+        try:
+            response = await call_next(request)
+        finally:
+            _perfil_atual.reset(token)
+            _profiler.finalizar(perfil)
+
+    if not automatico:
+        response.headers["X-Profile-Id"] = perfil.id
+        response.headers["X-Profile-Trace-Id"] = perfil.trace_id
+    return response
+
+
+_profiler = Profiler()
+
+
+def obter_profiler() -> Profiler:
+    return _profiler
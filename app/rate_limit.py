@@ -0,0 +1,135 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+
+RATE_LIMIT_ATIVO = os.getenv("RATE_LIMIT_ATIVO", "0") == "1"
+# Arquivo compartilhado pelos workers da máquina; o SQLite serializa as atualizações dos baldes
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "./rate_limit.db")
+
+
+def _taxa(valor: str) -> Tuple[float, float]:
+    # "10/60" = balde de 10 tokens, reposto à razão de 10 a cada 60 segundos
+    capacidade, segundos = valor.split("/")
+    return float(capacidade), float(capacidade) / float(segundos)
+
+
+# Orçamentos separados: gerar roadmap pode chamar a Groq, leituras só tocam o banco.
+# O limite por cliente (IP) é mais folgado porque vários usuários podem sair pelo mesmo NAT.
+ORCAMENTOS = {
+    "roadmap": {
+        "usuario": _taxa(os.getenv("RATE_LIMIT_ROADMAP", "10/60")),
+        "cliente": _taxa(os.getenv("RATE_LIMIT_ROADMAP_CLIENTE", "30/60")),
+    },
+    "leitura": {
+        "usuario": _taxa(os.getenv("RATE_LIMIT_LEITURA", "120/60")),
+        "cliente": _taxa(os.getenv("RATE_LIMIT_LEITURA_CLIENTE", "600/60")),
+    },
+}
+
+
+class ArmazemTokens:
+    """Token buckets num SQLite local; cada consumo é uma transação IMMEDIATE, atômica entre processos."""
+
+    LIMPEZA_A_CADA = 1000
+
+    def __init__(self, caminho: str = RATE_LIMIT_DB):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._chamadas = 0
+
+    def consumir(self, baldes: List[Tuple[str, float, float]], custo: float = 1.0,
+                 agora: Optional[float] = None) -> float:
+        """
+        Consome `custo` de todos os baldes (chave, capacidade, taxa/s) ou de nenhum.
+        Retorna 0 se passou, ou quantos segundos esperar até haver tokens em todos.
+        """
+        agora = time.time() if agora is None else agora
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            saldos = []
+            for chave, capacidade, taxa in baldes:
+                linha = conexao.execute("SELECT tokens, atualizado FROM baldes WHERE chave = ?", (chave,)).fetchone()
+                tokens = capacidade if linha is None else min(capacidade, linha[0] + (agora - linha[1]) * taxa)
+                saldos.append((chave, tokens, taxa))
+
+            espera = max(((custo - tokens) / taxa for _, tokens, taxa in saldos if tokens < custo), default=0.0)
+            debito = custo if espera == 0 else 0.0
+
+            conexao.executemany(
+                "INSERT INTO baldes (chave, tokens, atualizado) VALUES (?, ?, ?) "
+                "ON CONFLICT(chave) DO UPDATE SET tokens = excluded.tokens, atualizado = excluded.atualizado",
+                [(chave, tokens - debito, agora) for chave, tokens, _ in saldos],
+            )
+
+            self._chamadas += 1
+            if self._chamadas % self.LIMPEZA_A_CADA == 0:
+                # Baldes parados há uma hora já estariam cheios: tanto faz existirem ou não
+                conexao.execute("DELETE FROM baldes WHERE atualizado < ?", (agora - 3600,))
+
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+        return espera
+
+    def _conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS baldes (chave TEXT PRIMARY KEY, tokens REAL NOT NULL, atualizado REAL NOT NULL)"
+            )
+            self._local.conexao = conexao
+        return conexao
+
+
+_armazem: Optional[ArmazemTokens] = None
+
+
+def obter_armazem() -> ArmazemTokens:
+    global _armazem
+    if _armazem is None:
+        _armazem = ArmazemTokens()
+    return _armazem
+
+
+class LimiteTaxa:
+    """
+    Dependência de rota: consome um token do orçamento por usuário (user_id da rota ou da query)
+    e por cliente (IP). Sem tokens, responde 429 com Retry-After.
+    """
+
+    def __init__(self, orcamento: str):
+        self.orcamento = orcamento
+
+    def __call__(self, request: Request, user_id: Optional[int] = None) -> None:
+        if not RATE_LIMIT_ATIVO:
+            return
+
+        limites = ORCAMENTOS[self.orcamento]
+        cliente = request.client.host if request.client else "desconhecido"
+        baldes = [(f"{self.orcamento}:cliente:{cliente}", *limites["cliente"])]
+        if user_id is not None:
+            baldes.append((f"{self.orcamento}:usuario:{user_id}", *limites["usuario"]))
+
+        espera = obter_armazem().consumir(baldes)
+        if espera > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Limite de requisições excedido. Tente novamente mais tarde.",
+                headers={"Retry-After": str(math.ceil(espera))},
+            )
+
+
+limite_roadmap = LimiteTaxa("roadmap")
+limite_leitura = LimiteTaxa("leitura")
@@ -7,11 +7,17 @@ from .pydantic import (
     UsuarioUpdate,
     RoadmapStepCreate,
     RoadmapStepUpdate,
+    PurgeRequest,
 
     # Response Schemas (dados que vão para o frontend)
     UsuarioResponse,
     RoadmapStepResponse,
     RoadmapResponse,
+    ProgressoResponse,
+    ProgressoAgregadoResponse,
+    AnalyticsResponse,
+    PurgeResponse,
+    CacheStatsResponse,
 
     # Message Schemas (respostas padrão)
     MessageResponse,
@@ -24,9 +30,15 @@ __all__ = [
     "UsuarioUpdate",
     "RoadmapStepCreate",
     "RoadmapStepUpdate",
+    "PurgeRequest",
     "UsuarioResponse",
     "RoadmapStepResponse",
     "RoadmapResponse",
+    "ProgressoResponse",
+    "ProgressoAgregadoResponse",
+    "AnalyticsResponse",
+    "PurgeResponse",
+    "CacheStatsResponse",
     "MessageResponse",
     "ErrorResponse"
 ]
\ No newline at end of file
@@ -71,6 +71,33 @@ class RoadmapStepUpdate(BaseModel):
         }
 
 
+class PurgeRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="IDs dos usuários a remover")
+    currentProfession: Optional[str] = Field(None, description="Remove usuários com esta profissão")
+    experienceLevel: Optional[str] = Field(None, description="Remove usuários com este nível de experiência")
+    emailDomain: Optional[str] = Field(None, description="Remove usuários com email neste domínio")
+    batchSize: int = Field(500, ge=1, le=10000, description="Usuários removidos por transação")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "emailDomain": "empresa-encerrada.com",
+                "batchSize": 500
+            }
+        }
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., description="IDs dos usuários (até 500 por chamada)")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "ids": [1, 2, 3]
+            }
+        }
+
+
 class UsuarioResponse(BaseModel):
     id: int
     name: str
@@ -97,6 +124,41 @@ class UsuarioResponse(BaseModel):
         }
 
 
+class ParResponse(BaseModel):
+    id: int
+    name: str
+    currentProfession: str
+    experienceLevel: str
+    weeklyStudyTime: float
+    interests: str
+    qualities: List[str]
+    similarity: float
+
+
+class ParesResponse(BaseModel):
+    userId: int
+    peers: List[ParResponse]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "userId": 1,
+                "peers": [
+                    {
+                        "id": 42,
+                        "name": "Maria Souza",
+                        "currentProfession": "Operadora de Caixa",
+                        "experienceLevel": "iniciante",
+                        "weeklyStudyTime": 6.0,
+                        "interests": "Tecnologia, Gestão de Projetos",
+                        "qualities": ["Proativa"],
+                        "similarity": 0.8731
+                    }
+                ]
+            }
+        }
+
+
 class RoadmapStepResponse(BaseModel):
     id: str
     title: str
@@ -143,6 +205,138 @@ class RoadmapResponse(BaseModel):
         }
 
 
+class UsuariosBatchResponse(BaseModel):
+    users: List[UsuarioResponse]
+    notFound: List[int]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "users": [
+                    {
+                        "id": 1,
+                        "name": "João Silva",
+                        "email": "joao@email.com",
+                        "currentProfession": "Operador de Caixa",
+                        "experienceLevel": "iniciante",
+                        "weeklyStudyTime": 5.0,
+                        "interests": "Tecnologia, Gestão de Projetos",
+                        "qualities": ["Dedicado", "Proativo"]
+                    }
+                ],
+                "notFound": [3]
+            }
+        }
+
+
+class RoadmapUsuarioResponse(BaseModel):
+    userId: int
+    roadmapSteps: List[RoadmapStepResponse]
+
+
+class RoadmapsBatchResponse(BaseModel):
+    roadmaps: List[RoadmapUsuarioResponse]
+    notFound: List[int]
+    withoutRoadmap: List[int]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "roadmaps": [
+                    {
+                        "userId": 1,
+                        "roadmapSteps": [
+                            {
+                                "id": "1",
+                                "title": "Autoconhecimento e Análise de Mercado",
+                                "description": "Pesquisar tendências e identificar áreas em crescimento",
+                                "completed": True,
+                                "order": 1
+                            }
+                        ]
+                    }
+                ],
+                "notFound": [3],
+                "withoutRoadmap": [2]
+            }
+        }
+
+
+class ProgressoResponse(BaseModel):
+    completedSteps: List[int]
+    inProgressSteps: List[int]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "completedSteps": [1, 2],
+                "inProgressSteps": [3]
+            }
+        }
+
+
+class ProgressoAgregadoResponse(BaseModel):
+    stepId: int
+    currentProfession: Optional[str] = None
+    experienceLevel: Optional[str] = None
+    pending: int
+    inProgress: int
+    completed: int
+    completionRate: float
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "stepId": 1,
+                "currentProfession": "Operador de Caixa",
+                "experienceLevel": "iniciante",
+                "pending": 3,
+                "inProgress": 5,
+                "completed": 12,
+                "completionRate": 0.6
+            }
+        }
+
+
+class AnalyticsResponse(BaseModel):
+    byStep: List[ProgressoAgregadoResponse]
+    byProfession: List[ProgressoAgregadoResponse]
+    byExperienceLevel: List[ProgressoAgregadoResponse]
+    segments: List[ProgressoAgregadoResponse]
+
+
+class CacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    expired: int
+    invalidations: int
+    remoteInvalidations: int
+    evictions: int
+    entries: int
+    bytes: int
+    hitRate: float
+    averageAgeSeconds: float
+    maxAgeSeconds: float
+    ttlSeconds: float
+
+    @classmethod
+    def do_cache(cls, estatisticas: dict) -> "CacheStatsResponse":
+        return cls(
+            hits=estatisticas["hits"],
+            misses=estatisticas["misses"],
+            expired=estatisticas["expirados"],
+            invalidations=estatisticas["invalidacoes"],
+            remoteInvalidations=estatisticas["invalidacoes_remotas"],
+            evictions=estatisticas["evictions"],
+            entries=estatisticas["entradas"],
+            bytes=estatisticas["bytes"],
+            hitRate=estatisticas["hit_rate"],
+            averageAgeSeconds=estatisticas["idade_media_segundos"],
+            maxAgeSeconds=estatisticas["idade_maxima_segundos"],
+            ttlSeconds=estatisticas["ttl_segundos"],
+        )
+
+
 class MessageResponse(BaseModel):
     message: str
     success: bool = True
@@ -156,6 +350,27 @@ class MessageResponse(BaseModel):
         }
 
 
+class PurgeResponse(BaseModel):
+    usersDeleted: int
+    statusRowsDeleted: int
+    userStepRowsDeleted: int
+    rowsDeleted: int
+    seconds: float
+    rowsPerSecond: float
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "usersDeleted": 1200,
+                "statusRowsDeleted": 5400,
+                "userStepRowsDeleted": 0,
+                "rowsDeleted": 8400,
+                "seconds": 0.84,
+                "rowsPerSecond": 10000.0
+            }
+        }
+
+
 class ErrorResponse(BaseModel):
     message: str
     success: bool = False
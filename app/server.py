@@ -0,0 +1,60 @@
+"""
+Ponto de entrada de produção: API e autenticação (montada em /auth) num processo só, com N workers.
+
+    python -m app.server
+
+Usa gunicorn com workers uvicorn (configuração em app/gunicorn_conf.py). Sem gunicorn
+(ex.: Windows), cai para o uvicorn com o mesmo número de workers, sem preload.
+Para desenvolvimento continua valendo `uvicorn app.main:app --reload`.
+"""
+from app import gunicorn_conf
+
+
+CONFIGURACOES = [
+    "bind", "workers", "worker_class", "preload_app", "backlog", "keepalive", "timeout", "graceful_timeout",
+    "max_requests", "max_requests_jitter", "accesslog", "errorlog", "loglevel", "on_starting", "post_fork",
+]
+
+
+def _gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Servidor(BaseApplication):
+        def load_config(self):
+            for nome in CONFIGURACOES:
+                self.cfg.set(nome, getattr(gunicorn_conf, nome))
+
+        def load(self):
+            from app.main import app
+
+            return app
+
+    return Servidor()
+
+
+def main() -> None:
+    try:
+        servidor = _gunicorn()
+    except ImportError:
+        import uvicorn
+
+        # Com gunicorn a verificação roda no on_starting do master
+        gunicorn_conf.verificar_workers(gunicorn_conf.workers)
+        host, porta = gunicorn_conf.bind.rsplit(":", 1)
+        uvicorn.run(
+            "app.main:app",
+            host=host,
+            port=int(porta),
+            workers=gunicorn_conf.workers,
+            backlog=gunicorn_conf.backlog,
+            timeout_keep_alive=gunicorn_conf.keepalive,
+            timeout_graceful_shutdown=gunicorn_conf.graceful_timeout,
+            limit_max_requests=gunicorn_conf.max_requests,
+        )
+        return
+
+    servidor.run()
+
+
+if __name__ == "__main__":
+    main()
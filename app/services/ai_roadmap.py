@@ -1,7 +1,60 @@
 import os
 import json
-import requests
-from typing import List, Dict, Any
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services.cache import obter_cache_roadmaps
+from app.tracing import span
+
+
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+
+# Modelos da Groq que aceitam structured outputs com schema; os demais usam o modo json_object
+MODELOS_COM_JSON_SCHEMA = {
+    "openai/gpt-oss-20b",
+    "openai/gpt-oss-120b",
+    "moonshotai/kimi-k2-instruct",
+}
+
+TOTAL_STEPS = 7
+
+# Campos do perfil que alimentam o prompt; cada passo registra de quais deles depende
+CAMPOS_PERFIL = ["profissao", "nivel_experience", "tempo_estudo_semanal", "interesses", "qualidades"]
+
+GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+# (conexão, leitura) de cada chamada: é o que limita uma Groq travada, já que a thread do bulkhead
+# não é interrompida por nenhum timeout do servidor
+GROQ_TIMEOUT = (5, float(os.getenv("GROQ_TIMEOUT_SEGUNDOS", "30")))
+
+SYSTEM_PROMPT = (
+    "Você é um especialista em desenvolvimento de carreira e criação de roadmaps personalizados. "
+    "Sempre retorne respostas em formato JSON válido sem comentários adicionais."
+)
+
+ROADMAP_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "order": {"type": "integer"},
+                    "basedOn": {"type": "array", "items": {"type": "string", "enum": CAMPOS_PERFIL}}
+                },
+                "required": ["id", "title", "description", "order", "basedOn"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["steps"],
+    "additionalProperties": False
+}
 
 
 def gerar_roadmap_ai(usuario) -> List[Dict[str, Any]]:
@@ -9,9 +62,114 @@ def gerar_roadmap_ai(usuario) -> List[Dict[str, Any]]:
     if not groq_api_key:
         return _gerar_roadmap_mock(usuario)
 
+    prompt = _montar_prompt(usuario)
+    chave = chave_roadmap(prompt)
+    em_cache = obter_cache_roadmaps().obter(chave)
+    if em_cache is not None:
+        return em_cache
+
+    messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+    try:
+        content = _chamar_groq(groq_api_key, messages, max_tokens=2000)
+        steps_validos = _extrair_steps_validos(content)
+    except Exception:
+        return _gerar_roadmap_mock(usuario)
+
+    if not steps_validos:
+        return _gerar_roadmap_mock(usuario)
+
+    # Só os passos ausentes ou inválidos são pedidos de novo, numa chamada curta
+    faltantes = [ordem for ordem in range(1, TOTAL_STEPS + 1) if ordem not in steps_validos]
+    if faltantes:
+        try:
+            steps_validos.update(
+                _regenerar_steps_faltantes(groq_api_key, prompt, steps_validos, faltantes)
+            )
+        except Exception:
+            pass
+
+    roadmap = _montar_roadmap(steps_validos, usuario)
+    # Só roadmaps inteiros da IA entram no cache; com passos do padrão, a próxima vez tenta de novo
+    if len(steps_validos) == TOTAL_STEPS:
+        obter_cache_roadmaps().guardar(chave, roadmap)
+    return roadmap
+
+
+def regenerar_steps_ai(usuario, roadmap_atual: List[Dict[str, Any]],
+                       campos_alterados: List[str]) -> Tuple[List[Dict[str, Any]], List[int], List[int]]:
+    """
+    Reescreve apenas os passos que dependem dos campos alterados do perfil.
+    Retorna o roadmap atualizado, as ordens dos passos efetivamente substituídos e as ordens
+    que a IA conseguiu gerar de novo (mesmo que com o mesmo conteúdo).
+    """
+    afetados = [
+        step["order"] for step in roadmap_atual
+        if set(step.get("basedOn", CAMPOS_PERFIL)) & set(campos_alterados)
+    ]
+    if not afetados:
+        return roadmap_atual, [], []
+
+    mantidos = {step["order"]: step for step in roadmap_atual if step["order"] not in afetados}
+
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    if groq_api_key:
+        try:
+            novos = _regenerar_steps_faltantes(groq_api_key, _montar_prompt(usuario), mantidos, afetados)
+        except Exception:
+            novos = {}
+    else:
+        mock = {int(step["id"]): step for step in _gerar_roadmap_mock(usuario)}
+        novos = {ordem: mock[ordem] for ordem in afetados}
+
+    roadmap = []
+    substituidos = []
+    for step in roadmap_atual:
+        novo = novos.get(step["order"])
+        if novo and (novo["title"], novo["description"]) != (step["title"], step["description"]):
+            step = {
+                "id": step["id"],
+                "title": novo["title"],
+                "description": novo["description"],
+                "basedOn": novo["basedOn"],
+                "completed": False,
+                "order": step["order"]
+            }
+            substituidos.append(step["order"])
+        roadmap.append(step)
+
+    return roadmap, substituidos, sorted(novos)
+
+
+def versao_prompt() -> str:
+    """Hash do que define a geração além do perfil: modelo, system prompt, template e formato de resposta."""
+    sentinela = SimpleNamespace(profissao="{profissao}", nivel_experience="{nivel}", tempo_estudo_semanal="{tempo}",
+                                interesses="{interesses}", qualidades="[]")
+    partes = [GROQ_MODEL, SYSTEM_PROMPT, _montar_prompt(sentinela), json.dumps(_response_format(), sort_keys=True)]
+    return hashlib.sha256("\x00".join(partes).encode("utf-8")).hexdigest()
+
+
+def chave_roadmap(prompt: str) -> str:
+    return hashlib.sha256(f"{versao_prompt()}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def perfil_roadmap(usuario) -> Dict[str, Any]:
+    return {campo: getattr(usuario, campo, None) for campo in CAMPOS_PERFIL}
+
+
+def _montar_prompt(usuario) -> str:
     qualidades_list = _parse_qualidades(usuario.qualidades) if hasattr(usuario, 'qualidades') and usuario.qualidades else []
 
-    prompt = f"""
+    return f"""
 Crie um roadmap de desenvolvimento profissional com EXATAMENTE 7 passos para:
 
 PERFIL DO USUÁRIO:
@@ -28,73 +186,133 @@ REGRAS IMPORTANTES:
 - Foque em habilidades práticas e demandadas pelo mercado
 - Seja específico em recursos reais (plataformas, cursos, ferramentas)
 - Inclua apenas o essencial para não sobrecarregar
+- Em "basedOn", liste os campos do perfil em que o passo se baseia: {', '.join(CAMPOS_PERFIL)}
 
 FORMATO DE RESPOSTA (OBRIGATÓRIO):
 Retorne APENAS um JSON válido com esta estrutura exata:
-[
-  {{
-    "id": "1",
-    "title": "Título claro e específico do passo",
-    "description": "Descrição detalhada do que fazer, com recursos e tempo estimado",
-    "order": 1
-  }},
-  {{
-    "id": "2",
-    "title": "Título do segundo passo",
-    "description": "Descrição com detalhes práticos",
-    "order": 2
-  }}
-  // Continue até o passo 7
-]
+{{
+  "steps": [
+    {{
+      "id": "1",
+      "title": "Título claro e específico do passo",
+      "description": "Descrição detalhada do que fazer, com recursos e tempo estimado",
+      "order": 1,
+      "basedOn": ["profissao", "interesses"]
+    }},
+    {{
+      "id": "2",
+      "title": "Título do segundo passo",
+      "description": "Descrição com detalhes práticos",
+      "order": 2,
+      "basedOn": ["nivel_experience", "tempo_estudo_semanal"]
+    }}
+    // Continue até o passo 7
+  ]
+}}
 
 NÃO inclua textos fora do JSON. Retorne APENAS o JSON.
 """
 
-    try:
-        url = "https://api.groq.com/openai/v1/chat/completions"
 
-        headers = {
-            "Authorization": f"Bearer {groq_api_key}",
-            "Content-Type": "application/json"
-        }
+_sessao_http = None
+_sessao_lock = threading.Lock()
+
+
+def obter_sessao_http():
+    """
+    Sessão HTTP compartilhada (keep-alive e TLS reaproveitados entre chamadas à Groq).
+    `requests` só é importado aqui, no primeiro uso, para não pesar no start do worker.
+    """
+    global _sessao_http
+    if _sessao_http is None:
+        with _sessao_lock:
+            if _sessao_http is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                sessao = requests.Session()
+                # Um slot por thread do threadpool do FastAPI (40) que pode estar gerando roadmap
+                sessao.mount("https://", HTTPAdapter(pool_maxsize=40))
+                _sessao_http = sessao
+    return _sessao_http
 
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Você é um especialista em desenvolvimento de carreira e criação de roadmaps personalizados. Sempre retorne respostas em formato JSON válido sem comentários adicionais."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
 
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+def aquecer_cliente_http() -> None:
+    # Abre a conexão TLS com a Groq antes do primeiro roadmap; falhas aqui não importam
+    sessao = obter_sessao_http()
+    if os.getenv("GROQ_API_KEY"):
+        try:
+            sessao.head(GROQ_URL, timeout=5)
+        except Exception:
+            pass
+
+
+def _chamar_groq(groq_api_key: str, messages: List[Dict[str, str]], max_tokens: int) -> str:
+    url = GROQ_URL
+
+    headers = {
+        "Authorization": f"Bearer {groq_api_key}",
+        "Content-Type": "application/json"
+    }
+
+    payload = {
+        "model": GROQ_MODEL,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": max_tokens,
+        "response_format": _response_format()
+    }
+
+    with span("groq.chat_completions", **{"llm.model": GROQ_MODEL, "llm.max_tokens": max_tokens}) as atual:
+        response = obter_sessao_http().post(url, headers=headers, json=payload, timeout=GROQ_TIMEOUT)
+
+        # Modelos sem suporte a response_format respondem 400: tenta de novo em modo texto
+        if response.status_code == 400:
+            payload.pop("response_format")
+            response = obter_sessao_http().post(url, headers=headers, json=payload, timeout=GROQ_TIMEOUT)
+
+        if atual is not None:
+            atual.atributos["http.status_code"] = response.status_code
         response.raise_for_status()
 
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
+    result = response.json()
+    return result["choices"][0]["message"]["content"]
 
-        content = content.strip()
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
 
-        roadmap_steps = json.loads(content)
+def _response_format() -> Dict[str, Any]:
+    if GROQ_MODEL in MODELOS_COM_JSON_SCHEMA:
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "roadmap", "schema": ROADMAP_JSON_SCHEMA}
+        }
+    return {"type": "json_object"}
 
-        return _validar_roadmap(roadmap_steps)
 
-    except Exception as e:
-        return _gerar_roadmap_mock(usuario)
+def _regenerar_steps_faltantes(groq_api_key: str, prompt: str, steps_validos: Dict[int, Dict[str, Any]],
+                               faltantes: List[int]) -> Dict[int, Dict[str, Any]]:
+    existentes = "\n".join(
+        f"{ordem}. {step['title']}" for ordem, step in sorted(steps_validos.items())
+    )
+
+    followup = f"""
+Os passos abaixo do roadmap já estão prontos:
+{existentes or "(nenhum)"}
+
+Gere SOMENTE os passos de ordem {', '.join(str(o) for o in faltantes)}, coerentes com os passos acima
+e com o perfil informado anteriormente, sem repetir conteúdo.
+
+Retorne APENAS um JSON no formato {{"steps": [{{"id": "N", "title": "...", "description": "...", "order": N, "basedOn": [...]}}]}}.
+"""
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+        {"role": "user", "content": followup}
+    ]
+
+    content = _chamar_groq(groq_api_key, messages, max_tokens=250 * len(faltantes) + 100)
+    regenerados = _extrair_steps_validos(content, ordens_permitidas=faltantes)
+    return {ordem: step for ordem, step in regenerados.items() if ordem in faltantes}
 
 
 def _parse_qualidades(qualidades_str: str) -> List[str]:
@@ -104,28 +322,140 @@ def _parse_qualidades(qualidades_str: str) -> List[str]:
         return []
 
 
-def _validar_roadmap(roadmap_steps: List[Dict]) -> List[Dict[str, Any]]:
-    if not isinstance(roadmap_steps, list):
-        raise ValueError("Resposta deve ser uma lista")
+def _extrair_steps_validos(content: str, ordens_permitidas: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    Faz o parse tolerante da resposta do modelo e devolve os passos válidos indexados pela ordem.
+    Passos quebrados são descartados em vez de invalidar a resposta inteira.
+    """
+    ordens = list(ordens_permitidas or range(1, TOTAL_STEPS + 1))
 
-    if len(roadmap_steps) != 7:
-        raise ValueError("Roadmap deve ter exatamente 7 passos")
+    candidatos = _candidatos_steps(_remover_cercas_markdown(content))
 
-    validated_steps = []
-    for i, step in enumerate(roadmap_steps, 1):
-        if not isinstance(step, dict):
+    steps_validos: Dict[int, Dict[str, Any]] = {}
+    sem_ordem = []
+    for step in candidatos:
+        if not _step_valido(step):
             continue
 
-        validated_step = {
-            "id": str(i),
-            "title": step.get("title", f"Passo {i}"),
-            "description": step.get("description", "Descrição não disponível"),
-            "completed": False,
-            "order": i
+        ordem = _ordem_do_step(step)
+        if ordem in ordens and ordem not in steps_validos:
+            steps_validos[ordem] = step
+        else:
+            sem_ordem.append(step)
+
+    # Passos com ordem ausente ou repetida ocupam as posições que sobraram
+    livres = [ordem for ordem in ordens if ordem not in steps_validos]
+    for ordem, step in zip(livres, sem_ordem):
+        steps_validos[ordem] = step
+
+    return {
+        ordem: {
+            "title": step["title"].strip(),
+            "description": step["description"].strip(),
+            "basedOn": _campos_do_step(step)
         }
-        validated_steps.append(validated_step)
+        for ordem, step in steps_validos.items()
+    }
+
+
+def _remover_cercas_markdown(content: str) -> str:
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+
+def _candidatos_steps(content: str) -> List[Any]:
+    try:
+        dados = json.loads(content)
+    except json.JSONDecodeError:
+        return _salvar_objetos(content)
+
+    if isinstance(dados, dict):
+        for chave in ("steps", "roadmap", "roadmapSteps"):
+            if isinstance(dados.get(chave), list):
+                return dados[chave]
+        return [dados]
+
+    if isinstance(dados, list):
+        return dados
+
+    return []
+
+
+def _salvar_objetos(content: str) -> List[Any]:
+    # JSON truncado ou com comentários: recupera cada objeto completo que ainda for decodificável
+    decoder = json.JSONDecoder()
+    objetos = []
+    pos = content.find("{")
+    while pos != -1:
+        try:
+            objeto, fim = decoder.raw_decode(content, pos)
+        except json.JSONDecodeError:
+            pos = content.find("{", pos + 1)
+            continue
+
+        if isinstance(objeto, dict) and isinstance(objeto.get("steps"), list):
+            objetos.extend(objeto["steps"])
+        else:
+            objetos.append(objeto)
+        pos = content.find("{", fim)
+
+    return objetos
+
+
+def _step_valido(step: Any) -> bool:
+    if not isinstance(step, dict):
+        return False
+
+    title = step.get("title")
+    description = step.get("description")
+    return (
+        isinstance(title, str) and len(title.strip()) >= 2
+        and isinstance(description, str) and len(description.strip()) >= 2
+    )
+
+
+def _campos_do_step(step: Dict[str, Any]) -> List[str]:
+    # Sem a informação, o passo é tratado como dependente do perfil inteiro
+    campos = step.get("basedOn")
+    if not isinstance(campos, list):
+        return list(CAMPOS_PERFIL)
+
+    validos = [campo for campo in CAMPOS_PERFIL if campo in campos]
+    return validos or list(CAMPOS_PERFIL)
+
+
+def _ordem_do_step(step: Dict[str, Any]) -> Optional[int]:
+    for chave in ("order", "id"):
+        try:
+            return int(step.get(chave))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _montar_roadmap(steps_validos: Dict[int, Dict[str, Any]], usuario) -> List[Dict[str, Any]]:
+    # O que nem a chamada de reparo conseguiu gerar vem do roadmap padrão, na mesma posição
+    mock = {int(step["id"]): step for step in _gerar_roadmap_mock(usuario)}
+
+    roadmap = []
+    for ordem in range(1, TOTAL_STEPS + 1):
+        step = steps_validos.get(ordem, mock[ordem])
+        roadmap.append({
+            "id": str(ordem),
+            "title": step["title"],
+            "description": step["description"],
+            "basedOn": step["basedOn"],
+            "completed": False,
+            "order": ordem
+        })
 
-    return validated_steps
+    return roadmap
 
 
 def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
@@ -134,6 +464,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "1",
             "title": "Autoconhecimento e Análise de Mercado",
             "description": "Pesquisar tendências e identificar áreas em crescimento no mercado atual",
+            "basedOn": ["profissao", "interesses", "qualidades"],
             "completed": False,
             "order": 1
         },
@@ -141,6 +472,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "2",
             "title": "Desenvolver Habilidades Técnicas Fundamentais",
             "description": "Fazer cursos online e praticar as habilidades essenciais para sua área",
+            "basedOn": ["profissao", "nivel_experience", "tempo_estudo_semanal"],
             "completed": False,
             "order": 2
         },
@@ -148,6 +480,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "3",
             "title": "Construir Portfólio de Projetos",
             "description": "Criar projetos práticos que demonstrem suas habilidades para o mercado",
+            "basedOn": ["profissao", "interesses"],
             "completed": False,
             "order": 3
         },
@@ -155,6 +488,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "4",
             "title": "Networking Estratégico",
             "description": "Conectar-se com profissionais da área e participar de comunidades",
+            "basedOn": ["profissao", "interesses"],
             "completed": False,
             "order": 4
         },
@@ -162,6 +496,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "5",
             "title": "Certificações e Validações",
             "description": "Obter certificações reconhecidas que validem suas competências",
+            "basedOn": ["profissao", "nivel_experience"],
             "completed": False,
             "order": 5
         },
@@ -169,6 +504,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "6",
             "title": "Otimizar Perfil Profissional",
             "description": "Atualizar currículo, LinkedIn e outras plataformas profissionais",
+            "basedOn": ["profissao", "qualidades"],
             "completed": False,
             "order": 6
         },
@@ -176,6 +512,7 @@ def _gerar_roadmap_mock(usuario) -> List[Dict[str, Any]]:
             "id": "7",
             "title": "Aplicação para Oportunidades",
             "description": "Candidatar-se a vagas e oportunidades compatíveis com seu novo perfil",
+            "basedOn": ["profissao", "nivel_experience"],
             "completed": False,
             "order": 7
         }
@@ -0,0 +1,209 @@
+from collections import defaultdict
+from typing import Optional, List, Dict, Tuple
+
+from sqlalchemy import func, case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.database import AgregadoProgresso, StatusStep, StatusStepEnum, Usuario, insert_com_upsert
+from app.models.sharding import para_cada_shard
+from app.schemas.pydantic import AnalyticsResponse, ProgressoAgregadoResponse
+
+
+# Coluna do agregado que conta cada status
+COLUNAS_STATUS = {
+    StatusStepEnum.PENDENTE: "pendentes",
+    StatusStepEnum.EM_ANDAMENTO: "em_andamento",
+    StatusStepEnum.CONCLUIDO: "concluidos",
+}
+
+
+def registrar_transicao(db: Session, user_id: int, id_step: int,
+                        anterior: Optional[StatusStepEnum], novo: Optional[StatusStepEnum]) -> None:
+    """
+    Aplica a transição de status de um passo nos contadores do perfil do usuário.
+    Roda na sessão do chamador, então entra no mesmo commit da alteração do StatusStep.
+    """
+    if anterior == novo:
+        return
+
+    # Profissão e nível vêm da linha do usuário, travada nesta transação: o perfil em cache pode estar
+    # defasado, e uma troca de profissão simultânea espera este commit para mover os status
+    profissao, nivel = db.execute(
+        select(Usuario.profissao, Usuario.nivel_experience).where(Usuario.id == user_id).with_for_update()
+    ).one()
+
+    variacoes = {}
+    if anterior is not None:
+        variacoes[anterior] = -1
+    if novo is not None:
+        variacoes[novo] = 1
+    _somar_no_agregado(db, id_step, profissao, nivel, variacoes)
+
+
+def mover_status_usuario(db: Session, user_id: int, origem: Tuple[str, str], destino: Tuple[str, str]) -> None:
+    """
+    Move os status atuais do usuário do perfil (profissao, nivel_experience) de origem para o de destino.
+    Chamado na mesma transação que troca a profissão, para o agregado não esperar a reconciliação noturna.
+    """
+    if origem == destino:
+        return
+
+    grupos = db.query(StatusStep.id_step, StatusStep.status, func.count(StatusStep.id)).filter(
+        StatusStep.id_usuario == user_id
+    ).group_by(StatusStep.id_step, StatusStep.status).all()
+
+    por_step: Dict[int, Dict[StatusStepEnum, int]] = defaultdict(dict)
+    for id_step, status, quantidade in grupos:
+        por_step[id_step][status] = quantidade
+
+    for id_step, contagem in por_step.items():
+        _somar_no_agregado(db, id_step, *origem, {status: -n for status, n in contagem.items()})
+        _somar_no_agregado(db, id_step, *destino, contagem)
+
+
+def _somar_no_agregado(db: Session, id_step: int, profissao: str, nivel: str,
+                       variacoes_status: Dict[StatusStepEnum, int]) -> None:
+    # Incremento atômico no banco (col = col + n): toggles simultâneos não perdem contagem,
+    # e o primeiro toggle de um perfil cria a linha sem disputar a constraint única
+    chave = {"id_step": id_step, "profissao": profissao, "nivel_experience": nivel}
+    valores = {coluna: 0 for coluna in COLUNAS_STATUS.values()}
+    variacoes = {}
+    for status, quantidade in variacoes_status.items():
+        coluna = getattr(AgregadoProgresso, COLUNAS_STATUS[status])
+        if quantidade < 0:
+            variacoes[coluna.key] = case((coluna > -quantidade, coluna + quantidade), else_=0)
+        else:
+            valores[coluna.key] = quantidade
+            variacoes[coluna.key] = coluna + quantidade
+
+    insert_upsert = insert_com_upsert(db, AgregadoProgresso)
+    if insert_upsert is not None:
+        db.execute(insert_upsert.values(**chave, **valores).on_conflict_do_update(
+            index_elements=list(chave), set_=variacoes
+        ))
+        return
+
+    filtro = [getattr(AgregadoProgresso, campo) == valor for campo, valor in chave.items()]
+    if db.execute(update(AgregadoProgresso).where(*filtro).values(**variacoes)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(AgregadoProgresso).values(**chave, **valores))
+    except IntegrityError:
+        db.execute(update(AgregadoProgresso).where(*filtro).values(**variacoes))
+
+
+def remover_status_usuarios(db: Session, ids_usuarios: List[int], ids_steps: Optional[List[int]] = None) -> None:
+    """
+    Tira dos contadores os status que vão ser apagados (usuários removidos ou passos regenerados).
+    Uma consulta agrupada por lote, sem carregar as linhas de StatusStep.
+    """
+    query = db.query(
+        StatusStep.id_step,
+        Usuario.profissao,
+        Usuario.nivel_experience,
+        StatusStep.status,
+        func.count(StatusStep.id),
+    ).join(Usuario, Usuario.id == StatusStep.id_usuario).filter(StatusStep.id_usuario.in_(ids_usuarios))
+    if ids_steps is not None:
+        query = query.filter(StatusStep.id_step.in_(ids_steps))
+
+    grupos = query.group_by(
+        StatusStep.id_step, Usuario.profissao, Usuario.nivel_experience, StatusStep.status
+    ).all()
+
+    for id_step, profissao, nivel, status, quantidade in grupos:
+        coluna = getattr(AgregadoProgresso, COLUNAS_STATUS[status])
+        db.query(AgregadoProgresso).filter(
+            AgregadoProgresso.id_step == id_step,
+            AgregadoProgresso.profissao == profissao,
+            AgregadoProgresso.nivel_experience == nivel
+        ).update(
+            {coluna: case((coluna > quantidade, coluna - quantidade), else_=0)},
+            synchronize_session=False
+        )
+
+
+def recalcular_agregados(db: Session) -> int:
+    """
+    Reconstrói todos os contadores a partir do StatusStep. Pensado para rodar uma vez por noite,
+    corrigindo desvios do incremental (ex.: linhas apagadas fora da API).
+    """
+    return sum(_recalcular_shard(sessao) for sessao in para_cada_shard(db))
+
+
+def _recalcular_shard(db: Session) -> int:
+    linhas = db.query(
+        StatusStep.id_step,
+        Usuario.profissao,
+        Usuario.nivel_experience,
+        func.sum(case((StatusStep.status == StatusStepEnum.PENDENTE, 1), else_=0)),
+        func.sum(case((StatusStep.status == StatusStepEnum.EM_ANDAMENTO, 1), else_=0)),
+        func.sum(case((StatusStep.status == StatusStepEnum.CONCLUIDO, 1), else_=0)),
+    ).join(Usuario, Usuario.id == StatusStep.id_usuario).group_by(
+        StatusStep.id_step, Usuario.profissao, Usuario.nivel_experience
+    ).all()
+
+    db.query(AgregadoProgresso).delete(synchronize_session=False)
+    db.add_all([
+        AgregadoProgresso(
+            id_step=id_step,
+            profissao=profissao,
+            nivel_experience=nivel,
+            pendentes=pendentes,
+            em_andamento=em_andamento,
+            concluidos=concluidos
+        )
+        for id_step, profissao, nivel, pendentes, em_andamento, concluidos in linhas
+    ])
+    db.commit()
+
+    return len(linhas)
+
+
+def obter_analytics(db: Session) -> AnalyticsResponse:
+    # Com shards, cada um tem os agregados dos seus usuários: a soma é feita aqui
+    agregados = [agregado for sessao in para_cada_shard(db) for agregado in sessao.query(AgregadoProgresso).all()]
+
+    por_step: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+    por_profissao: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+    por_nivel: Dict[Tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+    segmentos: Dict[Tuple, List[int]] = {}
+
+    for agregado in agregados:
+        contagem = [agregado.pendentes, agregado.em_andamento, agregado.concluidos]
+        chaves = [
+            (por_step, (agregado.id_step, None, None)),
+            (por_profissao, (agregado.id_step, agregado.profissao, None)),
+            (por_nivel, (agregado.id_step, None, agregado.nivel_experience)),
+        ]
+        for destino, chave in chaves:
+            destino[chave] = [a + b for a, b in zip(destino[chave], contagem)]
+        chave = (agregado.id_step, agregado.profissao, agregado.nivel_experience)
+        segmentos[chave] = [a + b for a, b in zip(segmentos.get(chave, [0, 0, 0]), contagem)]
+
+    return AnalyticsResponse(
+        byStep=_formatar_linhas(por_step),
+        byProfession=_formatar_linhas(por_profissao),
+        byExperienceLevel=_formatar_linhas(por_nivel),
+        segments=_formatar_linhas(segmentos),
+    )
+
+
+def _formatar_linhas(grupos: Dict[Tuple, List[int]]) -> List[ProgressoAgregadoResponse]:
+    linhas = []
+    for (id_step, profissao, nivel), (pendentes, em_andamento, concluidos) in sorted(
+        grupos.items(), key=lambda item: (item[0][0], item[0][1] or "", item[0][2] or "")
+    ):
+        total = pendentes + em_andamento + concluidos
+        linhas.append(ProgressoAgregadoResponse(
+            stepId=id_step,
+            currentProfession=profissao,
+            experienceLevel=nivel,
+            pending=pendentes,
+            inProgress=em_andamento,
+            completed=concluidos,
+            completionRate=round(concluidos / total, 4) if total else 0.0,
+        ))
+    return linhas
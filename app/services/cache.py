@@ -0,0 +1,326 @@
+import copy
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.services.eventos import obter_pubsub
+
+
+PERFIL_CACHE_MAX_ENTRADAS = int(os.getenv("PERFIL_CACHE_MAX_ENTRADAS", "10000"))
+PERFIL_CACHE_MAX_BYTES = int(os.getenv("PERFIL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Limite de staleness quando outro worker altera o usuário e não há canal de invalidação
+PERFIL_CACHE_TTL_SEGUNDOS = float(os.getenv("PERFIL_CACHE_TTL_SEGUNDOS", "300"))
+ROADMAP_CACHE_MAX_ENTRADAS = int(os.getenv("ROADMAP_CACHE_MAX_ENTRADAS", "5000"))
+
+CANAL_INVALIDACAO = "cache:perfis"
+
+
+class PerfilUsuario(BaseModel):
+    """Cópia desacoplada da sessão com os campos do UsuarioResponse e os usados no prompt do roadmap."""
+
+    id: int
+    nome: str
+    email: str
+    profissao: str
+    nivel_experience: str
+    tempo_estudo_semanal: float
+    interesses: str
+    qualidades: str
+
+    @classmethod
+    def do_usuario(cls, usuario) -> "PerfilUsuario":
+        return cls(
+            id=usuario.id,
+            nome=usuario.nome,
+            email=usuario.email,
+            profissao=usuario.profissao,
+            nivel_experience=usuario.nivel_experience,
+            tempo_estudo_semanal=usuario.tempo_estudo_semanal,
+            interesses=usuario.interesses,
+            qualidades=usuario.qualidades,
+        )
+
+    def tamanho_bytes(self) -> int:
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(valor) for valor in (self.nome, self.email, self.profissao, self.nivel_experience,
+                                               self.interesses, self.qualidades)
+        )
+
+
+class _Entrada:
+    __slots__ = ("perfil", "carregado_em", "tamanho")
+
+    def __init__(self, perfil: PerfilUsuario):
+        self.perfil = perfil
+        self.carregado_em = time.monotonic()
+        self.tamanho = perfil.tamanho_bytes()
+
+
+class CachePerfis:
+    """
+    Cache read-through de perfis, LRU limitado por número de entradas e por memória estimada.
+    Invalidação síncrona no worker que escreve; os demais recebem pelo pub/sub, se houver.
+    """
+
+    def __init__(self, max_entradas: int = PERFIL_CACHE_MAX_ENTRADAS, max_bytes: int = PERFIL_CACHE_MAX_BYTES,
+                 ttl: float = PERFIL_CACHE_TTL_SEGUNDOS):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entradas: "OrderedDict[int, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        self._geracao = 0
+        self._lock = threading.Lock()
+        self._origem = uuid.uuid4().hex
+        self._canal_ativo = False
+        # Invalidado desde o último snapshot: a soma com o arquivo não pode trazer esses perfis de volta
+        self._invalidados: Set[int] = set()
+        self._limpezas = 0
+        self._stats = {"hits": 0, "misses": 0, "expirados": 0, "invalidacoes": 0,
+                       "invalidacoes_remotas": 0, "evictions": 0}
+
+    def obter(self, user_id: int, carregar: Callable[[], Optional[PerfilUsuario]],
+              guardar: bool = True) -> Optional[PerfilUsuario]:
+        """`guardar=False` consulta o cache mas não guarda o que for carregado (ex.: leitura de réplica)."""
+        self._ativar_canal()
+
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada and time.monotonic() - entrada.carregado_em <= self.ttl:
+                self._entradas.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entrada.perfil
+
+            if entrada:
+                self._remover(user_id)
+                self._stats["expirados"] += 1
+            self._stats["misses"] += 1
+            geracao = self._geracao
+
+        perfil = carregar()
+        if perfil is None:
+            return None
+
+        with self._lock:
+            # Uma invalidação durante a carga pode ter tornado o perfil lido obsoleto: não guarda
+            if guardar and geracao == self._geracao:
+                self._guardar(user_id, perfil)
+
+        return perfil
+
+    def obter_varios(self, ids: List[int], carregar: Callable[[List[int]], Dict[int, PerfilUsuario]],
+                     guardar: bool = True) -> Dict[int, PerfilUsuario]:
+        """Como `obter`, para vários ids: os que faltam no cache são carregados numa chamada só."""
+        self._ativar_canal()
+
+        perfis: Dict[int, PerfilUsuario] = {}
+        faltando: List[int] = []
+        with self._lock:
+            agora = time.monotonic()
+            for user_id in ids:
+                entrada = self._entradas.get(user_id)
+                if entrada and agora - entrada.carregado_em <= self.ttl:
+                    self._entradas.move_to_end(user_id)
+                    self._stats["hits"] += 1
+                    perfis[user_id] = entrada.perfil
+                    continue
+                if entrada:
+                    self._remover(user_id)
+                    self._stats["expirados"] += 1
+                self._stats["misses"] += 1
+                faltando.append(user_id)
+            geracao = self._geracao
+
+        if not faltando:
+            return perfis
+
+        carregados = carregar(faltando)
+        with self._lock:
+            if guardar and geracao == self._geracao:
+                for user_id, perfil in carregados.items():
+                    self._guardar(user_id, perfil)
+
+        perfis.update(carregados)
+        return perfis
+
+    def invalidar(self, ids: List[int], propagar: bool = True) -> None:
+        with self._lock:
+            self._geracao += 1
+            for user_id in ids:
+                self._remover(user_id)
+            self._stats["invalidacoes"] += len(ids)
+            self._invalidados.update(ids)
+            if len(self._invalidados) > self.max_entradas:
+                # Sem snapshot há muito tempo: mais barato descartar o arquivo inteiro do que guardar os ids
+                self._limpezas += 1
+                self._invalidados.clear()
+
+        if propagar and ids:
+            try:
+                obter_pubsub().publicar(CANAL_INVALIDACAO, {"ids": list(ids), "origem": self._origem})
+            except Exception:
+                # Sem o canal, os outros workers convergem pelo TTL
+                pass
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._geracao += 1
+            self._entradas.clear()
+            self._bytes = 0
+            self._limpezas += 1
+            self._invalidados.clear()
+
+    def invalidacoes_pendentes(self) -> Tuple[int, Set[int]]:
+        """Limpezas e ids invalidados desde o último snapshot confirmado."""
+        with self._lock:
+            return self._limpezas, set(self._invalidados)
+
+    def confirmar_invalidacoes(self, limpezas: int, ids: Set[int]) -> None:
+        # Só o que foi lido antes de gravar: invalidações que chegaram durante a gravação ficam para o próximo
+        with self._lock:
+            self._limpezas -= limpezas
+            self._invalidados -= ids
+
+    def exportar(self) -> List[Tuple[int, PerfilUsuario, float]]:
+        """Entradas válidas como (user_id, perfil, idade em segundos), da menos para a mais usada."""
+        with self._lock:
+            agora = time.monotonic()
+            return [
+                (user_id, entrada.perfil, agora - entrada.carregado_em)
+                for user_id, entrada in self._entradas.items()
+                if agora - entrada.carregado_em <= self.ttl
+            ]
+
+    def importar(self, entradas: List[Tuple[int, PerfilUsuario, float]]) -> int:
+        # A idade vem junto para que o TTL continue contando de quando o perfil foi lido do banco
+        importadas = 0
+        with self._lock:
+            agora = time.monotonic()
+            for user_id, perfil, idade in entradas:
+                if idade > self.ttl or user_id in self._entradas:
+                    continue
+                self._guardar(user_id, perfil)
+                self._entradas[user_id].carregado_em = agora - idade
+                importadas += 1
+        return importadas
+
+    def estatisticas(self) -> Dict[str, float]:
+        with self._lock:
+            agora = time.monotonic()
+            idades = [agora - entrada.carregado_em for entrada in self._entradas.values()]
+            consultas = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "hit_rate": round(self._stats["hits"] / consultas, 4) if consultas else 0.0,
+                "idade_media_segundos": round(sum(idades) / len(idades), 3) if idades else 0.0,
+                "idade_maxima_segundos": round(max(idades), 3) if idades else 0.0,
+                "ttl_segundos": self.ttl,
+            }
+
+    def _guardar(self, user_id: int, perfil: PerfilUsuario) -> None:
+        self._remover(user_id)
+        entrada = _Entrada(perfil)
+        self._entradas[user_id] = entrada
+        self._bytes += entrada.tamanho
+
+        while self._entradas and (len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes):
+            antigo, _ = next(iter(self._entradas.items()))
+            self._remover(antigo)
+            self._stats["evictions"] += 1
+
+    def _remover(self, user_id: int) -> None:
+        entrada = self._entradas.pop(user_id, None)
+        if entrada:
+            self._bytes -= entrada.tamanho
+
+    def _ativar_canal(self) -> None:
+        if self._canal_ativo:
+            return
+        self._canal_ativo = True
+        try:
+            obter_pubsub().ouvir(CANAL_INVALIDACAO, self._receber_invalidacao)
+        except Exception:
+            pass
+
+    def _receber_invalidacao(self, mensagem: Dict) -> None:
+        if mensagem.get("origem") == self._origem:
+            return
+        self.invalidar(mensagem.get("ids", []), propagar=False)
+        with self._lock:
+            self._stats["invalidacoes_remotas"] += 1
+
+
+class CacheRoadmaps:
+    """
+    Roadmaps gerados pela IA por hash de prompt + modelo: perfis iguais não pagam outra chamada à Groq.
+    Trocar o template do prompt ou o modelo muda o hash, e as entradas antigas deixam de ser achadas.
+    """
+
+    def __init__(self, max_entradas: int = ROADMAP_CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def obter(self, chave: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            roadmap = self._entradas.get(chave)
+            if roadmap is None:
+                self._stats["misses"] += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self._stats["hits"] += 1
+        # Quem chama marca `completed` nos passos: cada leitura recebe a sua cópia
+        return copy.deepcopy(roadmap)
+
+    def guardar(self, chave: str, roadmap: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entradas[chave] = copy.deepcopy(roadmap)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def exportar(self) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        with self._lock:
+            return list(self._entradas.items())
+
+    def importar(self, entradas: List[Tuple[str, List[Dict[str, Any]]]]) -> int:
+        # Entram como as menos recentes: o que já foi usado neste processo tem prioridade no LRU
+        importadas = 0
+        with self._lock:
+            for chave, roadmap in reversed(entradas):
+                if chave not in self._entradas:
+                    self._entradas[chave] = roadmap
+                    self._entradas.move_to_end(chave, last=False)
+                    importadas += 1
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return importadas
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._stats, "entradas": len(self._entradas)}
+
+
+_cache_perfis = CachePerfis()
+_cache_roadmaps = CacheRoadmaps()
+
+
+def obter_cache_perfis() -> CachePerfis:
+    return _cache_perfis
+
+
+def obter_cache_roadmaps() -> CacheRoadmaps:
+    return _cache_roadmaps
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+
+KEEPALIVE_SEGUNDOS = 15
+TAMANHO_FILA_ASSINANTE = 100
+
+
+class Assinatura:
+    """Fila de um cliente conectado; recebe eventos de qualquer thread pelo loop dono da fila."""
+
+    def __init__(self, canal: str, loop: asyncio.AbstractEventLoop):
+        self.canal = canal
+        self.loop = loop
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=TAMANHO_FILA_ASSINANTE)
+
+    def entregar(self, mensagem: Dict[str, Any]) -> None:
+        self.loop.call_soon_threadsafe(self._enfileirar, mensagem)
+
+    def _enfileirar(self, mensagem: Dict[str, Any]) -> None:
+        # Cliente lento perde os eventos mais antigos, nunca trava quem publica
+        if self.fila.full():
+            self.fila.get_nowait()
+        self.fila.put_nowait(mensagem)
+
+
+class PubSubLocal:
+    """Pub/sub em memória, válido dentro de um único processo (worker)."""
+
+    def __init__(self):
+        self._assinaturas: Dict[str, Set[Assinatura]] = defaultdict(set)
+        self._ouvintes: Dict[str, List[Callable[[Dict[str, Any]], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def publicar(self, canal: str, mensagem: Dict[str, Any]) -> None:
+        self.entregar_local(canal, mensagem)
+
+    def entregar_local(self, canal: str, mensagem: Dict[str, Any]) -> None:
+        with self._lock:
+            assinaturas = list(self._assinaturas.get(canal, ()))
+            ouvintes = list(self._ouvintes.get(canal, ()))
+        for assinatura in assinaturas:
+            assinatura.entregar(mensagem)
+        for ouvinte in ouvintes:
+            ouvinte(mensagem)
+
+    def ouvir(self, canal: str, callback: Callable[[Dict[str, Any]], None]) -> None:
+        # Ouvinte síncrono, chamado na thread de quem entrega (usado para invalidação de cache)
+        with self._lock:
+            self._ouvintes[canal].append(callback)
+
+    def assinar(self, canal: str) -> Assinatura:
+        assinatura = Assinatura(canal, asyncio.get_running_loop())
+        with self._lock:
+            self._assinaturas[canal].add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura) -> None:
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.canal)
+            if assinaturas is not None:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._assinaturas[assinatura.canal]
+
+
+class PubSubRedis(PubSubLocal):
+    """
+    Repassa as publicações por um Redis local para que todos os workers entreguem aos seus clientes.
+    Cada worker continua guardando só as próprias assinaturas.
+    """
+
+    PREFIXO = "reskill:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{f"{self.PREFIXO}*": self._receber})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publicar(self, canal: str, mensagem: Dict[str, Any]) -> None:
+        self._redis.publish(f"{self.PREFIXO}{canal}", json.dumps(mensagem, ensure_ascii=False))
+
+    def _receber(self, mensagem) -> None:
+        canal = mensagem["channel"].decode("utf-8")[len(self.PREFIXO):]
+        self.entregar_local(canal, json.loads(mensagem["data"]))
+
+
+_pubsub: Optional[PubSubLocal] = None
+
+
+def obter_pubsub() -> PubSubLocal:
+    global _pubsub
+    if _pubsub is None:
+        url = os.getenv("PUBSUB_URL")
+        _pubsub = PubSubRedis(url) if url else PubSubLocal()
+    return _pubsub
+
+
+def configurar_pubsub(pubsub: PubSubLocal) -> None:
+    global _pubsub
+    _pubsub = pubsub
+
+
+def canal_usuario(user_id: int) -> str:
+    return f"usuario:{user_id}"
+
+
+def publicar_evento_usuario(user_id: int, tipo: str, dados: Dict[str, Any]) -> None:
+    # Notificação é best-effort: uma falha no broker não pode desfazer a escrita já commitada
+    try:
+        obter_pubsub().publicar(canal_usuario(user_id), {"type": tipo, "data": dados})
+    except Exception:
+        pass
+
+
+def assinar_usuario(user_id: int) -> Assinatura:
+    """
+    Assina o canal do usuário. Deve ser chamado antes de ler o snapshot: um evento publicado
+    entre a leitura e a assinatura se perderia, enquanto um repetido só reafirma o estado.
+    """
+    return obter_pubsub().assinar(canal_usuario(user_id))
+
+
+def cancelar_assinatura(assinatura: Assinatura) -> None:
+    obter_pubsub().cancelar(assinatura)
+
+
+async def stream_eventos_usuario(assinatura: Assinatura, request, snapshot: Dict[str, Any]) -> AsyncIterator[str]:
+    try:
+        yield _formatar_sse("snapshot", snapshot)
+
+        while not await request.is_disconnected():
+            try:
+                mensagem = await asyncio.wait_for(assinatura.fila.get(), timeout=KEEPALIVE_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            yield _formatar_sse(mensagem["type"], mensagem["data"])
+    finally:
+        cancelar_assinatura(assinatura)
+
+
+def _formatar_sse(evento: str, dados: Dict[str, Any]) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
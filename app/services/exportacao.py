@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import Float, Integer, select
+from sqlalchemy.orm import Session
+
+from app.models.database import StatusStep, Usuario
+from app.models.sharding import engines_de
+
+
+# Linhas lidas do cursor por vez; a memória do export fica limitada a um lote
+TAMANHO_LOTE_EXPORT = 1000
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+COLUNAS_USUARIOS = [
+    Usuario.id, Usuario.nome, Usuario.email, Usuario.profissao, Usuario.nivel_experience,
+    Usuario.tempo_estudo_semanal, Usuario.interesses, Usuario.qualidades, Usuario.atualizado_em,
+]
+
+COLUNAS_PROGRESSO = [
+    StatusStep.id, StatusStep.id_usuario, StatusStep.id_step, StatusStep.status,
+    StatusStep.data_conclusao, StatusStep.atualizado_em,
+]
+
+
+def preparar_exportacao(tabela: str, formato: str, desde: Optional[datetime],
+                        db: Session) -> Tuple[Iterator[bytes], str, datetime]:
+    """
+    Valida os parâmetros antes de a resposta começar e devolve o gerador do corpo, o media type
+    e a marca d'água (início do export) para usar como `since` no próximo incremental.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: use {', '.join(FORMATOS)}")
+
+    if formato == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Formato parquet requer o pacote pyarrow instalado")
+
+    modelo, colunas = (Usuario, COLUNAS_USUARIOS) if tabela == "usuarios" else (StatusStep, COLUNAS_PROGRESSO)
+    ate = datetime.utcnow()
+
+    query = select(*colunas).where(modelo.atualizado_em <= ate)
+    if desde is not None:
+        query = query.where(modelo.atualizado_em > desde)
+    query = query.order_by(modelo.atualizado_em, modelo.id)
+
+    # Sessões próprias: o streaming continua depois que a dependência do FastAPI encerrar a dela.
+    # Com shards, o export percorre um shard depois do outro
+    binds = engines_de(db)
+    nomes = [coluna.key for coluna in colunas]
+    escritores = {"ndjson": _gerar_ndjson, "csv": _gerar_csv, "parquet": _gerar_parquet}
+
+    return escritores[formato](binds, query, nomes), FORMATOS[formato], ate
+
+
+def _lotes(binds, query, nomes: List[str]) -> Iterator[List[dict]]:
+    for bind in binds:
+        with Session(bind=bind) as db:
+            resultado = db.execute(query.execution_options(yield_per=TAMANHO_LOTE_EXPORT, stream_results=True))
+            for particao in resultado.partitions():
+                yield [_serializar_linha(dict(zip(nomes, linha))) for linha in particao]
+
+
+def _serializar_linha(linha: dict) -> dict:
+    for chave, valor in linha.items():
+        if hasattr(valor, "isoformat"):
+            linha[chave] = valor.isoformat()
+        elif hasattr(valor, "value"):
+            linha[chave] = valor.value
+    return linha
+
+
+def _gerar_ndjson(binds, query, nomes: List[str]) -> Iterator[bytes]:
+    for lote in _lotes(binds, query, nomes):
+        yield "".join(json.dumps(linha, ensure_ascii=False) + "\n" for linha in lote).encode("utf-8")
+
+
+def _gerar_csv(binds, query, nomes: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=nomes)
+    writer.writeheader()
+
+    for lote in _lotes(binds, query, nomes):
+        writer.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _gerar_parquet(binds, query, nomes: List[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Schema fixo pelas colunas: um lote só com nulos não pode mudar o tipo no meio do arquivo
+    schema = pa.schema([
+        (nome, _tipo_arrow(coluna.type, pa)) for nome, coluna in zip(nomes, query.selected_columns)
+    ])
+    sink = _SinkStreaming()
+    writer = pq.ParquetWriter(sink, schema)
+
+    # Cada lote vira um row group; os bytes já escritos saem antes do próximo lote ser lido
+    for lote in _lotes(binds, query, nomes):
+        writer.write_table(pa.Table.from_pydict({nome: [linha[nome] for linha in lote] for nome in nomes}, schema=schema))
+        yield sink.drenar()
+
+    writer.close()
+    yield sink.drenar()
+
+
+def _tipo_arrow(tipo, pa):
+    if isinstance(tipo, Integer):
+        return pa.int64()
+    if isinstance(tipo, Float):
+        return pa.float64()
+    # Datas e enums já saem serializados como texto
+    return pa.string()
+
+
+class _SinkStreaming(io.RawIOBase):
+    """Destino só de escrita que entrega os bytes em pedaços, mantendo o offset absoluto que o footer usa."""
+
+    def __init__(self):
+        super().__init__()
+        self._pedacos: List[bytes] = []
+        self._posicao = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        dados = bytes(dados)
+        self._pedacos.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def close(self) -> None:
+        # O ParquetWriter fecha o destino ao terminar; os bytes pendentes continuam disponíveis
+        pass
+
+    def drenar(self) -> bytes:
+        dados = b"".join(self._pedacos)
+        self._pedacos.clear()
+        return dados
@@ -0,0 +1,344 @@
+import fcntl
+import logging
+import os
+import re
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.database import Usuario, qualidades_from_json
+from app.models.sharding import para_cada_shard
+
+
+# Matriz de perfis (uma linha float32 por user_id) num .npy mapeado em memória: todos os workers
+# da máquina leem as mesmas páginas do page cache em vez de cada um carregar a sua cópia
+PARES_ARQUIVO = os.getenv("PARES_ARQUIVO", "./pares.npy")
+# 128 dimensões = 512 MB para 1M de usuários; colisões do hashing pesam pouco no cosseno
+PARES_DIMENSOES = int(os.getenv("PARES_DIMENSOES", "128"))
+# Linhas por bloco na busca: o produto de cada bloco cabe no cache da CPU sem cópias grandes
+PARES_BLOCO = int(os.getenv("PARES_BLOCO", "65536"))
+# Margem no "alterados desde o início do build": o atualizado_em é gravado no flush, antes do commit
+PARES_FOLGA_SEGUNDOS = float(os.getenv("PARES_FOLGA_SEGUNDOS", "60"))
+
+logger = logging.getLogger(__name__)
+
+# Peso de cada grupo de atributos na similaridade
+PESOS = {"interesses": 1.0, "profissao": 0.8, "qualidades": 0.6, "tempo": 0.4}
+
+
+class IndiceEmConstrucao(Exception):
+    """Outro processo (ou thread) já está reconstruindo o índice."""
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Busca de pares requer o pacote numpy instalado")
+    return numpy
+
+
+def _termos(texto: str) -> List[str]:
+    return [termo.strip().lower() for termo in re.split(r"[,;/]", texto or "") if termo.strip()]
+
+
+def _tokens(perfil) -> Dict[str, List[str]]:
+    profissao = (perfil.profissao or "").strip().lower()
+    # Faixas de 2h com as vizinhas: quem estuda 5h e quem estuda 6h compartilham tokens
+    faixa = int(min(perfil.tempo_estudo_semanal or 0, 40) // 2)
+    return {
+        "interesses": _termos(perfil.interesses),
+        # O cargo inteiro e as palavras dele: "analista de dados" fica perto de "cientista de dados"
+        "profissao": [profissao] + [palavra for palavra in profissao.split() if len(palavra) > 2],
+        "qualidades": [q.strip().lower() for q in qualidades_from_json(perfil.qualidades) if q.strip()],
+        "tempo": [f"{faixa - 1}", f"{faixa}", f"{faixa + 1}"],
+    }
+
+
+def vetorizar(perfis: List, dimensoes: int = PARES_DIMENSOES):
+    """
+    Feature hashing: cada token vira (índice, sinal) por crc32, estável entre processos.
+    Cada grupo é normalizado e pesado; a linha final tem norma 1, então cosseno = produto escalar.
+    """
+    np = _numpy()
+    matriz = np.zeros((len(perfis), dimensoes), dtype=np.float32)
+    for linha, perfil in enumerate(perfis):
+        for grupo, tokens in _tokens(perfil).items():
+            if not tokens:
+                continue
+            vetor = np.zeros(dimensoes, dtype=np.float32)
+            for token in tokens:
+                h = zlib.crc32(f"{grupo}:{token}".encode("utf-8"))
+                vetor[h % dimensoes] += 1.0 if h >> 31 else -1.0
+            norma = np.linalg.norm(vetor)
+            if norma:
+                matriz[linha] += vetor * (PESOS[grupo] / norma)
+
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    np.divide(matriz, normas, out=matriz, where=normas > 0)
+    return matriz
+
+
+class IndicePares:
+    """
+    Linha i = vetor do usuário i (zeros = sem usuário). Escritas pontuais vão direto ao mmap
+    compartilhado; crescer a matriz troca o arquivo, e cada worker reabre quando percebe a troca.
+    """
+
+    def __init__(self, caminho: str = PARES_ARQUIVO, dimensoes: int = PARES_DIMENSOES, bloco: int = PARES_BLOCO):
+        self.caminho = caminho
+        self.dimensoes = dimensoes
+        self.bloco = bloco
+        self._lock = threading.Lock()
+        self._matriz = None
+        self._inode = None
+
+    def existe(self) -> bool:
+        return os.path.exists(self.caminho)
+
+    @contextmanager
+    def _trava(self, exclusiva: bool):
+        # Entre processos: escritas de linha em modo compartilhado, troca de arquivo em exclusivo
+        with open(f"{self.caminho}.lock", "a") as arquivo:
+            fcntl.flock(arquivo, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _trava_build(self):
+        # Um build por vez na máquina; quem chega durante um build não espera, recebe IndiceEmConstrucao
+        with open(f"{self.caminho}.build.lock", "a") as arquivo:
+            try:
+                fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise IndiceEmConstrucao("Índice de pares em construção. Tente novamente em instantes.")
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+    def _temporario(self) -> str:
+        # Nome único: dois processos montando arquivos ao mesmo tempo nunca escrevem no mesmo
+        return f"{self.caminho}.{uuid.uuid4().hex}.tmp"
+
+    def _abrir(self):
+        np = _numpy()
+        inode = os.stat(self.caminho).st_ino
+        with self._lock:
+            if self._matriz is None or inode != self._inode:
+                self._matriz = np.load(self.caminho, mmap_mode="r+")
+                self._inode = inode
+            return self._matriz
+
+    def construir(self, lotes: Iterable[List], maior_id: int,
+                  alteracoes: Optional[Callable[[datetime], Tuple[List, Set[int]]]] = None) -> int:
+        """
+        Reconstrói a matriz inteira a partir de lotes de perfis; troca o arquivo de forma atômica.
+        Escritas feitas durante o build vão para o arquivo antigo (ou nenhum): `alteracoes(desde)`
+        devolve os perfis alterados desde o início e os ids existentes, reaplicados no arquivo novo
+        ainda com a trava exclusiva.
+        """
+        with self._trava_build():
+            np = _numpy()
+            inicio = datetime.utcnow() - timedelta(seconds=PARES_FOLGA_SEGUNDOS)
+            temporario = self._temporario()
+            try:
+                matriz = np.lib.format.open_memmap(
+                    temporario, mode="w+", dtype=np.float32, shape=(maior_id + 1, self.dimensoes)
+                )
+                total = 0
+                for perfis in lotes:
+                    if perfis:
+                        matriz[[perfil.id for perfil in perfis]] = vetorizar(perfis, self.dimensoes)
+                        total += len(perfis)
+                matriz.flush()
+                del matriz
+
+                with self._trava(exclusiva=True):
+                    os.replace(temporario, self.caminho)
+                    if alteracoes is not None:
+                        self._reaplicar(*alteracoes(inicio))
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+        return total
+
+    def _reaplicar(self, perfis: List, existentes: Set[int]) -> None:
+        # Chamado com a trava exclusiva: nenhuma escrita de linha acontece no meio
+        np = _numpy()
+        if perfis:
+            self._crescer(max(perfil.id for perfil in perfis) + 1)
+        matriz = self._abrir()
+        for inicio in range(0, len(matriz), self.bloco):
+            preenchidas = np.flatnonzero(matriz[inicio:inicio + self.bloco].any(axis=1)) + inicio
+            removidos = [int(i) for i in preenchidas if int(i) not in existentes]
+            if removidos:
+                matriz[removidos] = 0
+        if perfis:
+            matriz[[perfil.id for perfil in perfis]] = vetorizar(perfis, self.dimensoes)
+
+    def atualizar(self, perfis: List) -> None:
+        if not perfis:
+            return
+        self._garantir_capacidade(max(perfil.id for perfil in perfis) + 1)
+        vetores = vetorizar(perfis, self.dimensoes)
+        with self._trava(exclusiva=False):
+            matriz = self._abrir()
+            matriz[[perfil.id for perfil in perfis]] = vetores
+
+    def remover(self, ids: List[int]) -> None:
+        with self._trava(exclusiva=False):
+            matriz = self._abrir()
+            ids = [user_id for user_id in ids if user_id < len(matriz)]
+            if ids:
+                matriz[ids] = 0
+
+    def indexado(self, user_id: int) -> bool:
+        matriz = self._abrir()
+        return user_id < len(matriz) and bool(matriz[user_id].any())
+
+    def vizinhos(self, user_id: int, k: int) -> List[Tuple[int, float]]:
+        """Top-k por cosseno, bloco a bloco: k candidatos por bloco e uma ordenação final pequena."""
+        np = _numpy()
+        matriz = self._abrir()
+        consulta = np.array(matriz[user_id])
+
+        candidatos_ids, candidatos_scores = [], []
+        for inicio in range(0, len(matriz), self.bloco):
+            scores = matriz[inicio:inicio + self.bloco] @ consulta
+            if inicio <= user_id < inicio + len(scores):
+                scores[user_id - inicio] = -np.inf
+            n = min(k, len(scores))
+            melhores = np.argpartition(-scores, n - 1)[:n]
+            candidatos_ids.append(melhores + inicio)
+            candidatos_scores.append(scores[melhores])
+
+        ids = np.concatenate(candidatos_ids)
+        scores = np.concatenate(candidatos_scores)
+        ordem = np.argsort(-scores, kind="stable")[:k]
+        # Score 0 = linha vazia (id sem usuário) ou nada em comum
+        return [(int(ids[i]), round(float(scores[i]), 4)) for i in ordem if scores[i] > 0]
+
+    def _garantir_capacidade(self, linhas: int) -> None:
+        if self._abrir().shape[0] >= linhas:
+            return
+        with self._trava(exclusiva=True):
+            self._crescer(linhas)
+
+    def _crescer(self, linhas: int) -> None:
+        # Chamado com a trava exclusiva
+        np = _numpy()
+        atual = self._abrir()
+        if atual.shape[0] >= linhas:
+            return
+        # Dobra para que inserções em sequência não copiem a matriz a cada usuário novo
+        temporario = self._temporario()
+        try:
+            nova = np.lib.format.open_memmap(
+                temporario, mode="w+", dtype=np.float32, shape=(max(linhas, 2 * atual.shape[0]), self.dimensoes)
+            )
+            for inicio in range(0, atual.shape[0], self.bloco):
+                nova[inicio:inicio + self.bloco] = atual[inicio:inicio + self.bloco]
+            nova.flush()
+            del nova
+            os.replace(temporario, self.caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+
+_indice: Optional[IndicePares] = None
+
+
+def obter_indice_pares() -> IndicePares:
+    global _indice
+    if _indice is None:
+        _indice = IndicePares()
+    return _indice
+
+
+def configurar_indice_pares(indice: Optional[IndicePares]) -> None:
+    global _indice
+    _indice = indice
+
+
+def indexar_usuarios(db: Session, indice: Optional[IndicePares] = None, lote: int = 5000) -> int:
+    """Reconstrói o índice lendo todos os usuários (de todos os shards) em lotes."""
+    indice = indice or obter_indice_pares()
+    # Com shards, a sessão da requisição está presa ao shard do usuário; o índice precisa de todos
+    roteador = getattr(db, "roteador", None)
+    origem = roteador.sessao() if roteador is not None else db
+
+    maior_id = max((sessao.execute(select(func.max(Usuario.id))).scalar() or 0 for sessao in para_cada_shard(origem)),
+                   default=0)
+
+    def lotes():
+        for sessao in para_cada_shard(origem):
+            resultado = sessao.execute(select(Usuario).execution_options(yield_per=lote)).scalars()
+            for perfis in resultado.partitions(lote):
+                yield perfis
+
+    def alteracoes(desde: datetime) -> Tuple[List, Set[int]]:
+        # Criados e alterados durante o build, e quem ainda existe (os demais foram removidos no meio)
+        perfis, existentes = [], set()
+        for sessao in para_cada_shard(origem):
+            perfis += sessao.execute(select(Usuario).where(Usuario.atualizado_em >= desde)).scalars().all()
+            existentes.update(sessao.execute(select(Usuario.id)).scalars())
+        return perfis, existentes
+
+    return indice.construir(lotes(), maior_id, alteracoes)
+
+
+def indexar_em_background(fabrica_sessoes: Callable[[], Session],
+                          indice: Optional[IndicePares] = None) -> Optional[threading.Thread]:
+    """
+    Constrói o índice numa thread, se ele ainda não existe. Usado no start: até o fim do build,
+    GET /users/{id}/peers responde 503. Com vários workers, só o primeiro a pegar a trava constrói.
+    """
+    indice = indice or obter_indice_pares()
+    if indice.existe():
+        return None
+
+    def construir():
+        db = fabrica_sessoes()
+        try:
+            total = indexar_usuarios(db, indice)
+            logger.info("Índice de pares construído com %d perfis", total)
+        except (IndiceEmConstrucao, ImportError):
+            # Outro worker já está construindo, ou não há numpy: nada a fazer aqui
+            pass
+        except Exception:
+            logger.exception("Falha ao construir o índice de pares")
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=construir, name="indexar-pares", daemon=True)
+    thread.start()
+    return thread
+
+
+def atualizar_pares(perfis: List) -> None:
+    # Best-effort, como as notificações: sem numpy ou antes do primeiro build não há o que atualizar
+    try:
+        indice = obter_indice_pares()
+        if indice.existe():
+            indice.atualizar(perfis)
+    except Exception:
+        pass
+
+
+def remover_pares(ids: List[int]) -> None:
+    try:
+        indice = obter_indice_pares()
+        if indice.existe():
+            indice.remover(ids)
+    except Exception:
+        pass
@@ -0,0 +1,101 @@
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select
+
+from app.models.database import ProgressoRoadmap, Roadmap, StatusStep, Usuario, UsuarioStep
+from app.models.sharding import RoteadorShards
+from app.services.analytics import recalcular_agregados
+from app.services.cache import obter_cache_perfis
+
+
+# Usuários bloqueados para escrita de uma vez; cada um é liberado assim que muda de shard
+REBALANCE_LOTE = int(os.getenv("REBALANCE_LOTE", "100"))
+# Espera depois de bloquear o lote. Requisições em andamento conferem a marcação no commit (SessaoRoteada);
+# a espera só cobre os commits que já tinham passado dessa conferência
+REBALANCE_ESPERA_SEGUNDOS = float(os.getenv("REBALANCE_ESPERA_SEGUNDOS", "1"))
+
+# Tabelas com os dados de um usuário; as de id próprio recebem um id novo no shard de destino
+TABELAS_DO_USUARIO = [
+    (Usuario.__table__, Usuario.id, True),
+    (UsuarioStep.__table__, UsuarioStep.id_usuario, False),
+    (StatusStep.__table__, StatusStep.id_usuario, False),
+    (Roadmap.__table__, Roadmap.id_usuario, False),
+    (ProgressoRoadmap.__table__, ProgressoRoadmap.id_usuario, True),
+]
+
+
+def planejar(roteador: RoteadorShards) -> Dict[int, int]:
+    """Usuários fora do shard padrão (id % N) com o número atual de shards: {user_id: shard_destino}."""
+    return {
+        user_id: roteador.shard_padrao(user_id)
+        for shard, ids in roteador.usuarios_por_shard().items()
+        for user_id in ids
+        if shard != roteador.shard_padrao(user_id)
+    }
+
+
+def rebalancear(roteador: RoteadorShards, limite: Optional[int] = None,
+                espera: float = REBALANCE_ESPERA_SEGUNDOS) -> Dict[int, int]:
+    """
+    Move cada usuário do plano para o shard de destino. Em lotes: bloqueia as escritas dos usuários
+    do lote no diretório (get_db e o commit respondem 503), espera os commits em andamento, e então,
+    para cada um, copia uma vez, vira o diretório (o que libera as escritas) e apaga na origem.
+    No fim, recalcula os agregados dos shards envolvidos.
+    """
+    plano = sorted(planejar(roteador).items())[:limite]
+    movidos: Dict[int, int] = {}
+    tocados = set()
+
+    for inicio in range(0, len(plano), REBALANCE_LOTE):
+        lote = plano[inicio:inicio + REBALANCE_LOTE]
+        ids = [user_id for user_id, _ in lote]
+        roteador.marcar_em_movimento(ids, True)
+        try:
+            time.sleep(espera)
+            for user_id, destino in lote:
+                origem = roteador.shard_do_usuario(user_id)
+                _copiar_usuario(roteador, user_id, origem, destino)
+                roteador.mudar_shard(user_id, destino)
+
+                with roteador.engines[origem].begin() as conexao:
+                    conexao.execute(delete(Usuario.__table__).where(Usuario.id == user_id))
+
+                obter_cache_perfis().invalidar([user_id])
+                movidos[user_id] = destino
+                tocados.update({origem, destino})
+        finally:
+            # Quem não chegou a mudar (erro no meio do lote) volta a aceitar escritas na origem
+            roteador.marcar_em_movimento([user_id for user_id in ids if user_id not in movidos], False)
+
+    for shard in sorted(tocados):
+        sessao = roteador.sessao(shard)
+        try:
+            recalcular_agregados(sessao)
+        finally:
+            sessao.close()
+
+    return movidos
+
+
+def _copiar_usuario(roteador: RoteadorShards, user_id: int, origem: int, destino: int) -> None:
+    with roteador.engines[origem].connect() as leitura:
+        linhas = {
+            tabela.name: [dict(linha._mapping) for linha in leitura.execute(select(tabela).where(coluna == user_id))]
+            for tabela, coluna, _ in TABELAS_DO_USUARIO
+        }
+
+    if not linhas[Usuario.__tablename__]:
+        return
+
+    # Uma transação no destino: apaga o que sobrou de uma execução interrompida (cascade) e grava tudo
+    with roteador.engines[destino].begin() as escrita:
+        escrita.execute(delete(Usuario.__table__).where(Usuario.id == user_id))
+        for tabela, _, mantem_id in TABELAS_DO_USUARIO:
+            registros: List[dict] = linhas[tabela.name]
+            if not registros:
+                continue
+            if not mantem_id:
+                registros = [{k: v for k, v in registro.items() if k != "id"} for registro in registros]
+            escrita.execute(insert(tabela), registros)
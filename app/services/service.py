@@ -1,9 +1,47 @@
-from typing import Optional
+import json
+import time
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.database import Usuario, qualidades_to_json, qualidades_from_json
-from app.schemas.pydantic import UsuarioCreate, UsuarioUpdate, UsuarioResponse, MessageResponse, RoadmapResponse, RoadmapStepUpdate
-from app.services.ai_roadmap import gerar_roadmap_ai
+from app.models.database import (
+    Usuario, UsuarioStep, StatusStep, Roadmap, ProgressoRoadmap, insert_com_upsert, qualidades_to_json, qualidades_from_json
+)
+from app.schemas.pydantic import (
+    UsuarioCreate, UsuarioUpdate, UsuarioResponse, MessageResponse, RoadmapResponse, RoadmapStepUpdate, ProgressoResponse,
+    PurgeRequest, PurgeResponse, BatchGetRequest, UsuariosBatchResponse, RoadmapUsuarioResponse, RoadmapsBatchResponse,
+    ParResponse, ParesResponse
+)
+from app.services.ai_roadmap import gerar_roadmap_ai, regenerar_steps_ai, perfil_roadmap, CAMPOS_PERFIL, TOTAL_STEPS
+from app.services.analytics import mover_status_usuario, registrar_transicao, remover_status_usuarios
+from app.services.cache import PerfilUsuario, obter_cache_perfis
+from app.services.eventos import publicar_evento_usuario
+from app.services.pares import IndiceEmConstrucao, atualizar_pares, obter_indice_pares, remover_pares
+from app.services.write_behind import obter_buffer_toggles
+from app.models.replicas import registrar_escrita
+from app.models.sharding import agrupar_por_shard, alocar_usuario, liberar_usuarios, localizar_email, para_cada_shard
+from app.tracing import instrumentar_metodos
+
+
+# Tamanho máximo de um batchGet: as visões de equipe do dashboard têm até 200 pessoas
+BATCH_MAX_IDS = 500
+
+
+class PreparoRoadmap(BaseModel):
+    """Estado do GET /roadmap entre a leitura do banco e a chamada à IA (que roda no bulkhead)."""
+
+    usuario: PerfilUsuario
+    perfil_atual: dict
+    # None = usuário ainda sem roadmap salvo
+    steps_salvos: Optional[list] = None
+    perfil_salvo: Optional[dict] = None
+    campos_alterados: List[str] = []
+
+    @property
+    def precisa_ia(self) -> bool:
+        return self.steps_salvos is None or bool(self.campos_alterados)
 
 
 class Service:
@@ -19,122 +57,563 @@ class Service:
         if not dados.currentProfession:
             raise ValueError("Profissão é obrigatória")
 
-        if Service._email_existe(dados.email, db):
+        email = dados.email.lower().strip()
+        # Com shards, id e unicidade do email vêm do diretório global, que também escolhe o shard
+        id_alocado = alocar_usuario(db, email)
+        valores = {} if id_alocado is None else {"id": id_alocado}
+
+        # Unicidade garantida pela constraint do banco: INSERT ... RETURNING num round-trip só
+        try:
+            usuario_db = db.execute(
+                insert(Usuario).values(
+                    **valores,
+                    nome=dados.name.strip(),
+                    email=email,
+                    senha_hash="hash_fake",
+                    profissao=dados.currentProfession,
+                    nivel_experience=dados.experienceLevel,
+                    tempo_estudo_semanal=dados.weeklyStudyTime,
+                    interesses=dados.interests or "",
+                    qualidades=qualidades_to_json(getattr(dados, 'qualities', [])),
+                ).returning(Usuario)
+            ).scalar_one()
+            resposta = Service._format_usuario_response(usuario_db)
+            perfil = PerfilUsuario.do_usuario(usuario_db)
+            registrar_escrita(db, usuario_db.id)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if id_alocado is not None:
+                liberar_usuarios(db, [id_alocado])
             raise ValueError("Email já cadastrado no sistema")
+        except Exception:
+            db.rollback()
+            if id_alocado is not None:
+                liberar_usuarios(db, [id_alocado])
+            raise
+
+        atualizar_pares([perfil])
+        return resposta
+
+    @staticmethod
+    def get_user(user_id: int, db: Session) -> UsuarioResponse:
+        if not user_id or user_id <= 0:
+            raise ValueError("ID de usuário inválido")
 
-        usuario_db = Usuario(
-            nome=dados.name.strip(),
-            email=dados.email.lower().strip(),
-            senha_hash="hash_fake",
-            profissao=dados.currentProfession,
-            nivel_experience=dados.experienceLevel,
-            tempo_estudo_semanal=dados.weeklyStudyTime,
-            interesses=dados.interests or "",
-            qualidades=qualidades_to_json(getattr(dados, 'qualities', [])),
+        perfil = Service._obter_perfil(user_id, db)
+        if not perfil:
+            raise ValueError("Usuário não encontrado")
+
+        return Service._format_usuario_response(perfil)
+
+    @staticmethod
+    def get_users_batch(dados: BatchGetRequest, db: Session) -> UsuariosBatchResponse:
+        ids = Service._validar_ids_batch(dados.ids)
+        perfis = Service._obter_perfis(ids, db)
+
+        return UsuariosBatchResponse(
+            users=[Service._format_usuario_response(perfis[user_id]) for user_id in ids if user_id in perfis],
+            notFound=[user_id for user_id in ids if user_id not in perfis],
         )
 
-        db.add(usuario_db)
-        db.commit()
-        db.refresh(usuario_db)
+    @staticmethod
+    def _validar_ids_batch(ids: List[int]) -> List[int]:
+        if not ids:
+            raise ValueError("Informe ao menos um ID de usuário")
+        if any(user_id <= 0 for user_id in ids):
+            raise ValueError("ID de usuário inválido")
 
-        return Service._format_usuario_response(usuario_db)
+        # Mantém a ordem pedida, sem repetições
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > BATCH_MAX_IDS:
+            raise ValueError(f"Máximo de {BATCH_MAX_IDS} usuários por chamada")
+        return ids
 
     @staticmethod
-    def get_user(user_id: int, db: Session) -> UsuarioResponse:
+    def get_peers(user_id: int, k: int, db: Session) -> ParesResponse:
         if not user_id or user_id <= 0:
             raise ValueError("ID de usuário inválido")
 
-        usuario_db = db.query(Usuario).filter(Usuario.id == user_id).first()
-        if not usuario_db:
+        perfil = Service._obter_perfil(user_id, db)
+        if not perfil:
             raise ValueError("Usuário não encontrado")
 
-        return Service._format_usuario_response(usuario_db)
+        indice = obter_indice_pares()
+        if not indice.existe():
+            # O build lê todos os usuários: roda no start (em background) ou pelo app.cli, nunca na requisição
+            raise IndiceEmConstrucao("Índice de pares ainda não foi construído. Tente novamente em instantes.")
+        if not indice.indexado(user_id):
+            # Criado enquanto o índice era reconstruído, ou antes de ele existir
+            indice.atualizar([perfil])
+
+        vizinhos = indice.vizinhos(user_id, k)
+        perfis = Service._obter_perfis([par_id for par_id, _ in vizinhos], db)
+
+        return ParesResponse(userId=user_id, peers=[
+            ParResponse(
+                id=par_id,
+                name=perfis[par_id].nome,
+                currentProfession=perfis[par_id].profissao,
+                experienceLevel=perfis[par_id].nivel_experience,
+                weeklyStudyTime=perfis[par_id].tempo_estudo_semanal,
+                interests=perfis[par_id].interesses,
+                qualities=qualidades_from_json(perfis[par_id].qualidades),
+                similarity=similaridade,
+            )
+            for par_id, similaridade in vizinhos if par_id in perfis
+        ])
 
     @staticmethod
     def update_user(user_id: int, dados: UsuarioUpdate, db: Session) -> UsuarioResponse:
         if not user_id or user_id <= 0:
             raise ValueError("ID de usuário inválido")
 
-        usuario_db = db.query(Usuario).filter(Usuario.id == user_id).first()
-        if not usuario_db:
-            raise ValueError("Usuário não encontrado")
+        valores = {}
 
         if dados.name is not None:
             if len(dados.name.strip()) < 2:
                 raise ValueError("Nome deve ter pelo menos 2 caracteres")
-            usuario_db.nome = dados.name.strip()
+            valores["nome"] = dados.name.strip()
 
         if dados.currentProfession is not None:
             if len(dados.currentProfession.strip()) < 2:
                 raise ValueError("Profissão deve ter pelo menos 2 caracteres")
-            usuario_db.profissao = dados.currentProfession.strip()
+            valores["profissao"] = dados.currentProfession.strip()
 
-        if dados.qualidades is not None:
-            if not isinstance(dados.qualidades, list):
+        if dados.qualities is not None:
+            if not isinstance(dados.qualities, list):
                 raise ValueError("Qualidades deve ser uma lista")
 
-            qualidades_validas = [q.strip() for q in dados.qualidades if q.strip()]
-            usuario_db.qualidades = qualidades_to_json(qualidades_validas)
+            qualidades_validas = [q.strip() for q in dados.qualities if q.strip()]
+            valores["qualidades"] = qualidades_to_json(qualidades_validas)
+
+        if not valores:
+            return Service.get_user(user_id, db)
+
+        # A troca de profissão leva os status do usuário para outro perfil do agregado: o perfil antigo
+        # é lido com a linha travada, e toggles simultâneos esperam este commit
+        perfil_anterior = None
+        if "profissao" in valores:
+            perfil_anterior = db.execute(
+                select(Usuario.profissao, Usuario.nivel_experience).where(Usuario.id == user_id).with_for_update()
+            ).first()
+
+        # UPDATE ... RETURNING: atualiza e devolve a linha nova sem refresh depois
+        usuario_db = db.execute(
+            update(Usuario).where(Usuario.id == user_id).values(**valores).returning(Usuario)
+        ).scalar_one_or_none()
+        if not usuario_db:
+            db.rollback()
+            raise ValueError("Usuário não encontrado")
+
+        if perfil_anterior is not None:
+            mover_status_usuario(
+                db, user_id, tuple(perfil_anterior), (usuario_db.profissao, usuario_db.nivel_experience)
+            )
 
+        resposta = Service._format_usuario_response(usuario_db)
+        perfil = PerfilUsuario.do_usuario(usuario_db)
         db.commit()
-        db.refresh(usuario_db)
+        obter_cache_perfis().invalidar([user_id])
+        atualizar_pares([perfil])
 
-        return Service._format_usuario_response(usuario_db)
+        return resposta
 
     @staticmethod
     def delete_user(user_id: int, db: Session) -> MessageResponse:
         if not user_id or user_id <= 0:
             raise ValueError("ID de usuário inválido")
 
-        usuario_db = db.query(Usuario).filter(Usuario.id == user_id).first()
-        if not usuario_db:
+        # Um DELETE só; passos, status, roadmap e progresso saem pelo ON DELETE CASCADE do banco
+        remover_status_usuarios(db, [user_id])
+        resultado = db.execute(delete(Usuario).where(Usuario.id == user_id))
+        if resultado.rowcount == 0:
+            db.rollback()
             raise ValueError("Usuário não encontrado")
 
-        db.delete(usuario_db)
         db.commit()
+        liberar_usuarios(db, [user_id])
+        obter_cache_perfis().invalidar([user_id])
+        remover_pares([user_id])
 
         return MessageResponse(message="Usuário deletado com sucesso", success=True)
 
+    @staticmethod
+    def purge_users(dados: PurgeRequest, db: Session) -> PurgeResponse:
+        filtros = []
+        if dados.ids is not None:
+            filtros.append(Usuario.id.in_(dados.ids))
+        if dados.currentProfession is not None:
+            filtros.append(Usuario.profissao == dados.currentProfession)
+        if dados.experienceLevel is not None:
+            filtros.append(Usuario.nivel_experience == dados.experienceLevel)
+        if dados.emailDomain is not None:
+            # Curingas do LIKE no domínio são literais: "%" não pode virar "todos os usuários"
+            dominio = dados.emailDomain.lower().strip()
+            dominio = dominio.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            filtros.append(Usuario.email.like(f"%@{dominio}", escape="\\"))
+
+        if not filtros:
+            raise ValueError("Informe ids ou ao menos um filtro para o expurgo")
+
+        inicio = time.perf_counter()
+        totais = {"usuarios": 0, "status": 0, "steps": 0, "outros": 0}
+
+        for sessao in para_cada_shard(db):
+            ultimo_id = 0
+
+            # Lotes por faixa de id: cada um é uma transação curta com poucos statements
+            while True:
+                ids = sessao.execute(
+                    select(Usuario.id).where(*filtros, Usuario.id > ultimo_id).order_by(Usuario.id).limit(dados.batchSize)
+                ).scalars().all()
+                if not ids:
+                    break
+                ultimo_id = ids[-1]
+
+                totais["status"] += Service._contar_por_usuario(sessao, StatusStep, ids)
+                totais["steps"] += Service._contar_por_usuario(sessao, UsuarioStep, ids)
+                totais["outros"] += Service._contar_por_usuario(sessao, Roadmap, ids)
+                totais["outros"] += Service._contar_por_usuario(sessao, ProgressoRoadmap, ids)
+
+                remover_status_usuarios(sessao, ids)
+                totais["usuarios"] += sessao.execute(delete(Usuario).where(Usuario.id.in_(ids))).rowcount
+                sessao.commit()
+                liberar_usuarios(db, ids)
+                obter_cache_perfis().invalidar(ids)
+                remover_pares(ids)
+
+        duracao = time.perf_counter() - inicio
+        linhas = sum(totais.values())
+
+        return PurgeResponse(
+            usersDeleted=totais["usuarios"],
+            statusRowsDeleted=totais["status"],
+            userStepRowsDeleted=totais["steps"],
+            rowsDeleted=linhas,
+            seconds=round(duracao, 3),
+            rowsPerSecond=round(linhas / duracao, 1) if duracao > 0 else float(linhas),
+        )
+
+    @staticmethod
+    def _contar_por_usuario(db: Session, modelo, ids: list) -> int:
+        return db.execute(
+            select(func.count()).select_from(modelo).where(modelo.id_usuario.in_(ids))
+        ).scalar_one()
+
     @staticmethod
     def get_roadmap(user_id: int, db: Session) -> RoadmapResponse:
-        usuario = db.query(Usuario).filter(Usuario.id == user_id).first()
+        preparo = Service.preparar_roadmap(user_id, db)
+        resultado_ia = Service.chamar_ia_roadmap(preparo) if preparo.precisa_ia else None
+        return Service.concluir_roadmap(preparo, resultado_ia, db)
+
+    @staticmethod
+    def preparar_roadmap(user_id: int, db: Session) -> PreparoRoadmap:
+        """Só banco: perfil, roadmap salvo e os campos do perfil que mudaram desde a última geração."""
+        usuario = Service._obter_perfil(user_id, db)
         if not usuario:
             raise ValueError("Usuário não encontrado")
 
-        roadmap_gerado = gerar_roadmap_ai(usuario)
+        perfil_atual = perfil_roadmap(usuario)
+        roadmap_db = db.query(Roadmap).filter(Roadmap.id_usuario == usuario.id).first()
+        if not roadmap_db:
+            preparo = PreparoRoadmap(usuario=usuario, perfil_atual=perfil_atual)
+        else:
+            perfil_salvo = json.loads(roadmap_db.perfil)
+            preparo = PreparoRoadmap(
+                usuario=usuario,
+                perfil_atual=perfil_atual,
+                steps_salvos=json.loads(roadmap_db.steps),
+                perfil_salvo=perfil_salvo,
+                campos_alterados=[
+                    campo for campo in CAMPOS_PERFIL if perfil_salvo.get(campo) != perfil_atual[campo]
+                ],
+            )
+
+        if preparo.precisa_ia:
+            # A chamada à IA leva segundos: a conexão volta ao pool enquanto isso
+            db.rollback()
+        return preparo
+
+    @staticmethod
+    def chamar_ia_roadmap(preparo: PreparoRoadmap):
+        """Só a IA, sem sessão de banco: é a parte que o endpoint isola no bulkhead."""
+        if preparo.steps_salvos is None:
+            return gerar_roadmap_ai(preparo.usuario)
+        return regenerar_steps_ai(preparo.usuario, preparo.steps_salvos, preparo.campos_alterados)
+
+    @staticmethod
+    def concluir_roadmap(preparo: PreparoRoadmap, resultado_ia, db: Session) -> RoadmapResponse:
+        roadmap_steps = Service._salvar_roadmap(preparo, resultado_ia, db)
 
         roadmap_com_status = Service._verificar_status_steps(
-            roadmap_gerado, user_id, db
+            roadmap_steps, preparo.usuario.id, db
         )
 
         return RoadmapResponse(roadmapSteps=roadmap_com_status)
 
     @staticmethod
-    def _verificar_status_steps(roadmap_steps: list, user_id: int, db: Session) -> list:
-        from app.models.database import StatusStep
+    def get_roadmaps_batch(dados: BatchGetRequest, db: Session) -> RoadmapsBatchResponse:
+        """
+        Roadmaps já salvos de vários usuários, com o progresso de cada um. Não chama a IA:
+        quem ainda não tem roadmap volta em `withoutRoadmap` (o GET /roadmap individual gera).
+        """
+        ids = Service._validar_ids_batch(dados.ids)
+        perfis = Service._obter_perfis(ids, db)
+        encontrados = [user_id for user_id in ids if user_id in perfis]
+
+        salvos: Dict[int, str] = {}
+        progressos: Dict[int, ProgressoRoadmap] = {}
+        for sessao, ids_shard in agrupar_por_shard(db, encontrados):
+            if not ids_shard:
+                continue
+            salvos.update(sessao.execute(
+                select(Roadmap.id_usuario, Roadmap.steps).where(Roadmap.id_usuario.in_(ids_shard))
+            ).all())
+            progressos.update(Service._obter_progressos(ids_shard, sessao))
+
+        roadmaps = []
+        for user_id in encontrados:
+            if user_id not in salvos:
+                continue
+            concluidos, _ = Service._progresso_efetivo(progressos[user_id], user_id)
+            steps = json.loads(salvos[user_id])
+            for step in steps:
+                step["completed"] = bool(concluidos >> (int(step["id"]) - 1) & 1)
+            roadmaps.append(RoadmapUsuarioResponse(userId=user_id, roadmapSteps=steps))
+
+        return RoadmapsBatchResponse(
+            roadmaps=roadmaps,
+            notFound=[user_id for user_id in ids if user_id not in perfis],
+            withoutRoadmap=[user_id for user_id in encontrados if user_id not in salvos],
+        )
 
-        status_steps = db.query(StatusStep).filter(
-            StatusStep.id_usuario == user_id
-        ).all()
+    @staticmethod
+    def _salvar_roadmap(preparo: PreparoRoadmap, resultado_ia, db: Session) -> list:
+        usuario = preparo.usuario
+
+        if preparo.steps_salvos is None:
+            roadmap_steps = resultado_ia
+            db.add(Roadmap(
+                id_usuario=usuario.id,
+                steps=json.dumps(roadmap_steps, ensure_ascii=False),
+                perfil=json.dumps(preparo.perfil_atual, ensure_ascii=False),
+            ))
+            try:
+                db.commit()
+            except IntegrityError:
+                # Outra requisição salvou o roadmap primeiro; o dela prevalece nas próximas leituras
+                db.rollback()
+            return roadmap_steps
+
+        if not preparo.campos_alterados:
+            return preparo.steps_salvos
+
+        # Perfil mudou: só os passos ligados aos campos alterados são reescritos
+        steps_anteriores = preparo.steps_salvos
+        perfil_salvo = dict(preparo.perfil_salvo)
+        roadmap_steps, substituidos, regenerados = resultado_ia
+
+        if substituidos:
+            remover_status_usuarios(db, [usuario.id], substituidos)
+            db.query(StatusStep).filter(
+                StatusStep.id_usuario == usuario.id,
+                StatusStep.id_step.in_(substituidos)
+            ).delete(synchronize_session=False)
+
+            Service._garantir_progresso(usuario.id, db)
+            for step_id in substituidos:
+                Service._atualizar_progresso(usuario.id, step_id, None, db)
+
+        # O perfil salvo só avança nos campos cujos passos dependentes foram todos gerados de novo:
+        # se a IA falhou, a diferença continua visível e a próxima leitura tenta outra vez
+        for campo in preparo.campos_alterados:
+            dependentes = {
+                step["order"] for step in steps_anteriores if campo in step.get("basedOn", CAMPOS_PERFIL)
+            }
+            if dependentes <= set(regenerados):
+                perfil_salvo[campo] = preparo.perfil_atual[campo]
+
+        db.query(Roadmap).filter(Roadmap.id_usuario == usuario.id).update({
+            Roadmap.steps: json.dumps(roadmap_steps, ensure_ascii=False),
+            Roadmap.perfil: json.dumps(perfil_salvo, ensure_ascii=False),
+        }, synchronize_session=False)
+        db.commit()
 
-        status_map = {}
-        for status in status_steps:
-            status_map[str(status.id_step)] = status.status.value
+        if substituidos:
+            publicar_evento_usuario(usuario.id, "roadmap_updated", {"replacedSteps": substituidos})
 
+        return roadmap_steps
+
+    @staticmethod
+    def _verificar_status_steps(roadmap_steps: list, user_id: int, db: Session) -> list:
+        # Leitura não grava o resumo: quem não tem é montado em memória e criado no primeiro toggle
+        progresso = Service._obter_progressos([user_id], db)[user_id]
+
+        concluidos, _ = Service._progresso_efetivo(progresso, user_id)
         for step in roadmap_steps:
-            step_id = step["id"]
-            if step_id in status_map:
-                step["completed"] = status_map[step_id] == "concluido"
-            else:
-                step["completed"] = False
+            step["completed"] = bool(concluidos >> (int(step["id"]) - 1) & 1)
 
         return roadmap_steps
 
     @staticmethod
-    def _email_existe(email: str, db: Session) -> bool:
-        if not email:
-            return False
-        return db.query(Usuario).filter(Usuario.email == email.lower().strip()).first() is not None
+    def get_progresso(user_id: int, db: Session) -> ProgressoResponse:
+        if not user_id or user_id <= 0:
+            raise ValueError("ID de usuário inválido")
+
+        if not Service._obter_perfil(user_id, db):
+            raise ValueError("Usuário não encontrado")
+
+        progresso = Service._obter_progressos([user_id], db)[user_id]
+
+        concluidos, em_andamento = Service._progresso_efetivo(progresso, user_id)
+        return Service._format_progresso_response(concluidos, em_andamento)
+
+    @staticmethod
+    def _format_progresso_response(concluidos: int, em_andamento: list) -> ProgressoResponse:
+        return ProgressoResponse(
+            completedSteps=[
+                step_id for step_id in range(1, TOTAL_STEPS + 1) if concluidos >> (step_id - 1) & 1
+            ],
+            inProgressSteps=em_andamento,
+        )
+
+    @staticmethod
+    def _progresso_efetivo(progresso: ProgressoRoadmap, user_id: int) -> tuple:
+        # Estado gravado + toggles ainda no buffer do write-behind, sem tocar no objeto do ORM
+        concluidos = progresso.concluidos or 0
+        em_andamento = json.loads(progresso.em_andamento or "[]")
+
+        buffer = obter_buffer_toggles()
+        if buffer:
+            for step_id, status in buffer.pendentes_usuario(user_id).items():
+                concluidos, em_andamento = Service._aplicar_status_mascara(concluidos, em_andamento, step_id, status)
+
+        return concluidos, em_andamento
+
+    @staticmethod
+    def _garantir_progresso(user_id: int, db: Session) -> None:
+        if db.get(ProgressoRoadmap, user_id):
+            return
+
+        # Usuário sem resumo ainda (dados anteriores ao bitmap): monta uma vez a partir do StatusStep.
+        # Duas requisições podem chegar aqui juntas: a segunda ignora o conflito e relê a linha da primeira
+        montado = Service._obter_progressos([user_id], db)[user_id]
+        valores = {"id_usuario": user_id, "concluidos": montado.concluidos, "em_andamento": montado.em_andamento}
+
+        insert_upsert = insert_com_upsert(db, ProgressoRoadmap)
+        if insert_upsert is not None:
+            db.execute(insert_upsert.values(**valores).on_conflict_do_nothing(index_elements=["id_usuario"]))
+        else:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(ProgressoRoadmap).values(**valores))
+            except IntegrityError:
+                pass
+
+    @staticmethod
+    def _atualizar_progresso(user_id: int, step_id: int, status, db: Session) -> None:
+        """
+        Aplica o status de um passo no resumo sem ler-modificar-gravar pelo ORM: o bit do passo muda
+        num UPDATE atômico, que também trava a linha do usuário (no SQLite, o banco) até o commit.
+        A lista em_andamento só é relida e regravada depois disso, então toggles simultâneos de passos
+        diferentes do mesmo usuário se enfileiram em vez de um apagar o passo do outro.
+        """
+        from app.models.database import StatusStepEnum
+
+        bit = 1 << (step_id - 1)
+        if status == StatusStepEnum.CONCLUIDO:
+            concluidos = ProgressoRoadmap.concluidos.op("|")(bit)
+        else:
+            concluidos = ProgressoRoadmap.concluidos.op("&")(~bit)
+        filtro = ProgressoRoadmap.id_usuario == user_id
+        db.execute(
+            update(ProgressoRoadmap).where(filtro).values(concluidos=concluidos)
+            .execution_options(synchronize_session=False)
+        )
+
+        em_andamento = db.execute(
+            select(ProgressoRoadmap.em_andamento).where(filtro).with_for_update()
+        ).scalar_one()
+        _, em_andamento = Service._aplicar_status_mascara(0, json.loads(em_andamento or "[]"), step_id, status)
+        db.execute(
+            update(ProgressoRoadmap).where(filtro).values(em_andamento=json.dumps(em_andamento))
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def _obter_progressos(ids: List[int], db: Session) -> Dict[int, ProgressoRoadmap]:
+        """Resumos de progresso de vários usuários: um IN no ProgressoRoadmap e, para quem não tem, um no StatusStep."""
+        progressos = {
+            progresso.id_usuario: progresso
+            for progresso in db.execute(
+                select(ProgressoRoadmap).where(ProgressoRoadmap.id_usuario.in_(ids))
+            ).scalars()
+        }
+
+        sem_resumo = [user_id for user_id in ids if user_id not in progressos]
+        if sem_resumo:
+            # Montados em memória e não gravados: o batch é só leitura
+            for user_id in sem_resumo:
+                progressos[user_id] = ProgressoRoadmap(id_usuario=user_id, concluidos=0, em_andamento="[]")
+            status_steps = db.execute(
+                select(StatusStep.id_usuario, StatusStep.id_step, StatusStep.status)
+                .where(StatusStep.id_usuario.in_(sem_resumo))
+            ).all()
+            for user_id, step_id, status in status_steps:
+                Service._aplicar_status_progresso(progressos[user_id], step_id, status)
+
+        return progressos
+
+    @staticmethod
+    def _aplicar_status_progresso(progresso: ProgressoRoadmap, step_id: int, status) -> None:
+        concluidos, em_andamento = Service._aplicar_status_mascara(
+            progresso.concluidos or 0, json.loads(progresso.em_andamento or "[]"), step_id, status
+        )
+        progresso.concluidos = concluidos
+        progresso.em_andamento = json.dumps(em_andamento)
+
+    @staticmethod
+    def _aplicar_status_mascara(concluidos: int, em_andamento: list, step_id: int, status) -> tuple:
+        from app.models.database import StatusStepEnum
+
+        bit = 1 << (step_id - 1)
+        em_andamento = [s for s in em_andamento if s != step_id]
+
+        if status == StatusStepEnum.CONCLUIDO:
+            concluidos |= bit
+        else:
+            concluidos &= ~bit
+
+        if status == StatusStepEnum.EM_ANDAMENTO:
+            em_andamento.append(step_id)
+
+        return concluidos, sorted(em_andamento)
+
+    @staticmethod
+    def _obter_perfil(user_id: int, db: Session) -> Optional[PerfilUsuario]:
+        def carregar():
+            usuario_db = db.query(Usuario).filter(Usuario.id == user_id).first()
+            return PerfilUsuario.do_usuario(usuario_db) if usuario_db else None
+
+        return obter_cache_perfis().obter(user_id, carregar, guardar=Service._le_do_primario(db))
+
+    @staticmethod
+    def _obter_perfis(ids: List[int], db: Session) -> Dict[int, PerfilUsuario]:
+        def carregar(faltando):
+            perfis = {}
+            for sessao, ids_shard in agrupar_por_shard(db, faltando):
+                for usuario_db in sessao.execute(select(Usuario).where(Usuario.id.in_(ids_shard))).scalars():
+                    perfis[usuario_db.id] = PerfilUsuario.do_usuario(usuario_db)
+            return perfis
+
+        return obter_cache_perfis().obter_varios(ids, carregar, guardar=Service._le_do_primario(db))
+
+    @staticmethod
+    def _le_do_primario(db: Session) -> bool:
+        # O que vem de uma réplica atrasada não entra no cache: ficaria servindo o perfil antigo até o TTL,
+        # bem depois de a janela de read-your-writes acabar
+        return getattr(db, "replica", None) is None
 
     @staticmethod
     def _format_usuario_response(usuario_db) -> UsuarioResponse:
@@ -154,7 +633,12 @@ class Service:
         if not email:
             return None
 
-        usuario_db = db.query(Usuario).filter(Usuario.email == email.lower().strip()).first()
+        email = email.lower().strip()
+        # Com shards, o diretório global diz em qual banco o email está
+        if localizar_email(db, email) is None:
+            return None
+
+        usuario_db = db.query(Usuario).filter(Usuario.email == email).first()
         if not usuario_db:
             return None
 
@@ -168,27 +652,97 @@ class Service:
         if not user_id or user_id <= 0:
             raise ValueError("ID de usuário inválido")
 
-        usuario = db.query(Usuario).filter(Usuario.id == user_id).first()
+        if not 1 <= step_id <= TOTAL_STEPS:
+            raise ValueError("ID de passo inválido")
+
+        usuario = Service._obter_perfil(user_id, db)
         if not usuario:
             raise ValueError("Usuário não encontrado")
 
-        from app.models.database import StatusStep, StatusStepEnum
+        from app.models.database import StatusStepEnum
+
+        status_novo = StatusStepEnum(dados.status.value)
+
+        # Modo write-behind: confirma após o append durável no log; o flusher grava em lote
+        buffer = obter_buffer_toggles()
+        if buffer:
+            buffer.registrar(user_id, step_id, status_novo)
+            return MessageResponse(message="Status atualizado com sucesso", success=True)
+
+        Service._aplicar_toggle(usuario, step_id, status_novo, db)
+        db.commit()
+
+        Service._publicar_toggle(user_id, step_id, status_novo)
+        return MessageResponse(message="Status atualizado com sucesso", success=True)
+
+    @staticmethod
+    def aplicar_toggles_em_lote(toggles: dict, db: Session) -> int:
+        """
+        Grava numa única transação os toggles coalescidos pelo write-behind ({(user_id, step_id): status}).
+        Toggles de usuários que não existem mais são descartados.
+        """
+        aplicados = []
+
+        # Com shards, uma transação por shard envolvido no lote
+        for sessao, ids_usuarios in agrupar_por_shard(db, {user_id for user_id, _ in toggles}):
+            usuarios = {
+                usuario.id: usuario
+                for usuario in sessao.query(Usuario).filter(Usuario.id.in_(ids_usuarios)).all()
+            }
+
+            for (user_id, step_id), status_novo in sorted(toggles.items()):
+                usuario = usuarios.get(user_id)
+                if not usuario:
+                    continue
+                Service._aplicar_toggle(usuario, step_id, status_novo, sessao)
+                aplicados.append((user_id, step_id, status_novo))
+
+            sessao.commit()
+
+        for user_id, step_id, status_novo in aplicados:
+            Service._publicar_toggle(user_id, step_id, status_novo)
+
+        return len(aplicados)
+
+    @staticmethod
+    def _aplicar_toggle(usuario, step_id: int, status_novo, db: Session) -> None:
+        # O resumo é a primeira escrita: com a linha do usuário travada, o status anterior lido abaixo
+        # não muda até o commit (o agregado sai da transição certa)
+        Service._garantir_progresso(usuario.id, db)
+        Service._atualizar_progresso(usuario.id, step_id, status_novo, db)
 
         status_step = db.query(StatusStep).filter(
-            StatusStep.id_usuario == user_id,
+            StatusStep.id_usuario == usuario.id,
             StatusStep.id_step == step_id
         ).first()
 
+        status_anterior = status_step.status if status_step else None
+
         if status_step:
-            status_step.status = StatusStepEnum(dados.status.value)
+            status_step.status = status_novo
         else:
             status_step = StatusStep(
-                id_usuario=user_id,
+                id_usuario=usuario.id,
                 id_step=step_id,
                 descricao=f"Status do step {step_id}",
-                status=StatusStepEnum(dados.status.value)
+                status=status_novo
             )
             db.add(status_step)
 
-        db.commit()
-        return MessageResponse(message="Status atualizado com sucesso", success=True)
\ No newline at end of file
+        registrar_transicao(db, usuario.id, step_id, status_anterior, status_novo)
+
+        # Em lote, o próximo toggle do mesmo usuário precisa enxergar o progresso e os agregados criados aqui
+        db.flush()
+
+    @staticmethod
+    def _publicar_toggle(user_id: int, step_id: int, status_novo) -> None:
+        from app.models.database import StatusStepEnum
+
+        publicar_evento_usuario(user_id, "step_status", {
+            "stepId": step_id,
+            "status": status_novo.value,
+            "completed": status_novo == StatusStepEnum.CONCLUIDO,
+        })
+
+
+instrumentar_metodos(Service)
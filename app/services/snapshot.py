@@ -0,0 +1,184 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.services.ai_roadmap import versao_prompt
+from app.services.cache import PerfilUsuario, obter_cache_perfis, obter_cache_roadmaps
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ARQUIVO = os.getenv("SNAPSHOT_ARQUIVO", "./cache_snapshot.bin")
+# Além do shutdown, grava a cada N segundos (0 = só no shutdown): cobre workers mortos com SIGKILL
+SNAPSHOT_INTERVALO_SEGUNDOS = float(os.getenv("SNAPSHOT_INTERVALO_SEGUNDOS", "300"))
+
+# Layout (little-endian):
+#   cabeçalho: mágico, versão do prompt (sha256), gravado_em, nº de perfis, nº de roadmaps
+#   índice de perfis:   user_id, idade em segundos, offset, tamanho
+#   índice de roadmaps: chave (sha256), offset, tamanho
+#   valores: JSON de cada entrada, referenciado pelos índices
+MAGICO = b"RSKSNAP1"
+CABECALHO = struct.Struct("<8s32sdII")
+INDICE_PERFIL = struct.Struct("<qdII")
+INDICE_ROADMAP = struct.Struct("<32sII")
+
+
+def salvar_snapshot(caminho: Optional[str] = None) -> Dict[str, int]:
+    """
+    Grava os caches deste worker somados ao snapshot que já existe: cada worker tem só parte dos
+    usuários, e sobrescrever o arquivo deixaria no próximo deploy apenas o cache do último a sair.
+    Entradas do próprio worker têm prioridade, perfis que ele invalidou saem; o total respeita
+    os limites de cada cache.
+    """
+    caminho = caminho or SNAPSHOT_ARQUIVO
+    cache_perfis = obter_cache_perfis()
+    cache_roadmaps = obter_cache_roadmaps()
+
+    # Ler, somar e trocar o arquivo numa seção só entre os workers: nenhum apaga o que outro acabou de somar
+    with open(f"{caminho}.lock", "a") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            anteriores_perfis, anteriores_roadmaps = _ler_snapshot(caminho)
+
+            # Perfis que este worker invalidou (ou todos, depois de uma limpeza) não voltam do arquivo
+            limpezas, invalidados = cache_perfis.invalidacoes_pendentes()
+            perfis = cache_perfis.exportar()
+            proprios = {user_id for user_id, _, _ in perfis}
+            perfis += [
+                entrada for entrada in anteriores_perfis
+                if not limpezas and entrada[0] not in proprios and entrada[0] not in invalidados
+                and entrada[2] <= cache_perfis.ttl
+            ]
+            # Acima do limite ficam os mais novos, que são os que o cache manteria
+            perfis = sorted(perfis, key=lambda entrada: entrada[2])[:cache_perfis.max_entradas]
+
+            # Roadmaps vão do menos ao mais recente (ordem do LRU): os anteriores entram antes dos deste worker
+            proprios_roadmaps = cache_roadmaps.exportar()
+            proprias = {chave for chave, _ in proprios_roadmaps}
+            roadmaps = [entrada for entrada in anteriores_roadmaps if entrada[0] not in proprias] + proprios_roadmaps
+            roadmaps = roadmaps[-cache_roadmaps.max_entradas:]
+
+            _escrever_snapshot(caminho, perfis, roadmaps)
+            cache_perfis.confirmar_invalidacoes(limpezas, invalidados)
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+    return {"perfis": len(perfis), "roadmaps": len(roadmaps)}
+
+
+def _escrever_snapshot(caminho: str, perfis: List, roadmaps: List) -> None:
+    valores = []
+    indice_perfis = []
+    indice_roadmaps = []
+    offset = 0
+    for user_id, perfil, idade in perfis:
+        dados = perfil.model_dump_json().encode("utf-8")
+        indice_perfis.append(INDICE_PERFIL.pack(user_id, idade, offset, len(dados)))
+        valores.append(dados)
+        offset += len(dados)
+    for chave, roadmap in roadmaps:
+        dados = json.dumps(roadmap, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        indice_roadmaps.append(INDICE_ROADMAP.pack(bytes.fromhex(chave), offset, len(dados)))
+        valores.append(dados)
+        offset += len(dados)
+
+    cabecalho = CABECALHO.pack(MAGICO, bytes.fromhex(versao_prompt()), time.time(), len(perfis), len(roadmaps))
+
+    # Temporário por processo e rename atômico: quem lê nunca vê um arquivo pela metade
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(cabecalho)
+        arquivo.writelines(indice_perfis)
+        arquivo.writelines(indice_roadmaps)
+        arquivo.writelines(valores)
+    os.replace(temporario, caminho)
+
+
+def _ler_snapshot(caminho: str) -> Tuple[List, List]:
+    """
+    Perfis (com a idade somada ao tempo desde a gravação) e roadmaps do snapshot. Roadmaps gravados
+    com outro prompt ou modelo ficam de fora. Arquivo ausente, de outro formato ou corrompido = vazio.
+    """
+    if not os.path.exists(caminho) or os.path.getsize(caminho) < CABECALHO.size:
+        return [], []
+
+    try:
+        with open(caminho, "rb") as arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+            magico, versao, gravado_em, n_perfis, n_roadmaps = CABECALHO.unpack_from(dados, 0)
+            if magico != MAGICO:
+                logger.warning("Snapshot de cache ignorado: formato desconhecido em %s", caminho)
+                return [], []
+
+            inicio_indices = CABECALHO.size
+            inicio_valores = inicio_indices + n_perfis * INDICE_PERFIL.size + n_roadmaps * INDICE_ROADMAP.size
+            desde_gravacao = max(time.time() - gravado_em, 0.0)
+
+            perfis = []
+            for i in range(n_perfis):
+                user_id, idade, offset, tamanho = INDICE_PERFIL.unpack_from(
+                    dados, inicio_indices + i * INDICE_PERFIL.size
+                )
+                inicio = inicio_valores + offset
+                perfil = PerfilUsuario.model_validate_json(dados[inicio:inicio + tamanho])
+                perfis.append((user_id, perfil, idade + desde_gravacao))
+
+            roadmaps = []
+            if versao.hex() == versao_prompt():
+                inicio_roadmaps = inicio_indices + n_perfis * INDICE_PERFIL.size
+                for i in range(n_roadmaps):
+                    chave, offset, tamanho = INDICE_ROADMAP.unpack_from(
+                        dados, inicio_roadmaps + i * INDICE_ROADMAP.size
+                    )
+                    inicio = inicio_valores + offset
+                    roadmaps.append((chave.hex(), json.loads(dados[inicio:inicio + tamanho])))
+    except Exception as erro:
+        # Snapshot é só aquecimento: um arquivo truncado ou corrompido não pode impedir o worker de subir
+        logger.warning("Snapshot de cache ignorado: %s inválido (%s)", caminho, erro)
+        return [], []
+
+    return perfis, roadmaps
+
+
+def carregar_snapshot(caminho: Optional[str] = None) -> Dict[str, int]:
+    """
+    Preenche os caches com o snapshot, se existir. Perfis vencidos pelo TTL ficam de fora;
+    roadmaps gravados com outro prompt ou modelo são descartados inteiros.
+    """
+    perfis, roadmaps = _ler_snapshot(caminho or SNAPSHOT_ARQUIVO)
+    return {"perfis": obter_cache_perfis().importar(perfis), "roadmaps": obter_cache_roadmaps().importar(roadmaps)}
+
+
+class SnapshotPeriodico:
+    def __init__(self, intervalo: float = SNAPSHOT_INTERVALO_SEGUNDOS, caminho: Optional[str] = None):
+        self.intervalo = intervalo
+        self.caminho = caminho
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self) -> None:
+        if self.intervalo > 0:
+            self._thread = threading.Thread(target=self._loop, name="snapshot-caches", daemon=True)
+            self._thread.start()
+
+    def parar(self) -> None:
+        # Último snapshot no shutdown gracioso, com o que o worker acumulou até agora
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._gravar()
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self._gravar()
+
+    def _gravar(self) -> None:
+        try:
+            salvar_snapshot(self.caminho)
+        except Exception:
+            logger.exception("Falha ao gravar o snapshot dos caches")
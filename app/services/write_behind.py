@@ -0,0 +1,205 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from app.models.database import StatusStepEnum
+
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ATIVO = os.getenv("TOGGLE_WRITE_BEHIND", "").lower() in ("1", "true", "sim")
+WRITE_BEHIND_LOG = os.getenv("TOGGLE_WRITE_BEHIND_LOG", "./toggles_pendentes.log")
+INTERVALO_FLUSH_SEGUNDOS = float(os.getenv("TOGGLE_FLUSH_INTERVAL_MS", "200")) / 1000
+
+Chave = Tuple[int, int]
+
+
+class BufferToggles:
+    """
+    Buffer write-behind dos toggles de status. Cada toggle é confirmado depois do append com fsync
+    no log local; o flusher grava periodicamente só a última escrita de cada (usuário, passo) numa
+    única transação e compacta o log com o que ainda estiver pendente.
+
+    Cada worker escreve no próprio log (`<caminho_base>.<pid>`), travado com flock enquanto o
+    processo vive. Na inicialização, o worker também adota os logs sem trava: são de workers que
+    morreram (ou do log único de versões anteriores) e os toggles deles ainda não foram gravados.
+    """
+
+    def __init__(self, caminho_base: str, aplicar_lote: Callable[[Dict[Chave, StatusStepEnum]], int],
+                 intervalo: float = INTERVALO_FLUSH_SEGUNDOS, identificador: Optional[str] = None):
+        self.caminho_base = caminho_base
+        self.caminho_log = f"{caminho_base}.{identificador or os.getpid()}"
+        self.intervalo = intervalo
+        self._aplicar_lote = aplicar_lote
+        self._pendentes: Dict[Chave, StatusStepEnum] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._log = self._abrir_travado(self.caminho_log)
+        if self._log is None:
+            raise RuntimeError(f"Log de toggles {self.caminho_log} está em uso por outro processo")
+        self._recuperar_log(self._log)
+        adotados = self._adotar_logs_orfaos()
+        # O log próprio passa a conter tudo o que foi recuperado antes de os órfãos serem apagados
+        self._compactar_log()
+        for arquivo in adotados:
+            os.unlink(arquivo.name)
+            arquivo.close()
+
+    def registrar(self, user_id: int, step_id: int, status: StatusStepEnum) -> None:
+        linha = json.dumps({"u": user_id, "s": step_id, "st": status.value}) + "\n"
+        with self._lock:
+            self._log.write(linha)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._pendentes[(user_id, step_id)] = status
+
+    def pendentes_usuario(self, user_id: int) -> Dict[int, StatusStepEnum]:
+        with self._lock:
+            return {step_id: status for (uid, step_id), status in self._pendentes.items() if uid == user_id}
+
+    def total_pendentes(self) -> int:
+        with self._lock:
+            return len(self._pendentes)
+
+    def descarregar(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                lote = dict(self._pendentes)
+            if not lote:
+                return 0
+
+            aplicados = self._aplicar_lote(lote)
+
+            with self._lock:
+                # Só sai do buffer o que não foi sobrescrito durante a gravação
+                for chave, status in lote.items():
+                    if self._pendentes.get(chave) == status:
+                        del self._pendentes[chave]
+                self._compactar_log()
+
+            return aplicados
+
+    def iniciar(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="write-behind-toggles", daemon=True)
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.descarregar()
+        with self._lock:
+            # Log vazio não tem o que recuperar: sai junto com o worker (ainda travado, ninguém o adota)
+            if not self._pendentes:
+                os.unlink(self.caminho_log)
+            self._log.close()
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.descarregar()
+            except Exception:
+                # Os toggles continuam no buffer e no log; a próxima rodada tenta de novo
+                logger.exception("Falha ao gravar lote de toggles pendentes")
+
+    @staticmethod
+    def _abrir_travado(caminho: str):
+        arquivo = open(caminho, "a+", encoding="utf-8")
+        try:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            arquivo.close()
+            return None
+        # A compactação troca o arquivo por rename: a trava vale só se o caminho ainda é este arquivo
+        if not os.path.exists(caminho) or os.stat(caminho).st_ino != os.fstat(arquivo.fileno()).st_ino:
+            arquivo.close()
+            return None
+        return arquivo
+
+    def _adotar_logs_orfaos(self) -> list:
+        adotados = []
+        candidatos = [self.caminho_base] + glob.glob(glob.escape(self.caminho_base) + ".*")
+        for caminho in candidatos:
+            if caminho == self.caminho_log or caminho.endswith(".tmp") or not os.path.isfile(caminho):
+                continue
+            arquivo = self._abrir_travado(caminho)
+            if arquivo is None:
+                # Worker vivo (ou outro worker adotando ao mesmo tempo)
+                continue
+            self._recuperar_log(arquivo)
+            adotados.append(arquivo)
+        if adotados:
+            logger.warning("Adotados %d log(s) de toggles de workers encerrados", len(adotados))
+        return adotados
+
+    def _recuperar_log(self, arquivo) -> None:
+        arquivo.seek(0)
+        for linha in arquivo:
+            try:
+                entrada = json.loads(linha)
+                self._pendentes[(entrada["u"], entrada["s"])] = StatusStepEnum(entrada["st"])
+            except (ValueError, KeyError):
+                # Última linha pode ter ficado pela metade numa queda; o toggle dela não foi confirmado
+                continue
+
+    def _compactar_log(self) -> None:
+        temporario = f"{self.caminho_log}.tmp"
+        novo = open(temporario, "w", encoding="utf-8")
+        # Trava antes do rename: o log nunca fica visível sem dono para quem procura órfãos
+        fcntl.flock(novo.fileno(), fcntl.LOCK_EX)
+        for (user_id, step_id), status in self._pendentes.items():
+            novo.write(json.dumps({"u": user_id, "s": step_id, "st": status.value}) + "\n")
+        novo.flush()
+        os.fsync(novo.fileno())
+
+        os.replace(temporario, self.caminho_log)
+        self._log.close()
+        self._log = novo
+
+
+_buffer: Optional[BufferToggles] = None
+
+
+def obter_buffer_toggles() -> Optional[BufferToggles]:
+    return _buffer
+
+
+def iniciar_write_behind(session_factory, aplicar_toggles_em_lote, caminho_base: str = WRITE_BEHIND_LOG) -> BufferToggles:
+    global _buffer
+
+    def aplicar_lote(lote):
+        db = session_factory()
+        try:
+            return aplicar_toggles_em_lote(lote, db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    _buffer = BufferToggles(caminho_base, aplicar_lote)
+    # Toggles confirmados antes de uma queda (deste worker ou de outro) são gravados antes de aceitar tráfego
+    try:
+        _buffer.descarregar()
+    except Exception:
+        logger.exception("Falha ao gravar toggles recuperados do log; o flusher tentará de novo")
+    _buffer.iniciar()
+    return _buffer
+
+
+def parar_write_behind() -> None:
+    global _buffer
+    if _buffer:
+        _buffer.parar()
+        _buffer = None
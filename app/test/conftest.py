@@ -2,22 +2,45 @@
 import json
 import os
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from fastapi.testclient import TestClient
 
 from app.main import app
-from app.models.database import Base, Usuario, get_db, qualidades_to_json
-
+from app.idempotencia import obter_armazem_idempotencia
+from app.services.cache import obter_cache_perfis, obter_cache_roadmaps
+from app.models.database import (
+    Base, Usuario, get_db, get_db_leitura, criar_steps_padrao, qualidades_to_json
+)
 
-# Banco de teste (SQLite)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test_reskill.db"
 
+# Banco de teste em memória, um por processo: cada worker do pytest-xdist tem o seu e nada vai para o disco.
+# StaticPool mantém uma única conexão viva (o banco some quando ela fecha) e a compartilha com as
+# threads do TestClient
 engine_test = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+
+@event.listens_for(engine_test, "connect")
+def _desligar_transacao_do_driver(dbapi_connection, connection_record):
+    # O pysqlite abre e fecha transações por conta própria e quebra os SAVEPOINTs;
+    # com isolation_level None quem emite o BEGIN é o SQLAlchemy (evento abaixo)
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine_test, "begin")
+def _iniciar_transacao(conexao):
+    conexao.exec_driver_sql("BEGIN")
+
+
+# Emitidos pelas sessões do teste, não pelo código testado: ficam fora das contagens de statements
+STATEMENTS_DE_SAVEPOINT = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+# Sessões entram na transação do teste: o commit delas só libera um SAVEPOINT
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, join_transaction_mode="create_savepoint")
 
 
 def override_get_db():
@@ -30,15 +53,71 @@ def override_get_db():
 
 # Override da dependência do FastAPI
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_db_leitura] = override_get_db
+
+
+def pytest_configure(config):
+    # Tempo de cada teste no resumo final (equivale a --durations=0), salvo se vier outro valor na linha de comando
+    if config.option.durations is None:
+        config.option.durations = 0
+
+
+@pytest.fixture(scope="session", autouse=True)
+def traces_temporarios(tmp_path_factory):
+    # Requisições com profiling geram spans; o exportador em background não deve escrever no repositório
+    from app import tracing
+
+    tracing.TRACE_FILE = str(tmp_path_factory.mktemp("traces") / "traces.jsonl")
 
 
 @pytest.fixture(scope="session", autouse=True)
-def setup_database():
-    # Cria as tabelas no banco de teste
-    Base.metadata.drop_all(bind=engine_test)
-    Base.metadata.create_all(bind=engine_test)
-    yield
-    Base.metadata.drop_all(bind=engine_test)
+def snapshot_temporario(tmp_path_factory):
+    # Testes com lifespan gravam o snapshot dos caches no shutdown; fica fora do repositório
+    from app.services import snapshot
+
+    snapshot.SNAPSHOT_ARQUIVO = str(tmp_path_factory.mktemp("snapshot") / "cache_snapshot.bin")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def idempotencia_temporaria(tmp_path_factory):
+    # Respostas guardadas pelo middleware de idempotência ficam num arquivo por worker, fora do repositório
+    from app import idempotencia
+
+    idempotencia._armazem = idempotencia.ArmazemIdempotencia(
+        str(tmp_path_factory.mktemp("idempotencia") / "idempotencia.db")
+    )
+
+
+@pytest.fixture(scope="session")
+def conexao_test():
+    # Schema e passos padrão criados uma única vez por worker; os testes só desfazem o que escreveram
+    conexao = engine_test.connect()
+    Base.metadata.create_all(bind=conexao)
+    db = TestingSessionLocal(bind=conexao)
+    criar_steps_padrao(db)
+    db.close()
+    conexao.commit()
+
+    TestingSessionLocal.configure(bind=conexao)
+    yield conexao
+    conexao.close()
+
+
+@pytest.fixture(autouse=True)
+def transacao_do_teste(conexao_test):
+    """
+    Cada teste roda dentro de uma transação desfeita no final: sem delete/insert entre testes,
+    e os ids recomeçam do mesmo ponto.
+    """
+    transacao = conexao_test.begin()
+    try:
+        yield
+    finally:
+        transacao.rollback()
+        # Caches em memória apontariam para linhas que o rollback apagou
+        obter_cache_perfis().limpar()
+        obter_cache_roadmaps().limpar()
+        obter_armazem_idempotencia().limpar()
 
 
 @pytest.fixture
@@ -60,9 +139,6 @@ def mock_usuarios(db_session):
     """
     Carrega usuários mockados do arquivo JSON e insere direto no banco.
     """
-    db_session.query(Usuario).delete()
-    db_session.commit()
-
     file_path = os.path.join(os.path.dirname(__file__), "mock_usuarios.json")
     with open(file_path, "r", encoding="utf-8") as f:
         usuarios = json.load(f)
@@ -0,0 +1,59 @@
+# tests/test_ai_roadmap.py
+import json
+from types import SimpleNamespace
+
+from app.services import ai_roadmap
+
+
+def _usuario():
+    return SimpleNamespace(
+        profissao="Operador de Caixa",
+        nivel_experience="iniciante",
+        tempo_estudo_semanal=5.0,
+        interesses="Tecnologia",
+        qualidades='["Dedicado"]',
+    )
+
+
+def _step(ordem):
+    return {"id": str(ordem), "title": f"Passo gerado {ordem}", "description": f"Descrição {ordem}", "order": ordem}
+
+
+# ========= 1) Parser tolerante =========
+def test_extrai_steps_de_json_truncado():
+    steps = [_step(i) for i in range(1, 5)]
+    content = "```json\n" + json.dumps({"steps": steps})[:-10]
+
+    validos = ai_roadmap._extrair_steps_validos(content)
+
+    assert sorted(validos) == [1, 2, 3]
+    assert validos[2]["title"] == "Passo gerado 2"
+
+
+def test_descarta_steps_invalidos():
+    steps = [_step(1), {"title": "", "description": "x"}, "lixo", _step(4)]
+
+    validos = ai_roadmap._extrair_steps_validos(json.dumps(steps))
+
+    assert sorted(validos) == [1, 4]
+
+
+# ========= 2) Reparo incremental =========
+def test_regenera_somente_steps_faltantes(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "chave-teste")
+    chamadas = []
+
+    def fake_chamar_groq(api_key, messages, max_tokens):
+        chamadas.append(messages)
+        if len(chamadas) == 1:
+            return json.dumps({"steps": [_step(i) for i in (1, 2, 3, 5, 6)]})
+        return json.dumps({"steps": [_step(4), _step(7)]})
+
+    monkeypatch.setattr(ai_roadmap, "_chamar_groq", fake_chamar_groq)
+
+    roadmap = ai_roadmap.gerar_roadmap_ai(_usuario())
+
+    assert len(chamadas) == 2
+    assert "4, 7" in chamadas[1][-1]["content"]
+    assert [step["order"] for step in roadmap] == list(range(1, 8))
+    assert all(step["title"].startswith("Passo gerado") for step in roadmap)
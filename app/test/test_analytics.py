@@ -0,0 +1,104 @@
+# tests/test_analytics.py
+from app.login import create_access_token
+from app.services.analytics import recalcular_agregados
+
+
+def _headers(role):
+    email = "admin@fiap.com" if role == "admin" else "aluno@fiap.com"
+    token = create_access_token({"sub": email, "role": role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _toggle(client, usuario, step_id, status):
+    client.put(f"/roadmap/steps/{step_id}/toggle?user_id={usuario.id}", json={"status": status})
+
+
+# ========= 1) Agregados incrementais =========
+def test_analytics_reflete_transicoes(client, mock_usuarios, db_session):
+    joao, maria = mock_usuarios
+    _toggle(client, joao, 1, "em_andamento")
+    _toggle(client, joao, 1, "concluido")
+    _toggle(client, maria, 1, "em_andamento")
+    _toggle(client, maria, 2, "concluido")
+
+    response = client.get("/admin/analytics", headers=_headers("admin"))
+
+    assert response.status_code == 200
+    data = response.json()
+    step_1 = next(linha for linha in data["byStep"] if linha["stepId"] == 1)
+    assert (step_1["inProgress"], step_1["completed"], step_1["completionRate"]) == (1, 1, 0.5)
+
+    por_profissao = {(l["stepId"], l["currentProfession"]): l["completed"] for l in data["byProfession"]}
+    assert por_profissao[(1, "Operador de Caixa")] == 1
+    assert por_profissao[(2, "Assistente Administrativo")] == 1
+
+    # A reconciliação completa chega aos mesmos números do incremental
+    recalcular_agregados(db_session)
+    assert client.get("/admin/analytics", headers=_headers("admin")).json() == data
+
+
+# ========= 2) Acesso restrito =========
+def test_analytics_exige_admin(client):
+    response = client.get("/admin/analytics", headers=_headers("user"))
+
+    assert response.status_code == 403
+
+
+# ========= 3) Primeiro toggle de um perfil em duas requisições ao mesmo tempo =========
+def test_transicoes_simultaneas_nao_perdem_contagem(mock_usuarios, db_session):
+    from app.models.database import AgregadoProgresso, StatusStepEnum
+    from app.services.analytics import registrar_transicao
+    from app.test.conftest import TestingSessionLocal
+
+    joao = mock_usuarios[0]
+    # As duas sessões decidem antes de qualquer commit: nenhuma vê a linha do agregado
+    primeira, segunda = TestingSessionLocal(), TestingSessionLocal()
+    registrar_transicao(primeira, joao.id, 3, None, StatusStepEnum.CONCLUIDO)
+    registrar_transicao(segunda, joao.id, 3, None, StatusStepEnum.CONCLUIDO)
+    registrar_transicao(segunda, joao.id, 3, StatusStepEnum.CONCLUIDO, StatusStepEnum.EM_ANDAMENTO)
+    segunda.commit()
+    primeira.commit()
+    primeira.close()
+    segunda.close()
+
+    agregado = db_session.query(AgregadoProgresso).filter(AgregadoProgresso.id_step == 3).one()
+    assert (agregado.concluidos, agregado.em_andamento) == (1, 1)
+
+
+# ========= 4) Troca de profissão move os status para o novo perfil =========
+def test_troca_de_profissao_move_os_status(client, mock_usuarios, db_session):
+    joao = mock_usuarios[0]
+    _toggle(client, joao, 1, "concluido")
+    _toggle(client, joao, 2, "em_andamento")
+
+    response = client.put(f"/users/{joao.id}", json={"currentProfession": "Analista de Dados"})
+    assert response.status_code == 200
+
+    data = client.get("/admin/analytics", headers=_headers("admin")).json()
+    por_profissao = {
+        (l["stepId"], l["currentProfession"]): (l["inProgress"], l["completed"]) for l in data["byProfession"]
+    }
+    assert por_profissao[(1, "Analista de Dados")] == (0, 1)
+    assert por_profissao[(2, "Analista de Dados")] == (1, 0)
+    assert por_profissao[(1, "Operador de Caixa")] == (0, 0)
+
+    # Sem desvio para a reconciliação noturna corrigir (fora as linhas zeradas do perfil antigo)
+    recalcular_agregados(db_session)
+    recalculado = client.get("/admin/analytics", headers=_headers("admin")).json()
+    assert [l for l in data["segments"] if l["inProgress"] or l["completed"]] == recalculado["segments"]
+
+
+# ========= 5) Perfil em cache defasado não escolhe o agregado =========
+def test_toggle_usa_profissao_do_banco(client, mock_usuarios, db_session):
+    from app.models.database import AgregadoProgresso, Usuario
+
+    joao = mock_usuarios[0]
+    _toggle(client, joao, 1, "em_andamento")  # perfil de João entra no cache
+
+    # Troca feita fora da API: o cache continua com a profissão antiga
+    db_session.query(Usuario).filter(Usuario.id == joao.id).update({"profissao": "Analista de Dados"})
+    db_session.commit()
+    _toggle(client, joao, 2, "concluido")
+
+    agregado = db_session.query(AgregadoProgresso).filter(AgregadoProgresso.id_step == 2).one()
+    assert (agregado.profissao, agregado.concluidos) == ("Analista de Dados", 1)
@@ -0,0 +1,59 @@
+# tests/test_batch_get.py
+from sqlalchemy import event
+
+from app.services import ai_roadmap
+from app.test.conftest import engine_test
+
+
+def _contar_selects():
+    selects = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    return selects, lambda: event.remove(engine_test, "before_cursor_execute", contar)
+
+
+# ========= 1) Usuários em lote: um IN para os que não estão no cache =========
+def test_batch_get_usuarios(client, mock_usuarios):
+    ids = [u.id for u in mock_usuarios]
+    # O primeiro já está no cache de perfis; os demais saem de uma consulta só
+    client.get(f"/users/{ids[0]}")
+
+    selects, parar = _contar_selects()
+    try:
+        resposta = client.post("/users:batchGet", json={"ids": ids + [ids[0], 99999]})
+    finally:
+        parar()
+
+    assert resposta.status_code == 200
+    dados = resposta.json()
+    assert [u["id"] for u in dados["users"]] == ids
+    assert dados["notFound"] == [99999]
+    assert len(selects) == 1
+
+    assert client.post("/users:batchGet", json={"ids": []}).status_code == 400
+    assert client.post("/users:batchGet", json={"ids": list(range(1, 502))}).status_code == 400
+
+
+# ========= 2) Roadmaps em lote: só os salvos, sem chamar a IA =========
+def test_batch_get_roadmaps(client, mock_usuarios, monkeypatch):
+    com_roadmap, sem_roadmap = mock_usuarios[0].id, mock_usuarios[1].id
+    client.get(f"/roadmap?user_id={com_roadmap}")
+    client.put(f"/roadmap/steps/2/toggle?user_id={com_roadmap}", json={"status": "concluido"})
+
+    chamadas = []
+    monkeypatch.setattr(ai_roadmap, "_gerar_roadmap_mock", lambda u: chamadas.append(u))
+
+    resposta = client.post("/roadmap:batchGet", json={"ids": [com_roadmap, sem_roadmap, 99999]})
+
+    assert resposta.status_code == 200
+    dados = resposta.json()
+    assert chamadas == []
+    assert [r["userId"] for r in dados["roadmaps"]] == [com_roadmap]
+    assert dados["roadmaps"][0]["roadmapSteps"] == client.get(f"/roadmap?user_id={com_roadmap}").json()["roadmapSteps"]
+    assert [s["completed"] for s in dados["roadmaps"][0]["roadmapSteps"]].count(True) == 1
+    assert dados["withoutRoadmap"] == [sem_roadmap]
+    assert dados["notFound"] == [99999]
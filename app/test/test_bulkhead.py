@@ -0,0 +1,102 @@
+# tests/test_bulkhead.py
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.bulkhead import Bulkhead
+from app.login import create_access_token
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+
+
+def _ocupar(bulkhead, liberar):
+    # Prende a única thread do bulkhead até `liberar` ser sinalizado
+    thread = threading.Thread(target=lambda: asyncio.run(bulkhead.executar(liberar.wait)))
+    thread.start()
+    while bulkhead.metricas()["em_execucao"] == 0:
+        time.sleep(0.005)
+    return thread
+
+
+# ========= 1) Fila cheia e espera esgotada são recusadas com 503 =========
+def test_bulkhead_recusa_fila_cheia_e_espera():
+    bulkhead = Bulkhead("teste", max_concorrencia=1, max_fila=1, espera=0.1)
+    liberar = threading.Event()
+    ocupante = _ocupar(bulkhead, liberar)
+
+    async def cenario():
+        na_fila = asyncio.ensure_future(bulkhead.executar(lambda: "executou"))
+        await asyncio.sleep(0.01)
+        assert bulkhead.metricas()["na_fila"] == 1
+
+        with pytest.raises(HTTPException) as cheia:
+            await bulkhead.executar(lambda: "não executa")
+        assert cheia.value.status_code == 503
+
+        with pytest.raises(HTTPException) as esgotada:
+            await na_fila
+        assert esgotada.value.headers["Retry-After"] == "1"
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        liberar.set()
+        ocupante.join()
+
+    metricas = bulkhead.metricas()
+    assert metricas["rejeitadas_fila_cheia"] == 1
+    assert metricas["rejeitadas_espera"] == 1
+    assert metricas["concluidas"] == 1
+    assert metricas["na_fila"] == 0 and metricas["em_execucao"] == 0
+    assert asyncio.run(bulkhead.executar(lambda: "livre")) == "livre"
+
+
+# ========= 2) /roadmap saturado não afeta GET /users e aparece nas métricas =========
+def test_roadmap_saturado_isolado_do_crud(client, mock_usuarios, monkeypatch):
+    bulkhead = Bulkhead("roadmap", max_concorrencia=1, max_fila=0, espera=0.1)
+    monkeypatch.setattr(main, "bulkhead_roadmap", bulkhead)
+    user_id = mock_usuarios[0].id
+
+    liberar = threading.Event()
+    ocupante = _ocupar(bulkhead, liberar)
+    try:
+        assert client.get(f"/roadmap?user_id={user_id}").status_code == 503
+        assert client.get(f"/users/{user_id}").status_code == 200
+
+        pools = client.get("/admin/pools", headers=ADMIN_HEADERS).json()
+        assert pools["roadmap"]["saturacao"] == 1.0
+        assert pools["roadmap"]["rejeitadas_fila_cheia"] == 1
+        assert pools["padrao"]["max_concorrencia"] >= 1
+    finally:
+        liberar.set()
+        ocupante.join()
+
+    assert client.get(f"/roadmap?user_id={user_id}").status_code == 200
+
+
+# ========= 3) Roadmap já salvo não passa pelo bulkhead =========
+def test_roadmap_salvo_atendido_com_bulkhead_cheio(client, mock_usuarios, monkeypatch):
+    bulkhead = Bulkhead("roadmap", max_concorrencia=1, max_fila=0, espera=0.1)
+    monkeypatch.setattr(main, "bulkhead_roadmap", bulkhead)
+    user_id = mock_usuarios[0].id
+    gerado = client.get(f"/roadmap?user_id={user_id}")
+    assert gerado.status_code == 200
+
+    liberar = threading.Event()
+    ocupante = _ocupar(bulkhead, liberar)
+    try:
+        salvo = client.get(f"/roadmap?user_id={user_id}")
+        # Sem roadmap salvo, o outro usuário precisa da IA e é recusado
+        assert client.get(f"/roadmap?user_id={mock_usuarios[1].id}").status_code == 503
+    finally:
+        liberar.set()
+        ocupante.join()
+
+    assert salvo.status_code == 200
+    assert salvo.json() == gerado.json()
+    assert bulkhead.metricas()["concluidas"] == 2
@@ -0,0 +1,70 @@
+# tests/test_cache.py
+from app.services import eventos
+from app.services.cache import CachePerfis, PerfilUsuario, obter_cache_perfis
+
+
+def _perfil(user_id, nome="Usuário"):
+    return PerfilUsuario(
+        id=user_id, nome=nome, email=f"u{user_id}@example.com", profissao="Analista",
+        nivel_experience="iniciante", tempo_estudo_semanal=4.0, interesses="Dados", qualidades="[]",
+    )
+
+
+# ========= 1) Read-through com invalidação no update =========
+def test_get_user_usa_cache_e_update_invalida(client, mock_usuarios):
+    usuario = mock_usuarios[0]
+    cache = obter_cache_perfis()
+    antes = cache.estatisticas()
+
+    client.get(f"/users/{usuario.id}")
+    client.get(f"/users/{usuario.id}")
+    client.put(f"/users/{usuario.id}", json={"name": "Nome Novo"})
+    response = client.get(f"/users/{usuario.id}")
+
+    depois = cache.estatisticas()
+    assert response.json()["name"] == "Nome Novo"
+    assert depois["hits"] - antes["hits"] == 1
+    assert depois["misses"] - antes["misses"] == 2
+    assert depois["invalidacoes"] - antes["invalidacoes"] == 1
+
+
+# ========= 2) Limites de tamanho =========
+def test_cache_respeita_limite_de_entradas_e_memoria():
+    cache = CachePerfis(max_entradas=2, max_bytes=10 ** 6)
+    for user_id in (1, 2, 3):
+        cache.obter(user_id, lambda user_id=user_id: _perfil(user_id))
+
+    assert cache.estatisticas()["entradas"] == 2
+    assert cache.estatisticas()["evictions"] == 1
+
+    pequeno = CachePerfis(max_entradas=100, max_bytes=_perfil(1).tamanho_bytes() * 2 + 10)
+    for user_id in range(1, 6):
+        pequeno.obter(user_id, lambda user_id=user_id: _perfil(user_id))
+
+    assert pequeno.estatisticas()["entradas"] == 2
+
+
+# ========= 3) Invalidação entre workers =========
+def test_invalidacao_chega_aos_outros_workers(monkeypatch):
+    monkeypatch.setattr(eventos, "_pubsub", eventos.PubSubLocal())
+    worker_a, worker_b = CachePerfis(), CachePerfis()
+    worker_a.obter(5, lambda: _perfil(5))
+    worker_b.obter(5, lambda: _perfil(5))
+
+    worker_a.invalidar([5])
+
+    assert worker_b.estatisticas()["entradas"] == 0
+    assert worker_b.estatisticas()["invalidacoes_remotas"] == 1
+
+
+# ========= 4) Estatísticas no padrão de nomes da API =========
+def test_admin_cache_em_camel_case(client, mock_usuarios):
+    from app.login import create_access_token
+
+    token = create_access_token({"sub": "admin@fiap.com", "role": "admin"})
+    client.get(f"/users/{mock_usuarios[0].id}")
+
+    dados = client.get("/admin/cache", headers={"Authorization": f"Bearer {token}"}).json()
+
+    assert dados["entries"] == 1
+    assert set(dados) >= {"hitRate", "remoteInvalidations", "averageAgeSeconds", "maxAgeSeconds", "ttlSeconds"}
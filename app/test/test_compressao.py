@@ -0,0 +1,54 @@
+# tests/test_compressao.py
+import json
+
+from app.compressao import _compressivel, negociar
+from app.login import create_access_token
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+
+
+# ========= 1) Negociação =========
+def test_negociacao_respeita_q_e_preferencia_do_servidor():
+    disponiveis = ["zstd", "br", "gzip"]
+
+    assert negociar("gzip, br", disponiveis) == "br"
+    assert negociar("br;q=0.5, gzip", disponiveis) == "gzip"
+    assert negociar("*", disponiveis) == "zstd"
+    assert negociar("gzip;q=0, identity", disponiveis) is None
+    assert negociar("br", ["gzip"]) is None
+
+
+def test_sse_e_respostas_ja_codificadas_nao_sao_comprimidas():
+    assert not _compressivel([(b"content-type", b"text/event-stream; charset=utf-8")])
+    assert not _compressivel([(b"content-type", b"application/json"), (b"content-encoding", b"br")])
+    assert _compressivel([(b"content-type", b"application/json")])
+
+
+# ========= 2) Respostas HTTP =========
+def test_roadmap_comprimido_e_payload_pequeno_nao(client, mock_usuarios):
+    usuario = mock_usuarios[0]
+
+    roadmap = client.get(f"/roadmap?user_id={usuario.id}", headers={"Accept-Encoding": "gzip"})
+    assert roadmap.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in roadmap.headers["vary"]
+    assert int(roadmap.headers["content-length"]) < len(roadmap.content)
+    assert len(roadmap.json()["roadmapSteps"]) == 7
+
+    pequeno = client.get(f"/users/{usuario.id}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in pequeno.headers
+
+
+def test_export_em_streaming_e_comprimido_por_pedaco(client, mock_usuarios, monkeypatch):
+    from app import compressao
+    from app.services import exportacao
+
+    monkeypatch.setattr(exportacao, "TAMANHO_LOTE_EXPORT", 1)
+    monkeypatch.setattr(compressao, "COMPRESSAO_BUFFER_BYTES", 1)
+
+    response = client.get("/export/users?format=ndjson", headers={**ADMIN_HEADERS, "Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    linhas = [json.loads(linha) for linha in response.text.splitlines()]
+    assert {linha["email"] for linha in linhas} == {u.email for u in mock_usuarios}
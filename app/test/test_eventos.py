@@ -0,0 +1,102 @@
+# tests/test_eventos.py
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.services import eventos
+
+
+class FakeRequest:
+    def __init__(self):
+        self.desconectado = False
+
+    async def is_disconnected(self):
+        return self.desconectado
+
+
+@pytest.fixture
+def pubsub_local():
+    # O pub/sub é global: o anterior volta no teardown, mesmo quando o teste falha
+    anterior = eventos.obter_pubsub()
+    eventos.configurar_pubsub(eventos.PubSubLocal())
+    yield
+    eventos.configurar_pubsub(anterior)
+
+
+# ========= 1) Stream recebe eventos publicados por outra thread =========
+def test_stream_entrega_eventos_publicados(pubsub_local):
+    async def cenario():
+        request = FakeRequest()
+        assinatura = eventos.assinar_usuario(7)
+        stream = eventos.stream_eventos_usuario(assinatura, request, {"completedSteps": [], "inProgressSteps": []})
+
+        snapshot = await stream.__anext__()
+        thread = threading.Thread(
+            target=eventos.publicar_evento_usuario, args=(7, "step_status", {"stepId": 2, "status": "concluido"})
+        )
+        thread.start()
+        evento = await asyncio.wait_for(stream.__anext__(), timeout=2)
+        thread.join()
+
+        request.desconectado = True
+        await stream.aclose()
+        return snapshot, evento
+
+    snapshot, evento = asyncio.run(cenario())
+
+    assert snapshot.startswith("event: snapshot\n")
+    linhas = evento.strip().split("\n")
+    assert linhas[0] == "event: step_status"
+    assert json.loads(linhas[1][len("data: "):]) == {"stepId": 2, "status": "concluido"}
+
+
+# ========= 2) Toggle publica após o commit =========
+def test_toggle_publica_evento(client, mock_usuarios, pubsub_local):
+    publicados = []
+
+    class PubSubGravador(eventos.PubSubLocal):
+        def publicar(self, canal, mensagem):
+            publicados.append((canal, mensagem))
+
+    eventos.configurar_pubsub(PubSubGravador())
+    usuario = mock_usuarios[0]
+
+    client.put(f"/roadmap/steps/3/toggle?user_id={usuario.id}", json={"status": "concluido"})
+
+    assert publicados == [(
+        f"usuario:{usuario.id}",
+        {"type": "step_status", "data": {"stepId": 3, "status": "concluido", "completed": True}}
+    )]
+
+
+# ========= 3) Toggle commitado durante a leitura do snapshot não se perde =========
+def test_stream_assina_antes_do_snapshot(pubsub_local, monkeypatch):
+    from app import main
+    from app.schemas.pydantic import ProgressoResponse
+
+    def progresso_com_toggle_no_meio(user_id, db):
+        # O toggle é publicado enquanto o snapshot é lido
+        eventos.publicar_evento_usuario(user_id, "step_status", {"stepId": 4, "status": "concluido"})
+        return ProgressoResponse(completedSteps=[], inProgressSteps=[])
+
+    monkeypatch.setattr(main, "get_progresso", progresso_com_toggle_no_meio)
+
+    async def cenario():
+        request = FakeRequest()
+        response = await main.endpoint_stream_roadmap(7, request, db=None)
+        stream = response.body_iterator
+
+        snapshot = await stream.__anext__()
+        evento = await asyncio.wait_for(stream.__anext__(), timeout=2)
+
+        request.desconectado = True
+        await stream.aclose()
+        return snapshot, evento
+
+    snapshot, evento = asyncio.run(cenario())
+
+    assert snapshot.startswith("event: snapshot\n")
+    assert evento.startswith("event: step_status\n")
+    assert eventos.obter_pubsub()._assinaturas == {}
@@ -0,0 +1,75 @@
+# tests/test_exportacao.py
+import csv
+import io
+import json
+
+import pytest
+
+from app.login import create_access_token
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+
+
+def test_export_usuarios_ndjson_e_incremental(client, mock_usuarios):
+    response = client.get("/export/users?format=ndjson", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    linhas = [json.loads(linha) for linha in response.text.splitlines()]
+    assert {linha["email"] for linha in linhas} == {u.email for u in mock_usuarios}
+    assert "senha_hash" not in linhas[0]
+
+    # Incremental: só o que mudou depois da marca d'água do export anterior
+    watermark = response.headers["X-Export-Watermark"]
+    client.put(f"/users/{mock_usuarios[1].id}", json={"name": "Maria Atualizada"})
+
+    incremental = client.get("/export/users", params={"since": watermark}, headers=ADMIN_HEADERS)
+    linhas = [json.loads(linha) for linha in incremental.text.splitlines()]
+    assert [linha["nome"] for linha in linhas] == ["Maria Atualizada"]
+
+
+def test_export_progresso_csv(client, mock_usuarios):
+    usuario = mock_usuarios[0]
+    client.put(f"/roadmap/steps/1/toggle?user_id={usuario.id}", json={"status": "concluido"})
+
+    response = client.get("/export/progress?format=csv", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    linhas = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(l["id_usuario"], l["id_step"], l["status"]) for l in linhas] == [(str(usuario.id), "1", "concluido")]
+
+
+def test_export_progresso_parquet(client, mock_usuarios, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    from app.services import exportacao
+
+    monkeypatch.setattr(exportacao, "TAMANHO_LOTE_EXPORT", 1)
+    for usuario in mock_usuarios:
+        client.put(f"/roadmap/steps/2/toggle?user_id={usuario.id}", json={"status": "em_andamento"})
+
+    response = client.get("/export/progress?format=parquet", headers=ADMIN_HEADERS)
+
+    arquivo = pq.ParquetFile(io.BytesIO(response.content))
+    assert arquivo.metadata.num_row_groups == 2
+    tabela = arquivo.read()
+    assert tabela.column("status").to_pylist() == ["em_andamento", "em_andamento"]
+    assert tabela.column("data_conclusao").to_pylist() == [None, None]
+
+
+def test_export_formato_invalido(client):
+    response = client.get("/export/users?format=xml", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 400
+
+
+def test_export_erro_inesperado_vira_500(client, monkeypatch):
+    from app.controllers import controller
+
+    def falhar(*args):
+        raise RuntimeError("banco fora do ar")
+
+    monkeypatch.setattr(controller, "preparar_exportacao", falhar)
+    response = client.get("/export/users", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Erro interno no servidor"}
@@ -0,0 +1,194 @@
+# tests/test_idempotencia.py
+import asyncio
+import time
+
+import httpx
+
+from app.idempotencia import CONFLITO, EM_ANDAMENTO, NOVA, REPETIR, ArmazemIdempotencia
+from app.main import app
+from app.models.database import Usuario
+from app.services.service import Service
+
+
+def _payload(email="idem@example.com"):
+    return {
+        "name": "Usuário Idempotente",
+        "email": email,
+        "currentProfession": "Estudante",
+        "experienceLevel": "iniciante",
+        "weeklyStudyTime": 5,
+        "interests": "APIs",
+        "qualities": ["Curioso"],
+    }
+
+
+def _contar_create_user(monkeypatch, atraso=0.0):
+    chamadas = []
+    original = Service.create_user
+
+    def create_user(dados, db):
+        chamadas.append(dados.email)
+        time.sleep(atraso)
+        return original(dados, db)
+
+    monkeypatch.setattr(Service, "create_user", staticmethod(create_user))
+    return chamadas
+
+
+# ========= 1) Repetição devolve a resposta original =========
+def test_repeticao_nao_passa_pelo_service(client, mock_usuarios, db_session, monkeypatch):
+    chamadas = _contar_create_user(monkeypatch)
+    headers = {"Idempotency-Key": "criar-1"}
+
+    primeira = client.post("/users", json=_payload(), headers=headers)
+    repeticao = client.post("/users", json=_payload(), headers=headers)
+
+    assert primeira.status_code == repeticao.status_code == 201
+    assert repeticao.json() == primeira.json()
+    assert repeticao.headers["Idempotent-Replayed"] == "true"
+    assert chamadas == ["idem@example.com"]
+    assert db_session.query(Usuario).filter(Usuario.email == "idem@example.com").count() == 1
+
+
+def test_chave_reusada_com_outro_corpo_retorna_422(client, mock_usuarios):
+    headers = {"Idempotency-Key": "criar-2"}
+    client.post("/users", json=_payload("a@example.com"), headers=headers)
+
+    response = client.post("/users", json=_payload("b@example.com"), headers=headers)
+
+    assert response.status_code == 422
+
+
+def test_toggle_repetido_com_a_mesma_chave(client, mock_usuarios):
+    usuario = mock_usuarios[0]
+    url = f"/roadmap/steps/1/toggle?user_id={usuario.id}"
+
+    primeira = client.put(url, json={"status": "concluido"}, headers={"Idempotency-Key": "toggle-1"})
+    repeticao = client.put(url, json={"status": "concluido"}, headers={"Idempotency-Key": "toggle-1"})
+
+    assert repeticao.json() == primeira.json()
+    assert "Idempotent-Replayed" not in primeira.headers
+    assert repeticao.headers["Idempotent-Replayed"] == "true"
+
+
+# ========= 2) Duplicatas concorrentes =========
+def test_duplicatas_concorrentes_esperam_a_primeira(mock_usuarios, monkeypatch):
+    chamadas = _contar_create_user(monkeypatch, atraso=0.2)
+    headers = {"Idempotency-Key": "criar-concorrente"}
+
+    async def enviar_duas():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://test") as cliente:
+            return await asyncio.gather(
+                cliente.post("/users", json=_payload("conc@example.com"), headers=headers),
+                cliente.post("/users", json=_payload("conc@example.com"), headers=headers),
+            )
+
+    respostas = asyncio.run(enviar_duas())
+
+    assert [r.status_code for r in respostas] == [201, 201]
+    assert respostas[0].json() == respostas[1].json()
+    assert len(chamadas) == 1
+
+
+# ========= 3) Escopo da chave =========
+def test_mesma_chave_de_clientes_diferentes_nao_colide(client, mock_usuarios):
+    usuario = mock_usuarios[0]
+    url = f"/roadmap/steps/1/toggle?user_id={usuario.id}"
+    corpo = {"status": "concluido"}
+
+    primeira = client.put(url, json=corpo, headers={"Idempotency-Key": "k", "Authorization": "Bearer a"})
+    outro_cliente = client.put(url, json=corpo, headers={"Idempotency-Key": "k", "Authorization": "Bearer b"})
+    outro_endpoint = client.post("/users", json=_payload("escopo@example.com"),
+                                 headers={"Idempotency-Key": "k", "Authorization": "Bearer a"})
+
+    assert primeira.status_code == outro_cliente.status_code == 200
+    assert "Idempotent-Replayed" not in outro_cliente.headers
+    # Outro endpoint com a mesma chave não é "chave reusada com outro corpo"
+    assert outro_endpoint.status_code == 201
+
+
+# ========= 4) Armazém compartilhado entre workers =========
+def test_workers_compartilham_reservas_e_respostas(tmp_path):
+    caminho = str(tmp_path / "idempotencia.db")
+    worker_a, worker_b = ArmazemIdempotencia(caminho), ArmazemIdempotencia(caminho)
+    resposta = (201, [("content-type", "application/json")], b'{"id": 1}')
+
+    assert worker_a.reservar("chave", "impressao") == (NOVA, None)
+    assert worker_b.reservar("chave", "impressao") == (EM_ANDAMENTO, None)
+    assert worker_b.reservar("chave", "outra") == (CONFLITO, None)
+
+    worker_a.concluir("chave", resposta)
+
+    assert worker_b.reservar("chave", "impressao") == (REPETIR, resposta)
+
+
+def test_reserva_de_worker_morto_e_assumida(tmp_path):
+    caminho = str(tmp_path / "idempotencia.db")
+    morto, vivo = ArmazemIdempotencia(caminho, reserva=10), ArmazemIdempotencia(caminho, reserva=10)
+
+    assert morto.reservar("chave", "impressao", agora=100.0) == (NOVA, None)
+    assert vivo.reservar("chave", "impressao", agora=105.0) == (EM_ANDAMENTO, None)
+    assert vivo.reservar("chave", "impressao", agora=111.0) == (NOVA, None)
+
+
+def test_resposta_expirada_executa_de_novo(tmp_path):
+    armazem = ArmazemIdempotencia(str(tmp_path / "idempotencia.db"), ttl=60)
+    armazem.reservar("chave", "impressao", agora=0.0)
+    armazem.concluir("chave", (200, [], b"{}"))
+
+    assert armazem.reservar("chave", "impressao", agora=30.0)[0] == REPETIR
+    assert armazem.reservar("chave", "impressao", agora=61.0) == (NOVA, None)
+
+
+# ========= 5) Headers repetidos e cancelamento =========
+def test_set_cookie_repetido_sobrevive_a_repeticao():
+    from fastapi import FastAPI, Response
+    from fastapi.testclient import TestClient
+    from app.idempotencia import middleware_idempotencia
+
+    mini = FastAPI()
+    mini.middleware("http")(middleware_idempotencia)
+
+    @mini.post("/users")
+    def criar():
+        response = Response(content=b"{}", media_type="application/json", status_code=201)
+        response.set_cookie("sessao", "a")
+        response.set_cookie("preferencias", "b")
+        return response
+
+    with TestClient(mini) as cliente:
+        primeira = cliente.post("/users", json={}, headers={"Idempotency-Key": "cookies"})
+        repeticao = cliente.post("/users", json={}, headers={"Idempotency-Key": "cookies"})
+
+    for response in (primeira, repeticao):
+        assert len(response.headers.get_list("set-cookie")) == 2
+        assert response.headers["content-length"] == "2"
+    assert repeticao.headers["Idempotent-Replayed"] == "true"
+
+
+def test_requisicao_cancelada_libera_a_reserva():
+    from starlette.requests import Request
+    from app.idempotencia import middleware_idempotencia, obter_armazem_idempotencia
+
+    async def corpo():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    request = Request({
+        "type": "http", "method": "POST", "path": "/users", "query_string": b"", "client": ("1.2.3.4", 1),
+        "headers": [(b"idempotency-key", b"cancelada")],
+    }, corpo)
+
+    async def cancelada(request):
+        raise asyncio.CancelledError()
+
+    async def cenario():
+        try:
+            await middleware_idempotencia(request, cancelada)
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cenario())
+
+    # A reserva saiu: não há nada em andamento com esta chave
+    assert len(obter_armazem_idempotencia()) == 0
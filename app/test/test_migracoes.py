@@ -0,0 +1,71 @@
+# tests/test_migracoes.py
+from sqlalchemy import create_engine, inspect, text
+
+from app.models.database import Base
+from app.models.migracoes import atualizar_schema
+
+
+def _banco_antigo(tmp_path, ddl_status_step):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql('DROP TABLE "StatusStep"')
+        conexao.exec_driver_sql(ddl_status_step)
+        conexao.execute(text(
+            "INSERT INTO \"Usuario\" (id, nome, email, senha_hash, profissao, nivel_experience, tempo_estudo_semanal,"
+            " interesses, qualidades, atualizado_em) VALUES (1, 'Ana', 'ana@x.com', 'h', 'Dev', 'iniciante', 5, 'Dados',"
+            " '[]', '2024-01-01 00:00:00')"
+        ))
+        conexao.execute(text("INSERT INTO \"Steps\" (id, nome, descricao) VALUES (1, 'Passo', 'Descrição')"))
+    return engine
+
+
+# ========= 1) FK sem ON DELETE CASCADE é recriada e os dados ficam =========
+def test_foreign_key_ganha_cascade(tmp_path):
+    engine = _banco_antigo(tmp_path, """
+        CREATE TABLE "StatusStep" (
+            id INTEGER PRIMARY KEY, id_usuario INTEGER NOT NULL REFERENCES "Usuario" (id),
+            id_step INTEGER NOT NULL REFERENCES "Steps" (id), descricao VARCHAR(100) NOT NULL,
+            status VARCHAR(12) NOT NULL, data_conclusao DATE, atualizado_em DATETIME NOT NULL
+        )
+    """)
+    with engine.begin() as conexao:
+        conexao.execute(text(
+            "INSERT INTO \"StatusStep\" (id_usuario, id_step, descricao, status, atualizado_em)"
+            " VALUES (1, 1, 'Passo', 'CONCLUIDO', '2024-01-01 00:00:00')"
+        ))
+
+    assert atualizar_schema(engine, Base.metadata) == ["cascade_nas_foreign_keys: StatusStep"]
+    assert atualizar_schema(engine, Base.metadata) == []
+
+    fks = inspect(engine).get_foreign_keys("StatusStep")
+    assert any(fk["options"].get("ondelete") == "CASCADE" for fk in fks)
+    assert {i["name"] for i in inspect(engine).get_indexes("StatusStep")} >= {"ix_StatusStep_id_usuario"}
+
+    with engine.begin() as conexao:
+        assert conexao.execute(text('SELECT count(*) FROM "StatusStep"')).scalar() == 1
+        conexao.execute(text('DELETE FROM "Usuario" WHERE id = 1'))
+        assert conexao.execute(text('SELECT count(*) FROM "StatusStep"')).scalar() == 0
+
+
+# ========= 2) Tabelas de antes do export incremental ganham atualizado_em =========
+def test_coluna_atualizado_em_adicionada(tmp_path):
+    engine = _banco_antigo(tmp_path, """
+        CREATE TABLE "StatusStep" (
+            id INTEGER PRIMARY KEY, id_usuario INTEGER NOT NULL REFERENCES "Usuario" (id),
+            id_step INTEGER NOT NULL REFERENCES "Steps" (id), descricao VARCHAR(100) NOT NULL,
+            status VARCHAR(12) NOT NULL, data_conclusao DATE
+        )
+    """)
+    with engine.begin() as conexao:
+        conexao.execute(text(
+            "INSERT INTO \"StatusStep\" (id_usuario, id_step, descricao, status) VALUES (1, 1, 'Passo', 'CONCLUIDO')"
+        ))
+
+    assert atualizar_schema(engine, Base.metadata) == [
+        "colunas_atualizado_em: StatusStep", "cascade_nas_foreign_keys: StatusStep"
+    ]
+
+    assert "ix_StatusStep_atualizado_em" in {i["name"] for i in inspect(engine).get_indexes("StatusStep")}
+    with engine.begin() as conexao:
+        assert conexao.execute(text('SELECT atualizado_em FROM "StatusStep"')).scalar() is not None
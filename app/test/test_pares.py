@@ -0,0 +1,119 @@
+# tests/test_pares.py
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import pares
+from app.services.pares import (
+    IndiceEmConstrucao, IndicePares, configurar_indice_pares, indexar_em_background, indexar_usuarios, obter_indice_pares
+)
+
+
+@pytest.fixture
+def indice(tmp_path):
+    anterior = obter_indice_pares()
+    novo = IndicePares(str(tmp_path / "pares.npy"), dimensoes=64, bloco=2)
+    configurar_indice_pares(novo)
+    yield novo
+    configurar_indice_pares(anterior)
+
+
+def _criar(client, email, profissao, interesses, qualidades, horas):
+    resposta = client.post("/users", json={
+        "name": "Usuário Pares", "email": email, "currentProfession": profissao, "experienceLevel": "iniciante",
+        "weeklyStudyTime": horas, "interests": interesses, "qualities": qualidades,
+    })
+    return resposta.json()["id"]
+
+
+def _perfil(user_id, profissao):
+    return SimpleNamespace(id=user_id, profissao=profissao, interesses="Python", qualidades="[]",
+                           tempo_estudo_semanal=5)
+
+
+# ========= 1) Top-k por similaridade de perfil =========
+def test_pares_mais_parecidos_primeiro(client, mock_usuarios, indice, db_session):
+    pytest.importorskip("numpy")
+    base = _criar(client, "base@pares.com", "Analista de Dados", "Python, SQL, Estatística", ["Curioso"], 6)
+    parecido = _criar(client, "parecido@pares.com", "Cientista de Dados", "Python, SQL", ["Curioso"], 5)
+    diferente = _criar(client, "diferente@pares.com", "Cozinheiro", "Gastronomia", ["Paciente"], 20)
+    indexar_usuarios(db_session, indice)
+
+    resposta = client.get(f"/users/{base}/peers?k=3")
+
+    assert resposta.status_code == 200
+    peers = resposta.json()["peers"]
+    assert peers[0]["id"] == parecido
+    assert base not in [p["id"] for p in peers]
+    assert all(a["similarity"] >= b["similarity"] for a, b in zip(peers, peers[1:]))
+    assert diferente not in [p["id"] for p in peers[:1]]
+
+
+# ========= 2) Atualização incremental depois do build =========
+def test_novo_usuario_entra_no_indice_sem_rebuild(client, mock_usuarios, indice, db_session):
+    pytest.importorskip("numpy")
+    base = _criar(client, "base2@pares.com", "Designer", "UX, Figma", ["Criativo"], 4)
+    indexar_usuarios(db_session, indice)
+    assert indice.existe()
+
+    novo = _criar(client, "novo2@pares.com", "Designer", "UX, Figma", ["Criativo"], 4)
+    assert indice.indexado(novo)
+    assert client.get(f"/users/{base}/peers?k=1").json()["peers"][0]["id"] == novo
+
+    client.delete(f"/users/{novo}")
+    assert not indice.indexado(novo)
+
+
+# ========= 3) Sem numpy o endpoint responde 503 =========
+def test_pares_sem_numpy(client, mock_usuarios, indice, monkeypatch):
+    def sem_numpy():
+        raise ImportError("Busca de pares requer o pacote numpy instalado")
+
+    monkeypatch.setattr(pares, "_numpy", sem_numpy)
+    resposta = client.get(f"/users/{mock_usuarios[0].id}/peers")
+
+    assert resposta.status_code == 503
+    assert client.get(f"/users/{mock_usuarios[0].id}/peers?k=0").status_code == 422
+
+
+# ========= 4) Build concorrente e escritas durante o build =========
+def test_segundo_build_simultaneo_responde_503(client, mock_usuarios, indice):
+    with indice._trava_build():
+        with pytest.raises(IndiceEmConstrucao):
+            indice.construir([], 0)
+        resposta = client.get(f"/users/{mock_usuarios[0].id}/peers")
+
+    assert resposta.status_code == 503
+    assert "Retry-After" in resposta.headers
+    assert not indice.existe()
+
+
+def test_alteracoes_durante_o_build_sao_reaplicadas(indice):
+    pytest.importorskip("numpy")
+    perfis = [_perfil(1, "Analista"), _perfil(2, "Designer"), _perfil(3, "Cozinheiro")]
+    # Durante o build o usuário 2 foi removido e o 4 foi criado
+    criado = _perfil(4, "Analista")
+
+    indice.construir([perfis], 3, lambda desde: ([criado], {1, 3, 4}))
+
+    assert [indice.indexado(user_id) for user_id in (1, 2, 3, 4)] == [True, False, True, True]
+    assert [f for f in os.listdir(os.path.dirname(indice.caminho)) if f.endswith(".tmp")] == []
+
+
+
+# ========= 5) A requisição nunca constrói o índice =========
+def test_sem_indice_responde_503_ate_o_build_em_background(client, mock_usuarios, indice):
+    pytest.importorskip("numpy")
+    from app.test.conftest import TestingSessionLocal
+
+    resposta = client.get(f"/users/{mock_usuarios[0].id}/peers")
+    assert resposta.status_code == 503
+    assert "Retry-After" in resposta.headers
+    assert not indice.existe()
+
+    indexar_em_background(TestingSessionLocal, indice).join(timeout=10)
+
+    assert client.get(f"/users/{mock_usuarios[0].id}/peers").status_code == 200
+    # Com o índice pronto, o start não dispara outro build
+    assert indexar_em_background(TestingSessionLocal, indice) is None
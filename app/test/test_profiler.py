@@ -0,0 +1,80 @@
+# tests/test_profiler.py
+import time
+
+from app import profiler
+from app.login import create_access_token
+from app.services import service
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+ALUNO_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'aluno@fiap.com', 'role': 'user'})}"}
+
+
+def _roadmap_lento(monkeypatch):
+    original = service.gerar_roadmap_ai
+
+    def gerar_roadmap_lento(usuario):
+        time.sleep(0.1)
+        return original(usuario)
+
+    monkeypatch.setattr(service, "gerar_roadmap_ai", gerar_roadmap_lento)
+
+
+# ========= 1) Profiling sob demanda =========
+def test_profile_sob_demanda_gera_collapsed_stacks(client, mock_usuarios, monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler.obter_profiler(), "diretorio", str(tmp_path))
+    _roadmap_lento(monkeypatch)
+
+    response = client.get(f"/roadmap?user_id={mock_usuarios[0].id}&profile=1", headers=ADMIN_HEADERS)
+
+    assert response.status_code == 200
+    perfil_id = response.headers["X-Profile-Id"]
+    perfil = client.get(f"/admin/profiles/{perfil_id}", headers=ADMIN_HEADERS)
+    assert perfil.status_code == 200
+    linhas = perfil.text.splitlines()
+    assert linhas
+    # Linhas "raiz;...;folha contagem", com a função lenta na thread do bulkhead
+    assert all(linha.rsplit(" ", 1)[1].isdigit() for linha in linhas)
+    assert any("chamar_ia_roadmap" in linha and "gerar_roadmap_lento" in linha for linha in linhas)
+    assert client.get("/admin/profiles", headers=ADMIN_HEADERS).json() == {"profiles": [perfil_id]}
+
+
+def test_profile_exige_admin(client, mock_usuarios):
+    response = client.get(f"/users/{mock_usuarios[0].id}", headers={**ALUNO_HEADERS, "X-Profile": "1"})
+
+    assert response.status_code == 403
+    assert client.get(f"/users/{mock_usuarios[0].id}", headers={"X-Profile": "1"}).status_code == 401
+
+
+# ========= 2) Modo automático por limiar de latência =========
+def test_modo_automatico_so_guarda_requisicoes_lentas(client, mock_usuarios, monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler.obter_profiler(), "diretorio", str(tmp_path))
+    monkeypatch.setattr(profiler, "PROFILER_AUTO_LIMIAR_MS", 20)
+    monkeypatch.setattr(profiler, "PROFILER_AUTO_FRACAO", 1.0)
+
+    rapida = client.get("/")
+    assert "X-Profile-Id" not in rapida.headers
+    assert profiler.obter_profiler().listar() == []
+
+    _roadmap_lento(monkeypatch)
+    client.get(f"/roadmap?user_id={mock_usuarios[0].id}")
+
+    perfis = profiler.obter_profiler().listar()
+    assert len(perfis) == 1
+    assert "gerar_roadmap_lento" in profiler.obter_profiler().ler(perfis[0])
+
+
+# ========= 3) Id próprio por perfil e retenção no diretório =========
+def test_perfis_do_mesmo_trace_nao_se_sobrescrevem(client, mock_usuarios, monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler.obter_profiler(), "diretorio", str(tmp_path))
+    monkeypatch.setattr(profiler.obter_profiler(), "max_arquivos", 2)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    headers = {**ADMIN_HEADERS, "X-Profile": "1", "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+
+    respostas = [client.get(f"/users/{mock_usuarios[0].id}", headers=headers) for _ in range(3)]
+
+    ids = [r.headers["X-Profile-Id"] for r in respostas]
+    assert len(set(ids)) == 3
+    assert all(r.headers["X-Profile-Trace-Id"] == trace_id for r in respostas)
+    # Só os dois mais recentes ficam
+    assert set(profiler.obter_profiler().listar()) <= set(ids) and len(profiler.obter_profiler().listar()) == 2
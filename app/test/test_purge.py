@@ -0,0 +1,43 @@
+# tests/test_purge.py
+from app.login import create_access_token
+from app.models.database import StatusStep, Usuario
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+
+
+def test_purge_por_filtro(client, mock_usuarios, db_session):
+    joao, maria = mock_usuarios
+    for step_id in (1, 2):
+        client.put(f"/roadmap/steps/{step_id}/toggle?user_id={joao.id}", json={"status": "concluido"})
+    client.put(f"/roadmap/steps/1/toggle?user_id={maria.id}", json={"status": "concluido"})
+
+    response = client.post(
+        "/admin/users/purge",
+        json={"currentProfession": "Operador de Caixa", "batchSize": 1},
+        headers=ADMIN_HEADERS,
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["usersDeleted"] == 1
+    assert data["statusRowsDeleted"] == 2
+    assert db_session.query(Usuario).filter(Usuario.id == joao.id).count() == 0
+    assert db_session.query(StatusStep).filter(StatusStep.id_usuario == maria.id).count() == 1
+
+
+def test_purge_exige_criterio(client):
+    response = client.post("/admin/users/purge", json={}, headers=ADMIN_HEADERS)
+
+    assert response.status_code == 400
+
+
+def test_purge_por_dominio_trata_curingas_como_literais(client, mock_usuarios, db_session):
+    for dominio in ("%", "exampl_.com"):
+        response = client.post("/admin/users/purge", json={"emailDomain": dominio}, headers=ADMIN_HEADERS)
+        assert response.json()["usersDeleted"] == 0
+
+    response = client.post("/admin/users/purge", json={"emailDomain": "Example.com"}, headers=ADMIN_HEADERS)
+
+    assert response.json()["usersDeleted"] == 2
+    assert db_session.query(Usuario).count() == 0
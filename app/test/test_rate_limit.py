@@ -0,0 +1,49 @@
+# tests/test_rate_limit.py
+import pytest
+
+from app import rate_limit
+from app.rate_limit import ArmazemTokens
+
+
+@pytest.fixture
+def limites(monkeypatch, tmp_path):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ATIVO", True)
+    monkeypatch.setattr(rate_limit, "_armazem", ArmazemTokens(str(tmp_path / "rate_limit.db")))
+    monkeypatch.setitem(rate_limit.ORCAMENTOS, "roadmap", {"usuario": (2, 2 / 60), "cliente": (100, 1)})
+    monkeypatch.setitem(rate_limit.ORCAMENTOS, "leitura", {"usuario": (5, 5 / 60), "cliente": (100, 1)})
+
+
+# ========= 1) Token bucket =========
+def test_balde_repoe_tokens_com_o_tempo(tmp_path):
+    armazem = ArmazemTokens(str(tmp_path / "baldes.db"))
+    balde = [("roadmap:usuario:1", 2, 1.0)]
+
+    assert armazem.consumir(balde, agora=100.0) == 0
+    assert armazem.consumir(balde, agora=100.0) == 0
+    assert armazem.consumir(balde, agora=100.0) == pytest.approx(1.0)
+    assert armazem.consumir(balde, agora=101.0) == 0
+
+
+def test_baldes_sao_compartilhados_entre_conexoes(tmp_path):
+    # Dois armazéns no mesmo arquivo fazem o papel de dois workers
+    caminho = str(tmp_path / "baldes.db")
+    worker_a, worker_b = ArmazemTokens(caminho), ArmazemTokens(caminho)
+    balde = [("leitura:cliente:1.2.3.4", 1, 0.5)]
+
+    assert worker_a.consumir(balde, agora=10.0) == 0
+    assert worker_b.consumir(balde, agora=10.0) == pytest.approx(2.0)
+
+
+# ========= 2) Orçamentos por endpoint =========
+def test_roadmap_responde_429_com_retry_after(client, mock_usuarios, limites):
+    usuario, outro = mock_usuarios[0], mock_usuarios[1]
+
+    assert client.get(f"/roadmap?user_id={usuario.id}").status_code == 200
+    assert client.get(f"/roadmap?user_id={usuario.id}").status_code == 200
+    bloqueado = client.get(f"/roadmap?user_id={usuario.id}")
+
+    assert bloqueado.status_code == 429
+    assert 0 < int(bloqueado.headers["Retry-After"]) <= 30
+    # Orçamento por usuário: os outros usuários e as leituras baratas seguem liberados
+    assert client.get(f"/roadmap?user_id={outro.id}").status_code == 200
+    assert client.get(f"/users/{usuario.id}").status_code == 200
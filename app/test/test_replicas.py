@@ -0,0 +1,162 @@
+# tests/test_replicas.py
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.models import database, replicas
+from app.models.database import Base, Usuario, criar_steps_padrao, get_db, get_db_leitura
+from app.models.replicas import ConjuntoReplicas, SincronizadorReplicas
+from app.models.sharding import SessaoRoteada
+from app.services import service
+from app.services.cache import obter_cache_perfis
+
+
+def _novo_usuario(email):
+    return {
+        "nome": "Usuário Réplica", "email": email, "senha_hash": "x", "profissao": "Analista",
+        "nivel_experience": "iniciante", "tempo_estudo_semanal": 4, "interesses": "Dados", "qualidades": "[]",
+    }
+
+
+@pytest.fixture
+def primario_e_replica(monkeypatch, tmp_path):
+    url_primario = f"sqlite:///{tmp_path / 'primario.db'}"
+    url_replica = f"sqlite:///{tmp_path / 'replica.db'}"
+    primario = create_engine(url_primario, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=primario)
+    fabrica = sessionmaker(class_=SessaoRoteada, autocommit=False, autoflush=False, bind=primario)
+    db = fabrica()
+    criar_steps_padrao(db)
+    db.close()
+
+    conjunto = ConjuntoReplicas([url_replica], janela=60, connect_args={"check_same_thread": False})
+    sincronizador = SincronizadorReplicas(url_primario, [url_replica], intervalo=3600)
+    sincronizador.sincronizar()
+
+    monkeypatch.setattr(replicas, "_replicas", conjunto)
+    monkeypatch.setattr(database, "SessionLocal", fabrica)
+    # Usa as dependências reais (primário/réplica), não o override do banco de teste
+    monkeypatch.delitem(app.dependency_overrides, get_db)
+    monkeypatch.delitem(app.dependency_overrides, get_db_leitura)
+    obter_cache_perfis().limpar()
+    yield primario, conjunto, sincronizador
+    obter_cache_perfis().limpar()
+
+
+# ========= 1) Sessão de leitura: SELECT na réplica, escrita no primário =========
+def test_sessao_le_da_replica_ate_a_primeira_escrita(primario_e_replica):
+    primario, conjunto, sincronizador = primario_e_replica
+    with primario.begin() as conexao:
+        conexao.execute(insert(Usuario).values(**_novo_usuario("antes@replica.com")))
+
+    db = database.SessionLocal(replica=conjunto.proxima())
+    try:
+        # Réplica ainda não sincronizada: o usuário recém-criado não aparece
+        assert db.execute(select(Usuario.email)).scalars().all() == []
+
+        db.add(Usuario(**_novo_usuario("depois@replica.com")))
+        db.commit()
+
+        # Depois da escrita a sessão fica no primário e enxerga as duas linhas
+        assert db.replica is None
+        assert len(db.execute(select(Usuario.email)).scalars().all()) == 2
+    finally:
+        db.close()
+
+    sincronizador.sincronizar()
+    db = database.SessionLocal(replica=conjunto.proxima())
+    try:
+        assert len(db.execute(select(Usuario.email)).scalars().all()) == 2
+    finally:
+        db.close()
+
+
+# ========= 2) Read-your-writes: quem escreveu lê do primário durante a janela =========
+def test_leitura_apos_escrita_do_proprio_usuario(client, primario_e_replica):
+    primario, conjunto, sincronizador = primario_e_replica
+
+    resposta = client.post("/users", json={
+        "name": "Usuário Réplica", "email": "novo@replica.com", "currentProfession": "Analista",
+        "experienceLevel": "iniciante", "weeklyStudyTime": 4, "interests": "Dados", "qualities": [],
+    })
+    user_id = resposta.json()["id"]
+    assert conjunto.preso_ao_primario(user_id)
+    assert client.get(f"/users/{user_id}").status_code == 200
+
+    # Terminada a janela, a leitura volta para a réplica, que ainda não tem o usuário
+    conjunto.janela = 0
+    conjunto.marcar_escrita([user_id], propagar=False)
+    assert not conjunto.preso_ao_primario(user_id)
+    # O cache de perfis fica na frente do banco; limpa para a leitura chegar à réplica
+    obter_cache_perfis().limpar()
+    assert client.get(f"/users/{user_id}").status_code == 404
+
+    sincronizador.sincronizar()
+    assert client.get(f"/users/{user_id}").status_code == 200
+
+
+# ========= 3) GET /roadmap decide pelo primário, não pela réplica atrasada =========
+def test_roadmap_salvo_nao_e_gerado_de_novo_com_replica_atrasada(client, primario_e_replica, monkeypatch):
+    primario, conjunto, sincronizador = primario_e_replica
+    with primario.begin() as conexao:
+        conexao.execute(insert(Usuario).values(**_novo_usuario("roadmap@replica.com")))
+    sincronizador.sincronizar()
+    user_id = 1
+
+    geracoes = []
+    original = service.gerar_roadmap_ai
+    monkeypatch.setattr(service, "gerar_roadmap_ai", lambda usuario: geracoes.append(usuario.id) or original(usuario))
+
+    primeira = client.get(f"/roadmap?user_id={user_id}")
+    # A réplica não tem o roadmap salvo agora e o usuário não está mais preso ao primário
+    conjunto.janela = 0
+    conjunto.marcar_escrita([user_id], propagar=False)
+    segunda = client.get(f"/roadmap?user_id={user_id}")
+
+    assert primeira.status_code == segunda.status_code == 200
+    assert geracoes == [user_id]
+    assert segunda.json() == primeira.json()
+
+
+# ========= 4) Um só worker sincroniza as réplicas =========
+def test_sincronizacao_em_um_worker_por_vez(primario_e_replica, tmp_path):
+    url_primario = f"sqlite:///{tmp_path / 'primario.db'}"
+    url_replica = f"sqlite:///{tmp_path / 'replica.db'}"
+    worker_a = SincronizadorReplicas(url_primario, [url_replica], intervalo=3600)
+    worker_b = SincronizadorReplicas(url_primario, [url_replica], intervalo=3600)
+
+    assert worker_a.sincronizar_se_dono()
+    assert not worker_b.sincronizar_se_dono()
+
+    # O dono saiu (reciclado): o próximo a tentar assume
+    worker_a.parar()
+    assert worker_b.sincronizar_se_dono()
+    worker_b.parar()
+
+
+# ========= 5) Perfil lido da réplica não entra no cache =========
+def test_perfil_da_replica_nao_vai_para_o_cache(client, primario_e_replica):
+    primario, conjunto, sincronizador = primario_e_replica
+    with primario.begin() as conexao:
+        conexao.execute(insert(Usuario).values(**_novo_usuario("cache@replica.com")))
+    sincronizador.sincronizar()
+    user_id = 1
+
+    # Fora da janela de read-your-writes: a leitura vai à réplica e não é guardada
+    assert client.get(f"/users/{user_id}").status_code == 200
+    assert obter_cache_perfis().estatisticas()["entradas"] == 0
+
+    # Preso ao primário, o perfil lido vai para o cache
+    conjunto.marcar_escrita([user_id], propagar=False)
+    assert client.get(f"/users/{user_id}").status_code == 200
+    assert obter_cache_perfis().estatisticas()["entradas"] == 1
+
+
+# ========= 6) Cópia periódica mais lenta que a janela de read-your-writes =========
+def test_intervalo_de_sincronizacao_menor_que_a_janela():
+    replicas.verificar_janela_replicas(intervalo=2, janela=5)
+    replicas.verificar_janela_replicas(intervalo=0, janela=5)
+
+    with pytest.raises(RuntimeError, match="DATABASE_REPLICA_SYNC_SEGUNDOS"):
+        replicas.verificar_janela_replicas(intervalo=5, janela=5)
@@ -0,0 +1,220 @@
+# tests/test_roadmap.py
+import json
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.services import ai_roadmap
+
+
+def _steps(ordens, prefixo, based_on):
+    return [
+        {
+            "id": str(o),
+            "title": f"{prefixo} {o}",
+            "description": f"Descrição {prefixo} {o}",
+            "order": o,
+            "basedOn": based_on(o),
+        }
+        for o in ordens
+    ]
+
+
+# ========= 1) GET gera e reaproveita o roadmap salvo =========
+def test_roadmap_salvo_nao_e_regerado(client, mock_usuarios, monkeypatch):
+    usuario = mock_usuarios[0]
+    chamadas = []
+    monkeypatch.setattr(ai_roadmap, "_gerar_roadmap_mock", lambda u: chamadas.append(u) or _steps(
+        range(1, 8), "Mock", lambda o: ["profissao"]
+    ))
+
+    primeira = client.get(f"/roadmap?user_id={usuario.id}")
+    segunda = client.get(f"/roadmap?user_id={usuario.id}")
+
+    assert primeira.status_code == 200
+    assert len(primeira.json()["roadmapSteps"]) == 7
+    assert segunda.json() == primeira.json()
+    assert len(chamadas) == 1
+
+
+# ========= 2) Alteração de perfil reescreve só os passos afetados =========
+def test_regeneracao_incremental_apos_update(client, mock_usuarios, monkeypatch):
+    usuario = mock_usuarios[1]
+    monkeypatch.setenv("GROQ_API_KEY", "chave-teste")
+    chamadas = []
+
+    def fake_chamar_groq(api_key, messages, max_tokens):
+        chamadas.append(messages)
+        if len(chamadas) == 1:
+            steps = _steps(range(1, 8), "Original", lambda o: ["qualidades"] if o <= 3 else ["profissao"])
+        else:
+            steps = _steps([1, 2, 3], "Novo", lambda o: ["qualidades"])
+        return json.dumps({"steps": steps})
+
+    monkeypatch.setattr(ai_roadmap, "_chamar_groq", fake_chamar_groq)
+
+    client.get(f"/roadmap?user_id={usuario.id}")
+    for step_id in (1, 5):
+        client.put(f"/roadmap/steps/{step_id}/toggle?user_id={usuario.id}", json={"status": "concluido"})
+
+    response_update = client.put(f"/users/{usuario.id}", json={"qualities": ["Organizada", "Paciente"]})
+    assert response_update.status_code == 200
+
+    steps = client.get(f"/roadmap?user_id={usuario.id}").json()["roadmapSteps"]
+
+    assert len(chamadas) == 2
+    assert "1, 2, 3" in chamadas[1][-1]["content"]
+    assert [s["title"] for s in steps] == [f"Novo {o}" for o in (1, 2, 3)] + [f"Original {o}" for o in (4, 5, 6, 7)]
+    assert [s["id"] for s in steps] == [str(o) for o in range(1, 8)]
+    # Passo substituído volta a pendente; os mantidos preservam o status
+    assert steps[0]["completed"] is False
+    assert steps[4]["completed"] is True
+
+
+# ========= 3) Toggle mantém o resumo de progresso =========
+def test_toggle_atualiza_bitmap_de_progresso(client, mock_usuarios, db_session):
+    from app.models.database import ProgressoRoadmap
+
+    usuario = mock_usuarios[0]
+    client.put(f"/roadmap/steps/3/toggle?user_id={usuario.id}", json={"status": "em_andamento"})
+    client.put(f"/roadmap/steps/2/toggle?user_id={usuario.id}", json={"status": "concluido"})
+    client.put(f"/roadmap/steps/4/toggle?user_id={usuario.id}", json={"status": "concluido"})
+    client.put(f"/roadmap/steps/4/toggle?user_id={usuario.id}", json={"status": "em_andamento"})
+
+    progresso = db_session.get(ProgressoRoadmap, usuario.id)
+    assert progresso.concluidos == 0b10
+    assert json.loads(progresso.em_andamento) == [3, 4]
+
+    steps = client.get(f"/roadmap?user_id={usuario.id}").json()["roadmapSteps"]
+    assert [s["completed"] for s in steps] == [False, True, False, False, False, False, False]
+
+
+def test_toggle_rejeita_passo_inexistente(client, mock_usuarios):
+    usuario = mock_usuarios[0]
+
+    response = client.put(f"/roadmap/steps/99/toggle?user_id={usuario.id}", json={"status": "concluido"})
+
+    assert response.status_code == 400
+
+
+# ========= 4) Falha da IA na regeneração não marca o perfil como atualizado =========
+def test_regeneracao_com_falha_tenta_de_novo(client, mock_usuarios, monkeypatch):
+    usuario = mock_usuarios[0]
+    monkeypatch.setenv("GROQ_API_KEY", "chave-teste")
+    chamadas = []
+
+    def fake_chamar_groq(api_key, messages, max_tokens):
+        chamadas.append(messages)
+        if len(chamadas) == 1:
+            return json.dumps({"steps": _steps(range(1, 8), "Original", lambda o: ["profissao"])})
+        if len(chamadas) == 2:
+            raise RuntimeError("Groq indisponível")
+        return json.dumps({"steps": _steps(range(1, 8), "Novo", lambda o: ["profissao"])})
+
+    monkeypatch.setattr(ai_roadmap, "_chamar_groq", fake_chamar_groq)
+
+    client.get(f"/roadmap?user_id={usuario.id}")
+    client.put(f"/users/{usuario.id}", json={"currentProfession": "Cientista de Dados"})
+
+    com_falha = client.get(f"/roadmap?user_id={usuario.id}").json()["roadmapSteps"]
+    assert [s["title"] for s in com_falha] == [f"Original {o}" for o in range(1, 8)]
+
+    regenerado = client.get(f"/roadmap?user_id={usuario.id}").json()["roadmapSteps"]
+    assert [s["title"] for s in regenerado] == [f"Novo {o}" for o in range(1, 8)]
+
+    client.get(f"/roadmap?user_id={usuario.id}")
+    assert len(chamadas) == 3
+
+
+# ========= 5) Resumo de progresso criado por outra requisição no meio do caminho =========
+def test_resumo_criado_em_paralelo_nao_quebra_toggle(client, mock_usuarios, db_session, monkeypatch):
+    from app.models.database import ProgressoRoadmap
+    from app.services.service import Service
+    from app.test.conftest import TestingSessionLocal
+
+    usuario = mock_usuarios[0]
+    client.get(f"/roadmap?user_id={usuario.id}")
+    # Leitura não cria o resumo
+    assert db_session.get(ProgressoRoadmap, usuario.id) is None
+
+    montar = Service._obter_progressos
+
+    def com_concorrente(ids, db):
+        montados = montar(ids, db)
+        outra = TestingSessionLocal()
+        outra.add(ProgressoRoadmap(id_usuario=usuario.id, concluidos=0b100, em_andamento="[]"))
+        outra.commit()
+        outra.close()
+        return montados
+
+    monkeypatch.setattr(Service, "_obter_progressos", staticmethod(com_concorrente))
+    response = client.put(f"/roadmap/steps/1/toggle?user_id={usuario.id}", json={"status": "concluido"})
+    monkeypatch.undo()
+
+    assert response.status_code == 200
+    db_session.expire_all()
+    assert db_session.get(ProgressoRoadmap, usuario.id).concluidos == 0b101
+
+
+# ========= 6) Toggles simultâneos de passos diferentes não se sobrescrevem =========
+def test_toggles_concorrentes_mantem_os_dois_passos(tmp_path, monkeypatch):
+    from app.models.database import Base, ProgressoRoadmap, StatusStepEnum, Usuario, criar_steps_padrao
+    from app.models.sharding import SessaoRoteada
+    from app.services import service
+    from app.services.service import Service
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'toggles.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    fabrica = sessionmaker(class_=SessaoRoteada, autocommit=False, autoflush=False, bind=engine)
+    db = fabrica()
+    criar_steps_padrao(db)
+    usuario = Usuario(nome="Concorrente", email="conc@toggle.com", senha_hash="x", profissao="Dev",
+                      nivel_experience="iniciante", tempo_estudo_semanal=5, interesses="APIs", qualidades="[]")
+    db.add(usuario)
+    db.flush()
+    db.add(ProgressoRoadmap(id_usuario=usuario.id, concluidos=0, em_andamento="[]"))
+    db.commit()
+    user_id = usuario.id
+    db.close()
+
+    # Sem trava, os dois leriam o resumo antigo aqui e o último commit apagaria o passo do outro
+    barreira = threading.Barrier(2)
+    original = service.registrar_transicao
+
+    def registrar_juntos(*args):
+        try:
+            barreira.wait(timeout=0.5)
+        except threading.BrokenBarrierError:
+            pass
+        return original(*args)
+
+    monkeypatch.setattr(service, "registrar_transicao", registrar_juntos)
+    erros = []
+
+    def alternar(step_id, status):
+        sessao = fabrica()
+        try:
+            Service._aplicar_toggle(sessao.get(Usuario, user_id), step_id, status, sessao)
+            sessao.commit()
+        except Exception as erro:
+            erros.append(erro)
+        finally:
+            sessao.close()
+
+    def em_paralelo(*toggles):
+        threads = [threading.Thread(target=alternar, args=toggle) for toggle in toggles]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Cada par disputa a mesma coluna do resumo: o bitmap e depois a lista em andamento
+    em_paralelo((1, StatusStepEnum.CONCLUIDO), (2, StatusStepEnum.CONCLUIDO))
+    em_paralelo((3, StatusStepEnum.EM_ANDAMENTO), (4, StatusStepEnum.EM_ANDAMENTO))
+
+    assert erros == []
+    db = fabrica()
+    progresso = db.get(ProgressoRoadmap, user_id)
+    assert (progresso.concluidos, progresso.em_andamento) == (0b11, "[3, 4]")
+    db.close()
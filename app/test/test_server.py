@@ -0,0 +1,64 @@
+# tests/test_server.py
+import importlib
+
+import pytest
+
+from app import gunicorn_conf
+from app.services import write_behind
+
+
+# ========= 1) Autenticação montada em /auth no app principal =========
+def test_login_montado_no_app_principal(client):
+    resposta = client.post("/auth/", json={"email": "aluno@fiap.com", "password": "123456"})
+
+    assert resposta.status_code == 200
+    token = resposta.json()["access_token"]
+
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert me.status_code == 200
+    assert me.json()["email"] == "aluno@fiap.com"
+
+    # O token emitido em /auth vale nas rotas administrativas do app principal
+    assert client.get("/admin/cache", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+
+# ========= 2) Configuração do gunicorn =========
+def test_configuracao_gunicorn(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    monkeypatch.setenv("WEB_KEEPALIVE", "90")
+    conf = importlib.reload(gunicorn_conf)
+    try:
+        assert conf.workers == 3
+        assert conf.keepalive == 90
+        assert conf.preload_app is True
+        assert conf.worker_class == "uvicorn.workers.UvicornWorker"
+        # Hook do fork: troca os pools herdados do master sem fechar as conexões dele
+        conf.post_fork(None, None)
+    finally:
+        monkeypatch.delenv("WEB_CONCURRENCY")
+        monkeypatch.delenv("WEB_KEEPALIVE")
+        importlib.reload(gunicorn_conf)
+
+    assert gunicorn_conf.workers >= 1
+
+
+# ========= 3) Configurações que exigem um worker só =========
+def test_write_behind_com_varios_workers_nao_inicia(monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_ATIVO", True)
+    monkeypatch.setenv("PUBSUB_URL", "redis://localhost:6379/0")
+
+    with pytest.raises(SystemExit, match="WEB_CONCURRENCY=1"):
+        gunicorn_conf.verificar_workers(2)
+    gunicorn_conf.verificar_workers(1)
+
+
+def test_pubsub_em_memoria_com_varios_workers_nao_inicia(monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_ATIVO", False)
+    monkeypatch.delenv("PUBSUB_URL", raising=False)
+
+    with pytest.raises(SystemExit, match="PUBSUB_URL"):
+        gunicorn_conf.verificar_workers(4)
+    gunicorn_conf.verificar_workers(1)
+
+    monkeypatch.setenv("PUBSUB_URL", "redis://localhost:6379/0")
+    gunicorn_conf.verificar_workers(4)
@@ -0,0 +1,151 @@
+# tests/test_sharding.py
+import pytest
+from sqlalchemy import select
+
+from app.login import create_access_token
+from app.main import app
+from app.models import sharding
+from app.models.database import SessionLocal, StatusStep, Usuario, create_tables, criar_steps_padrao, get_db, get_db_leitura
+from app.models.sharding import RoteadorShards
+from app.services.cache import obter_cache_perfis
+from app.services import rebalanceamento
+from app.services.rebalanceamento import planejar, rebalancear
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+
+
+def _roteador(tmp_path, total):
+    urls = [f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(total)]
+    return RoteadorShards(urls, f"sqlite:///{tmp_path / 'diretorio.db'}", connect_args={"check_same_thread": False})
+
+
+def _ativar(monkeypatch, roteador):
+    monkeypatch.setattr(sharding, "_roteador", roteador)
+    create_tables()
+    db = SessionLocal()
+    try:
+        criar_steps_padrao(db)
+    finally:
+        db.close()
+
+
+def _ids_no_shard(roteador, shard, modelo=Usuario, coluna=None):
+    with roteador.engines[shard].connect() as conexao:
+        return sorted(conexao.execute(select(coluna or modelo.id)).scalars())
+
+
+def _criar(client, email):
+    return client.post("/users", json={
+        "name": "Usuário Shard", "email": email, "currentProfession": "Analista",
+        "experienceLevel": "iniciante", "weeklyStudyTime": 4, "interests": "Dados", "qualities": [],
+    })
+
+
+@pytest.fixture
+def shards(monkeypatch, tmp_path, client):
+    # Usa o get_db real (roteado), não o override do banco de teste
+    monkeypatch.delitem(app.dependency_overrides, get_db)
+    monkeypatch.delitem(app.dependency_overrides, get_db_leitura)
+    obter_cache_perfis().limpar()
+    roteador = _roteador(tmp_path, 2)
+    _ativar(monkeypatch, roteador)
+    for i in range(1, 5):
+        assert _criar(client, f"u{i}@shard.com").json()["id"] == i
+    yield roteador
+    obter_cache_perfis().limpar()
+
+
+# ========= 1) Roteamento e co-localização =========
+def test_usuario_e_progresso_ficam_no_mesmo_shard(client, shards):
+    assert _ids_no_shard(shards, 0) == [2, 4]
+    assert _ids_no_shard(shards, 1) == [1, 3]
+
+    # Email único globalmente, mesmo que o novo id caísse em outro shard
+    assert _criar(client, "u1@shard.com").status_code == 400
+
+    client.get("/roadmap?user_id=3")
+    client.put("/roadmap/steps/2/toggle?user_id=3", json={"status": "concluido"})
+
+    assert _ids_no_shard(shards, 1, coluna=StatusStep.id_usuario) == [3]
+    assert _ids_no_shard(shards, 0, coluna=StatusStep.id_usuario) == []
+    assert client.get("/users/3").json()["email"] == "u3@shard.com"
+
+
+# ========= 2) Operações administrativas percorrem todos os shards =========
+def test_analytics_export_e_purge_cobrem_todos_os_shards(client, shards):
+    for user_id in (1, 2):
+        client.put(f"/roadmap/steps/1/toggle?user_id={user_id}", json={"status": "concluido"})
+
+    analytics = client.get("/admin/analytics", headers=ADMIN_HEADERS).json()
+    assert [(linha["stepId"], linha["completed"]) for linha in analytics["byStep"]] == [(1, 2)]
+
+    export = client.get("/export/users", headers=ADMIN_HEADERS)
+    assert len(export.text.splitlines()) == 4
+
+    purge = client.post("/admin/users/purge", json={"emailDomain": "shard.com"}, headers=ADMIN_HEADERS)
+    assert purge.json()["usersDeleted"] == 4
+    assert shards.usuarios_por_shard() == {}
+
+
+# ========= 3) Rebalanceamento ao adicionar um shard =========
+def test_rebalanceamento_move_usuarios_com_os_dados(client, shards, monkeypatch, tmp_path):
+    client.put("/roadmap/steps/3/toggle?user_id=2", json={"status": "em_andamento"})
+
+    tres = _roteador(tmp_path, 3)
+    _ativar(monkeypatch, tres)
+    assert planejar(tres) == {2: 2, 3: 0, 4: 1}
+
+    assert rebalancear(tres, espera=0) == {2: 2, 3: 0, 4: 1}
+
+    assert [_ids_no_shard(tres, shard) for shard in range(3)] == [[3], [1, 4], [2]]
+    assert _ids_no_shard(tres, 2, coluna=StatusStep.id_usuario) == [2]
+    progresso = client.get("/roadmap?user_id=2").json()["roadmapSteps"]
+    assert [step["completed"] for step in progresso].count(True) == 0
+    assert client.get("/users/4").json()["email"] == "u4@shard.com"
+    assert planejar(tres) == {}
+
+
+def test_escritas_do_usuario_em_movimento_recebem_503(client, shards, monkeypatch, tmp_path):
+    tres = _roteador(tmp_path, 3)
+    _ativar(monkeypatch, tres)
+    tres.marcar_em_movimento([2], True)
+
+    toggle = client.put("/roadmap/steps/1/toggle?user_id=2", json={"status": "concluido"})
+    assert toggle.status_code == 503
+    assert "Retry-After" in toggle.headers
+    # Leitura continua na origem; outros usuários não são afetados
+    assert client.get("/users/2").status_code == 200
+    assert client.put("/roadmap/steps/1/toggle?user_id=3", json={"status": "concluido"}).status_code == 200
+
+    copias = []
+    original = rebalanceamento._copiar_usuario
+    monkeypatch.setattr(rebalanceamento, "_copiar_usuario", lambda *args: copias.append(args[1]) or original(*args))
+    rebalancear(tres, espera=0)
+
+    # Uma cópia por usuário, e ninguém fica bloqueado no fim
+    assert sorted(copias) == [2, 3, 4]
+    assert client.put("/roadmap/steps/1/toggle?user_id=2", json={"status": "concluido"}).status_code == 200
+
+
+def test_usuario_marcado_durante_a_requisicao_nao_grava_na_origem(client, shards, monkeypatch):
+    from app.models.database import Roadmap
+    from app.services import service
+
+    # A marcação chega enquanto o GET /roadmap espera a IA, depois de o get_db liberar a requisição
+    original = service.gerar_roadmap_ai
+
+    def gerar_e_marcar(usuario):
+        shards.marcar_em_movimento([2], True)
+        return original(usuario)
+
+    monkeypatch.setattr(service, "gerar_roadmap_ai", gerar_e_marcar)
+    response = client.get("/roadmap?user_id=2")
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert _ids_no_shard(shards, shards.shard_do_usuario(2), coluna=Roadmap.id_usuario) == []
+
+    shards.marcar_em_movimento([2], False)
+    monkeypatch.setattr(service, "gerar_roadmap_ai", original)
+    assert client.get("/roadmap?user_id=2").status_code == 200
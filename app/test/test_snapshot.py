@@ -0,0 +1,136 @@
+# tests/test_snapshot.py
+import pytest
+
+from app.services import ai_roadmap, snapshot
+from app.services.cache import CachePerfis, PerfilUsuario, obter_cache_perfis, obter_cache_roadmaps
+from app.services.snapshot import carregar_snapshot, salvar_snapshot
+
+
+def _perfil(user_id):
+    return PerfilUsuario(id=user_id, nome=f"Usuário {user_id}", email=f"u{user_id}@snap.com", profissao="Analista",
+                         nivel_experience="iniciante", tempo_estudo_semanal=5, interesses="Dados", qualidades="[]")
+
+
+@pytest.fixture
+def caches_vazios():
+    obter_cache_perfis().limpar()
+    obter_cache_roadmaps().limpar()
+    yield
+    obter_cache_perfis().limpar()
+    obter_cache_roadmaps().limpar()
+
+
+# ========= 1) Snapshot restaura perfis e roadmaps num cache frio =========
+def test_snapshot_restaura_caches(tmp_path, caches_vazios):
+    caminho = str(tmp_path / "cache.bin")
+    obter_cache_perfis().obter(1, lambda: _perfil(1))
+    obter_cache_perfis().importar([(2, _perfil(2), obter_cache_perfis().ttl + 1)])
+    roadmap = ai_roadmap._gerar_roadmap_mock(None)
+    obter_cache_roadmaps().guardar(ai_roadmap.chave_roadmap("prompt"), roadmap)
+
+    assert salvar_snapshot(caminho) == {"perfis": 1, "roadmaps": 1}
+
+    obter_cache_perfis().limpar()
+    obter_cache_roadmaps().limpar()
+    assert carregar_snapshot(caminho) == {"perfis": 1, "roadmaps": 1}
+
+    assert obter_cache_perfis().obter(1, lambda: None) == _perfil(1)
+    assert obter_cache_roadmaps().obter(ai_roadmap.chave_roadmap("prompt")) == roadmap
+
+
+# ========= 2) Outro modelo ou prompt descarta os roadmaps do snapshot =========
+def test_snapshot_de_outro_prompt_nao_restaura_roadmaps(tmp_path, caches_vazios, monkeypatch):
+    caminho = str(tmp_path / "cache.bin")
+    obter_cache_perfis().obter(1, lambda: _perfil(1))
+    obter_cache_roadmaps().guardar(ai_roadmap.chave_roadmap("prompt"), ai_roadmap._gerar_roadmap_mock(None))
+    salvar_snapshot(caminho)
+
+    obter_cache_perfis().limpar()
+    obter_cache_roadmaps().limpar()
+    monkeypatch.setattr(ai_roadmap, "GROQ_MODEL", "outro-modelo")
+
+    assert carregar_snapshot(caminho) == {"perfis": 1, "roadmaps": 0}
+    assert carregar_snapshot(str(tmp_path / "inexistente.bin")) == {"perfis": 0, "roadmaps": 0}
+
+
+# ========= 3) Perfis iguais reaproveitam a geração da IA =========
+def test_roadmap_gerado_vem_do_cache(caches_vazios, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "chave-teste")
+    chamadas = []
+    resposta = {"steps": [
+        {"id": str(o), "title": f"Passo {o}", "description": f"Descrição {o}", "order": o, "basedOn": ["profissao"]}
+        for o in range(1, 8)
+    ]}
+    monkeypatch.setattr(ai_roadmap, "_chamar_groq", lambda *a, **k: chamadas.append(1) or ai_roadmap.json.dumps(resposta))
+
+    primeiro = ai_roadmap.gerar_roadmap_ai(_perfil(1))
+    primeiro[0]["completed"] = True
+    segundo = ai_roadmap.gerar_roadmap_ai(_perfil(2))
+
+    assert len(chamadas) == 1
+    assert segundo[0]["completed"] is False
+    assert [s["title"] for s in segundo] == [f"Passo {o}" for o in range(1, 8)]
+
+
+# ========= 4) Vários workers somam os caches no mesmo snapshot =========
+def _worker(monkeypatch, cache):
+    # Cada worker tem o próprio cache de perfis; o arquivo é o mesmo
+    monkeypatch.setattr(snapshot, "obter_cache_perfis", lambda: cache)
+    return cache
+
+
+def test_snapshot_soma_os_caches_dos_workers(tmp_path, caches_vazios, monkeypatch):
+    caminho = str(tmp_path / "cache.bin")
+    # Worker A grava os perfis 1 e 2; o worker B, com os perfis 2 e 3, grava depois
+    worker_a = _worker(monkeypatch, CachePerfis())
+    worker_a.obter(1, lambda: _perfil(1))
+    worker_a.obter(2, lambda: _perfil(2))
+    salvar_snapshot(caminho)
+
+    worker_b = _worker(monkeypatch, CachePerfis())
+    worker_b.obter(2, lambda: _perfil(2))
+    worker_b.obter(3, lambda: _perfil(3))
+    obter_cache_roadmaps().guardar(ai_roadmap.chave_roadmap("prompt"), ai_roadmap._gerar_roadmap_mock(None))
+
+    assert salvar_snapshot(caminho) == {"perfis": 3, "roadmaps": 1}
+
+    # Próximo deploy: um worker novo com os caches vazios
+    _worker(monkeypatch, CachePerfis())
+    obter_cache_roadmaps().limpar()
+    assert carregar_snapshot(caminho) == {"perfis": 3, "roadmaps": 1}
+
+
+def test_perfil_invalidado_nao_volta_do_snapshot(tmp_path, caches_vazios, monkeypatch):
+    caminho = str(tmp_path / "cache.bin")
+    worker_a = _worker(monkeypatch, CachePerfis())
+    worker_a.obter(1, lambda: _perfil(1))
+    worker_a.obter(2, lambda: _perfil(2))
+    salvar_snapshot(caminho)
+
+    # O worker B também tinha o perfil 1, e o usuário foi alterado nele
+    worker_b = _worker(monkeypatch, CachePerfis())
+    worker_b.obter(1, lambda: _perfil(1))
+    worker_b.invalidar([1], propagar=False)
+
+    assert salvar_snapshot(caminho) == {"perfis": 1, "roadmaps": 0}
+    assert [user_id for user_id, _, _ in snapshot._ler_snapshot(caminho)[0]] == [2]
+
+    # Confirmado no arquivo, o id deixa de ser descartado nas próximas gravações
+    assert worker_b.invalidacoes_pendentes() == (0, set())
+
+
+# ========= 5) Snapshot corrompido não impede o start =========
+def test_snapshot_corrompido_e_ignorado(tmp_path, caches_vazios, caplog):
+    caminho = tmp_path / "cache.bin"
+    obter_cache_perfis().obter(1, lambda: _perfil(1))
+    salvar_snapshot(str(caminho))
+    # Truncado no meio do JSON do perfil (ex.: disco cheio durante uma cópia manual)
+    caminho.write_bytes(caminho.read_bytes()[:-10])
+
+    obter_cache_perfis().limpar()
+    assert carregar_snapshot(str(caminho)) == {"perfis": 0, "roadmaps": 0}
+    assert "Snapshot de cache ignorado" in caplog.text
+
+    # O próximo snapshot substitui o arquivo inválido
+    obter_cache_perfis().obter(2, lambda: _perfil(2))
+    assert salvar_snapshot(str(caminho)) == {"perfis": 1, "roadmaps": 0}
@@ -0,0 +1,47 @@
+# tests/test_startup.py
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import main
+from app.login import create_access_token
+from app.models.database import Steps, criar_steps_padrao
+from app.test.conftest import STATEMENTS_DE_SAVEPOINT, TestingSessionLocal, engine_test
+
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@fiap.com', 'role': 'admin'})}"}
+
+
+# ========= 1) Seed dos passos padrão num único statement =========
+def test_steps_padrao_num_unico_insert_idempotente(db_session):
+    statements = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(STATEMENTS_DE_SAVEPOINT):
+            statements.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", registrar)
+    try:
+        criar_steps_padrao(db_session)
+    finally:
+        event.remove(engine_test, "before_cursor_execute", registrar)
+
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT INTO")
+    assert db_session.query(Steps).count() == 7
+
+
+# ========= 2) Lifespan com relatório de startup =========
+def test_lifespan_inicializa_e_reporta_tempos(monkeypatch):
+    monkeypatch.setattr(main, "create_tables", lambda: None)
+    monkeypatch.setattr(main, "SessionLocal", TestingSessionLocal)
+    # O banco de teste é uma conexão única em memória: não há pool para aquecer
+    monkeypatch.setattr(main, "aquecer_pool", lambda bind, conexoes: None)
+    monkeypatch.setattr(main, "aquecer_cliente_http", lambda: None)
+    monkeypatch.setattr(main, "indexar_em_background", lambda fabrica: None)
+
+    with TestClient(main.app) as client:
+        response = client.get("/admin/startup", headers=ADMIN_HEADERS)
+
+    relatorio = response.json()
+    assert set(relatorio["fases_ms"]) == {"imports", "create_tables", "steps_padrao", "pool_db", "snapshot_caches"}
+    assert relatorio["total_ms"] >= relatorio["fases_ms"]["imports"]
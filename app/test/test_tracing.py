@@ -0,0 +1,86 @@
+# tests/test_tracing.py
+import json
+
+from app import tracing
+from app.test.conftest import STATEMENTS_DE_SAVEPOINT
+
+
+def _spans_exportados(caminho, trace_id):
+    # A fila do exportador é global: filtra só o trace da requisição do teste
+    tracing.obter_exportador().descarregar()
+    with open(caminho, encoding="utf-8") as f:
+        return [span for span in map(json.loads, f) if span["trace_id"] == trace_id]
+
+
+# ========= 1) Hierarquia rota -> service -> SQL =========
+def test_requisicao_amostrada_gera_spans_por_camada(client, mock_usuarios, monkeypatch, tmp_path):
+    caminho = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(caminho))
+
+    response = client.get(f"/roadmap?user_id={mock_usuarios[0].id}")
+
+    assert response.status_code == 200
+    spans = _spans_exportados(caminho, response.headers["traceparent"].split("-")[1])
+    por_id = {s["span_id"]: s for s in spans}
+    raiz = next(s for s in spans if s["parent_id"] is None)
+    assert raiz["name"] == "GET /roadmap"
+    assert raiz["attributes"]["http.status_code"] == 200
+    assert response.headers["traceparent"] == f"00-{raiz['trace_id']}-{raiz['span_id']}-01"
+
+    # As três fases do GET /roadmap (banco, IA no bulkhead, banco) ficam penduradas na rota
+    fases = [next(s for s in spans if s["name"] == f"Service.{nome}")
+             for nome in ("preparar_roadmap", "chamar_ia_roadmap", "concluir_roadmap")]
+    assert [fase["parent_id"] for fase in fases] == [raiz["span_id"]] * 3
+
+    sql = [
+        s for s in spans
+        if s["name"].startswith("SQL ") and not s["attributes"]["db.statement"].startswith(STATEMENTS_DE_SAVEPOINT)
+    ]
+    assert sql
+    # Todo SQL fica pendurado em algum método do Service, e todos os spans no mesmo trace
+    assert all(por_id[s["parent_id"]]["name"].startswith("Service.") for s in sql)
+    assert {s["trace_id"] for s in spans} == {raiz["trace_id"]}
+
+
+# ========= 2) Amostragem =========
+def test_sem_amostragem_nao_gera_spans(client, mock_usuarios, monkeypatch, tmp_path):
+    caminho = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "anteriores.jsonl"))
+    tracing.obter_exportador().descarregar()
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(caminho))
+
+    response = client.get(f"/users/{mock_usuarios[0].id}")
+
+    assert "traceparent" not in response.headers
+    assert tracing.obter_exportador().descarregar() == []
+    assert not caminho.exists()
+
+
+def test_traceparent_de_quem_chama_continua_o_trace(client, mock_usuarios, monkeypatch, tmp_path):
+    caminho = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(caminho))
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+    client.get(f"/users/{mock_usuarios[0].id}", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+
+    spans = _spans_exportados(caminho, trace_id)
+    raiz = next(s for s in spans if s["name"] == "GET /users/{user_id}")
+    assert raiz["trace_id"] == trace_id
+    assert raiz["parent_id"] == parent_id
+
+
+def test_traceparent_invalido_cai_na_amostragem(client, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    invalidos = [
+        "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-zz",
+        "00-4bf92f3577b34da6a3ce929d0e0e473g-00f067aa0ba902b7-01",
+        "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+        "lixo",
+    ]
+
+    for traceparent in invalidos:
+        response = client.get("/", headers={"traceparent": traceparent})
+        assert response.status_code == 200
+        assert "traceparent" not in response.headers
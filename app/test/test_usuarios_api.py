@@ -70,3 +70,59 @@ def test_deletar_usuario(client, mock_usuarios):
     # Tenta buscar depois → 404
     response_get = client.get(f"/users/{usuario.id}")
     assert response_get.status_code == 404
+
+
+# ========= 5) DELETE remove os dados dependentes =========
+def test_deletar_usuario_remove_progresso(client, mock_usuarios, db_session):
+    from app.models.database import StatusStep, ProgressoRoadmap
+
+    usuario = mock_usuarios[1]
+    client.put(f"/roadmap/steps/1/toggle?user_id={usuario.id}", json={"status": "concluido"})
+
+    response = client.delete(f"/users/{usuario.id}")
+
+    assert response.status_code == 200
+    assert db_session.query(StatusStep).filter(StatusStep.id_usuario == usuario.id).count() == 0
+    assert db_session.get(ProgressoRoadmap, usuario.id) is None
+
+
+# ========= 6) Email duplicado barrado pela constraint =========
+def test_criar_usuario_email_duplicado(client, mock_usuarios):
+    payload = {
+        "name": "Outro João",
+        "email": mock_usuarios[0].email.upper(),
+        "currentProfession": "Estudante",
+        "experienceLevel": "iniciante",
+        "weeklyStudyTime": 3,
+        "interests": "Backend",
+        "qualities": []
+    }
+
+    response = client.post("/users", json=payload)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email já cadastrado no sistema"
+
+
+# ========= 7) Escritas em um único statement =========
+def test_update_usuario_em_um_statement(client, mock_usuarios):
+    from sqlalchemy import event
+    from app.test.conftest import STATEMENTS_DE_SAVEPOINT, engine_test
+
+    usuario = mock_usuarios[0]
+    statements = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(STATEMENTS_DE_SAVEPOINT):
+            statements.append(statement.split()[0].upper())
+
+    event.listen(engine_test, "before_cursor_execute", registrar)
+    try:
+        response = client.put(f"/users/{usuario.id}", json={"name": "João Pedro"})
+    finally:
+        event.remove(engine_test, "before_cursor_execute", registrar)
+
+    # Troca de nome não mexe no agregado: só o UPDATE (a de profissão também move os status)
+    assert response.status_code == 200
+    assert response.json()["name"] == "João Pedro"
+    assert statements == ["UPDATE"]
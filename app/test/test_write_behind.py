@@ -0,0 +1,79 @@
+# tests/test_write_behind.py
+from app.models.database import StatusStep, StatusStepEnum
+from app.services import write_behind
+from app.services.service import Service
+from app.test.conftest import TestingSessionLocal
+
+
+def _aplicar_lote(lote):
+    db = TestingSessionLocal()
+    try:
+        return Service.aplicar_toggles_em_lote(lote, db)
+    finally:
+        db.close()
+
+
+def test_toggle_bufferizado_visivel_antes_do_flush(client, mock_usuarios, db_session, tmp_path, monkeypatch):
+    buffer = write_behind.BufferToggles(str(tmp_path / "toggles.log"), _aplicar_lote)
+    monkeypatch.setattr(write_behind, "_buffer", buffer)
+    usuario = mock_usuarios[0]
+
+    client.put(f"/roadmap/steps/2/toggle?user_id={usuario.id}", json={"status": "em_andamento"})
+    client.put(f"/roadmap/steps/2/toggle?user_id={usuario.id}", json={"status": "concluido"})
+
+    # Ainda nada no banco, mas a leitura já enxerga o toggle pendente
+    assert db_session.query(StatusStep).filter(StatusStep.id_usuario == usuario.id).count() == 0
+    steps = client.get(f"/roadmap?user_id={usuario.id}").json()["roadmapSteps"]
+    assert steps[1]["completed"] is True
+
+    # Os dois toggles viram uma única escrita
+    assert buffer.descarregar() == 1
+    status = db_session.query(StatusStep).filter(StatusStep.id_usuario == usuario.id).one()
+    assert status.status == StatusStepEnum.CONCLUIDO
+    assert buffer.total_pendentes() == 0
+    with open(buffer.caminho_log, encoding="utf-8") as f:
+        assert f.read() == ""
+
+
+def test_toggles_confirmados_sobrevivem_a_reinicio(mock_usuarios, db_session, tmp_path):
+    usuario = mock_usuarios[1]
+    caminho = str(tmp_path / "toggles.log")
+
+    buffer = write_behind.BufferToggles(caminho, _aplicar_lote)
+    buffer.registrar(usuario.id, 4, StatusStepEnum.CONCLUIDO)
+    # Simula queda: o processo morre sem flush (a trava do log cai junto) e deixa uma linha pela metade
+    with open(buffer.caminho_log, "a", encoding="utf-8") as f:
+        f.write('{"u": 1, "s"')
+    buffer._log.close()
+
+    recuperado = write_behind.BufferToggles(caminho, _aplicar_lote)
+
+    assert recuperado.pendentes_usuario(usuario.id) == {4: StatusStepEnum.CONCLUIDO}
+    assert recuperado.descarregar() == 1
+    assert db_session.query(StatusStep).filter(StatusStep.id_usuario == usuario.id).count() == 1
+
+
+def test_worker_adota_log_de_worker_encerrado(mock_usuarios, db_session, tmp_path):
+    joao, maria = mock_usuarios
+    caminho = str(tmp_path / "toggles.log")
+
+    morto = write_behind.BufferToggles(caminho, _aplicar_lote, identificador="101")
+    vivo = write_behind.BufferToggles(caminho, _aplicar_lote, identificador="102")
+    morto.registrar(joao.id, 2, StatusStepEnum.CONCLUIDO)
+    vivo.registrar(maria.id, 3, StatusStepEnum.CONCLUIDO)
+    morto._log.close()
+
+    novo = write_behind.BufferToggles(caminho, _aplicar_lote, identificador="103")
+
+    # Só o log sem dono é adotado; o do worker vivo continua sendo dele
+    assert novo.pendentes_usuario(joao.id) == {2: StatusStepEnum.CONCLUIDO}
+    assert novo.pendentes_usuario(maria.id) == {}
+    assert not (tmp_path / "toggles.log.101").exists()
+    assert vivo.pendentes_usuario(maria.id) == {3: StatusStepEnum.CONCLUIDO}
+
+    assert novo.descarregar() == 1
+    assert vivo.descarregar() == 1
+    novo.parar()
+    vivo.parar()
+    assert db_session.query(StatusStep).count() == 2
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,274 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+# Fração das requisições rastreadas (0 desliga o tracing; 1 rastreia todas)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# "arquivo" grava JSON lines em TRACE_FILE; "otlp" envia para um coletor OTLP/HTTP em TRACE_OTLP_ENDPOINT
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "arquivo")
+TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+SERVICE_NAME = "reskill-api"
+# versão-trace_id-parent_id-flags, em hexadecimal minúsculo (W3C Trace Context)
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-[0-9a-f]{32}-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+class Span:
+    __slots__ = ("nome", "trace_id", "span_id", "parent_id", "inicio_ns", "fim_ns", "atributos", "thread")
+
+    def __init__(self, nome: str, trace_id: str, parent_id: Optional[str], atributos: Dict[str, Any]):
+        self.nome = nome
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.inicio_ns = time.time_ns()
+        self.fim_ns: Optional[int] = None
+        self.atributos = atributos
+        self.thread = threading.get_ident()
+
+    @property
+    def duracao_ms(self) -> float:
+        return ((self.fim_ns or time.time_ns()) - self.inicio_ns) / 1e6
+
+    def para_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.nome,
+            "start_ns": self.inicio_ns,
+            "end_ns": self.fim_ns,
+            "duration_ms": round(self.duracao_ms, 3),
+            "attributes": self.atributos,
+        }
+
+
+_span_atual: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span_atual", default=None)
+# Ganchos chamados a cada span aberto (o profiler usa para saber em qual thread a requisição está)
+_ao_abrir_span: List = []
+
+
+@contextmanager
+def span(nome: str, raiz: bool = False, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+         **atributos):
+    """
+    Abre um span filho do span corrente. Fora de uma requisição amostrada não faz nada,
+    a não ser que `raiz=True` (usado pelo middleware ao decidir a amostragem).
+    """
+    pai = _span_atual.get()
+    if pai is None and not raiz:
+        yield None
+        return
+
+    atual = Span(
+        nome,
+        trace_id or (pai.trace_id if pai else f"{random.getrandbits(128):032x}"),
+        parent_id or (pai.span_id if pai else None),
+        atributos,
+    )
+    token = _span_atual.set(atual)
+    for gancho in _ao_abrir_span:
+        gancho(atual)
+    try:
+        yield atual
+    except Exception as e:
+        atual.atributos["error"] = type(e).__name__
+        raise
+    finally:
+        atual.fim_ns = time.time_ns()
+        _span_atual.reset(token)
+        _exportador.enfileirar(atual)
+
+
+def span_atual() -> Optional[Span]:
+    return _span_atual.get()
+
+
+def rastrear(nome: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _span_atual.get() is None:
+                return func(*args, **kwargs)
+            with span(nome):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrumentar_metodos(cls) -> None:
+    # Um span por método estático da classe (ex.: Service.get_roadmap), incluindo chamadas internas
+    for nome, atributo in list(vars(cls).items()):
+        if isinstance(atributo, staticmethod):
+            setattr(cls, nome, staticmethod(rastrear(f"{cls.__name__}.{nome}")(atributo.__func__)))
+
+
+def amostrar(traceparent: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Decide se a requisição é rastreada. Um `traceparent` (W3C) amostrado de quem chamou é respeitado
+    e continua o mesmo trace; senão vale TRACE_SAMPLE_RATE. Um cabeçalho inválido é ignorado.
+    """
+    if traceparent and TRACEPARENT.match(traceparent):
+        versao, trace_id, parent_id, flags = traceparent.split("-")
+        # ids só com zeros e a versão ff são inválidos pela especificação
+        if versao != "ff" and trace_id != "0" * 32 and parent_id != "0" * 16:
+            if int(flags, 16) & 1:
+                return {"trace_id": trace_id, "parent_id": parent_id}
+            return None
+
+    if TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+        return {}
+    return None
+
+
+async def middleware_tracing(request, call_next):
+    contexto = amostrar(request.headers.get("traceparent"))
+    if contexto is None:
+        return await call_next(request)
+
+    with span(f"{request.method} {request.url.path}", raiz=True, **contexto,
+              **{"http.method": request.method, "http.target": request.url.path}) as raiz:
+        response = await call_next(request)
+        rota = request.scope.get("route")
+        if rota is not None:
+            raiz.nome = f"{request.method} {rota.path}"
+            raiz.atributos["http.route"] = rota.path
+        raiz.atributos["http.status_code"] = response.status_code
+        response.headers["traceparent"] = f"00-{raiz.trace_id}-{raiz.span_id}-01"
+        return response
+
+
+# ----------------- SQL -----------------
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_inicio(conn, cursor, statement, parameters, context, executemany):
+    if _span_atual.get() is None:
+        return
+    gerenciador = span(f"SQL {statement.split(None, 1)[0].upper()}", **{"db.statement": statement[:500]})
+    gerenciador.__enter__()
+    conn.info.setdefault("_spans_sql", []).append(gerenciador)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_fim(conn, cursor, statement, parameters, context, executemany):
+    spans_sql = conn.info.get("_spans_sql")
+    if spans_sql:
+        spans_sql.pop().__exit__(None, None, None)
+
+
+@event.listens_for(Engine, "handle_error")
+def _sql_erro(contexto):
+    spans_sql = contexto.connection.info.get("_spans_sql") if contexto.connection is not None else None
+    if spans_sql:
+        erro = contexto.original_exception
+        spans_sql.pop().__exit__(type(erro), erro, None)
+
+
+# ----------------- EXPORTAÇÃO -----------------
+
+class ExportadorSpans:
+    """Exporta em lote numa thread própria, fora do caminho da requisição."""
+
+    def __init__(self):
+        self._fila: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def enfileirar(self, span_finalizado: Span) -> None:
+        self._iniciar()
+        try:
+            self._fila.put_nowait(span_finalizado)
+        except queue.Full:
+            # Sob sobrecarga, perder spans é melhor do que atrasar requisições
+            pass
+
+    def descarregar(self) -> List[Span]:
+        lote = []
+        while True:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        if lote:
+            try:
+                self._exportar(lote)
+            except Exception:
+                logger.exception("Falha ao exportar spans")
+        return lote
+
+    def _iniciar(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="exportador-spans", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(1)
+            self.descarregar()
+
+    def _exportar(self, lote: List[Span]) -> None:
+        if TRACE_EXPORTER == "otlp":
+            import requests
+
+            requests.post(TRACE_OTLP_ENDPOINT, json=_para_otlp(lote), timeout=5)
+            return
+
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            for item in lote:
+                f.write(json.dumps(item.para_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+def _para_otlp(lote: List[Span]) -> Dict[str, Any]:
+    def atributo(chave, valor):
+        if isinstance(valor, bool):
+            return {"key": chave, "value": {"boolValue": valor}}
+        if isinstance(valor, int):
+            return {"key": chave, "value": {"intValue": str(valor)}}
+        return {"key": chave, "value": {"stringValue": str(valor)}}
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [atributo("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [
+                    {
+                        "traceId": item.trace_id,
+                        "spanId": item.span_id,
+                        "parentSpanId": item.parent_id or "",
+                        "name": item.nome,
+                        "kind": 2 if item.parent_id is None else 1,
+                        "startTimeUnixNano": str(item.inicio_ns),
+                        "endTimeUnixNano": str(item.fim_ns),
+                        "attributes": [atributo(k, v) for k, v in item.atributos.items()],
+                    }
+                    for item in lote
+                ],
+            }],
+        }]
+    }
+
+
+_exportador = ExportadorSpans()
+
+
+def obter_exportador() -> ExportadorSpans:
+    return _exportador
@@ -0,0 +1,73 @@
+"""
+Mede CPU gasta versus bytes economizados pela compressão de respostas típicas.
+
+    python -m benchmarks.bench_compressao --n 2000
+
+Payloads: o RoadmapResponse do mock, um roadmap com descrições longas como as geradas pela IA
+e uma página de 100 usuários em NDJSON. brotli e zstd entram se os pacotes estiverem instalados.
+"""
+import argparse
+import json
+import time
+
+from app.compressao import CODIFICACOES, _brotli, _gzip, _zstd
+from app.schemas.pydantic import RoadmapResponse
+from app.services.ai_roadmap import _gerar_roadmap_mock
+
+
+NIVEIS = {"gzip": (_gzip, [1, 6, 9]), "br": (_brotli, [1, 4, 6, 11]), "zstd": (_zstd, [1, 3, 9, 19])}
+
+
+def _payloads() -> dict:
+    steps = _gerar_roadmap_mock(None)
+    mock = RoadmapResponse(roadmapSteps=steps).model_dump_json().encode()
+
+    detalhado = [
+        {**step, "description": " ".join(
+            f"{step['description']} com foco em projetos práticos, leitura de documentação oficial e revisão "
+            f"semanal do progresso (semana {semana})." for semana in range(1, 6)
+        )}
+        for step in steps
+    ]
+    ia = RoadmapResponse(roadmapSteps=detalhado).model_dump_json().encode()
+
+    usuarios = "".join(
+        json.dumps({
+            "id": i, "nome": f"Usuário {i}", "email": f"usuario{i}@example.com", "profissao": "Analista de Dados",
+            "nivel_experience": "intermediario", "tempo_estudo_semanal": 6.0, "interesses": "Python, SQL, Cloud",
+            "qualidades": '["Comunicativo", "Curioso"]', "atualizado_em": "2025-11-20T10:00:00",
+        }, ensure_ascii=False) + "\n"
+        for i in range(100)
+    ).encode()
+
+    return {"roadmap mock": mock, "roadmap IA": ia, "100 usuários": usuarios}
+
+
+def medir(corpo: bytes, fabrica, nivel: int, n: int):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        compressor = fabrica(nivel)
+        comprimido = compressor.comprimir(corpo) + compressor.finalizar()
+    return len(comprimido), (time.perf_counter() - inicio) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    for nome, corpo in _payloads().items():
+        print(f"\n{nome}: {len(corpo)} bytes")
+        for codificacao in CODIFICACOES:
+            fabrica, niveis = NIVEIS[codificacao]
+            if fabrica(niveis[0]) is None:
+                print(f"  {codificacao:<5} (pacote não instalado)")
+                continue
+            for nivel in niveis:
+                tamanho, micros = medir(corpo, fabrica, nivel, args.n)
+                print(f"  {codificacao:<5} nível {nivel:>2}  {tamanho:>7} bytes  {tamanho / len(corpo):>6.1%}"
+                      f"  {micros:>9.1f} µs/op  {(len(corpo) - tamanho) / micros:>8.1f} bytes poupados/µs")
+
+
+if __name__ == "__main__":
+    main()
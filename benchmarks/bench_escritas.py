@@ -0,0 +1,100 @@
+"""
+Compara os caminhos de escrita de usuário antes e depois do INSERT/UPDATE ... RETURNING.
+
+    python -m benchmarks.bench_escritas --n 2000
+
+Roda num SQLite temporário e mostra round-trips (statements enviados ao banco) e tempo por operação.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, Usuario, qualidades_to_json
+from app.schemas.pydantic import UsuarioCreate, UsuarioUpdate
+from app.services.service import Service
+
+
+def criar_legado(dados: UsuarioCreate, db) -> None:
+    # Caminho anterior: SELECT de unicidade, INSERT, commit e refresh
+    if db.query(Usuario).filter(Usuario.email == dados.email.lower().strip()).first() is not None:
+        raise ValueError("Email já cadastrado no sistema")
+
+    usuario_db = Usuario(
+        nome=dados.name.strip(),
+        email=dados.email.lower().strip(),
+        senha_hash="hash_fake",
+        profissao=dados.currentProfession,
+        nivel_experience=dados.experienceLevel,
+        tempo_estudo_semanal=dados.weeklyStudyTime,
+        interesses=dados.interests or "",
+        qualidades=qualidades_to_json(dados.qualities),
+    )
+    db.add(usuario_db)
+    db.commit()
+    db.refresh(usuario_db)
+
+
+def atualizar_legado(user_id: int, dados: UsuarioUpdate, db) -> None:
+    # Caminho anterior: SELECT, UPDATE, commit e refresh
+    usuario_db = db.query(Usuario).filter(Usuario.id == user_id).first()
+    usuario_db.nome = dados.name.strip()
+    db.commit()
+    db.refresh(usuario_db)
+
+
+def _payload(prefixo: str, i: int) -> UsuarioCreate:
+    return UsuarioCreate(
+        name=f"Usuário {i}",
+        email=f"{prefixo}{i}@bench.com",
+        currentProfession="Analista",
+        experienceLevel="iniciante",
+        weeklyStudyTime=5,
+        interests="Dados",
+        qualities=["Dedicado"],
+    )
+
+
+def medir(nome: str, Session, contador: list, n: int, operacao) -> None:
+    contador[0] = 0
+    inicio = time.perf_counter()
+    for i in range(n):
+        db = Session()
+        try:
+            operacao(i, db)
+        finally:
+            db.close()
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<28} {contador[0] / n:>6.1f} statements/op {duracao / n * 1e6:>10.1f} µs/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(), "bench_escritas.db")
+    engine = create_engine(f"sqlite:///{caminho}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    contador = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        contador[0] += 1
+
+    n = args.n
+    medir("create legado", Session, contador, n, lambda i, db: criar_legado(_payload("legado", i), db))
+    medir("create RETURNING", Session, contador, n, lambda i, db: Service.create_user(_payload("novo", i), db))
+
+    update = UsuarioUpdate(name="Nome Atualizado")
+    medir("update legado", Session, contador, n, lambda i, db: atualizar_legado(i + 1, update, db))
+    medir("update RETURNING", Session, contador, n, lambda i, db: Service.update_user(n + i + 1, update, db))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Mede a busca de pares de estudo (GET /users/{id}/peers) numa matriz de 1M de usuários.
+
+    python -m benchmarks.bench_pares --n 1000000 --consultas 50
+
+Gera perfis sintéticos (profissões, interesses e qualidades sorteados de vocabulários fixos),
+monta o .npy mapeado em memória num diretório temporário e mostra: tempo de build, tamanho do
+arquivo, latência do top-k (p50/p99) e o custo de uma atualização incremental. Requer numpy.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from app.models.database import qualidades_to_json
+from app.services.pares import IndicePares
+
+
+PROFISSOES = ["Analista de Dados", "Cientista de Dados", "Operador de Caixa", "Designer", "Professor",
+              "Desenvolvedor Backend", "Desenvolvedor Frontend", "Enfermeiro", "Vendedor", "Gerente de Projetos"]
+INTERESSES = ["Python", "SQL", "Estatística", "UX", "Figma", "Cloud", "Gestão", "Marketing", "Finanças",
+              "Machine Learning", "JavaScript", "Liderança", "Saúde", "Educação", "Vendas"]
+QUALIDADES = ["Curioso", "Dedicado", "Proativo", "Comunicativo", "Organizado", "Criativo", "Paciente"]
+
+
+def _perfil(user_id: int, rng: random.Random) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=user_id,
+        profissao=rng.choice(PROFISSOES),
+        interesses=", ".join(rng.sample(INTERESSES, rng.randint(1, 4))),
+        qualidades=qualidades_to_json(rng.sample(QUALIDADES, rng.randint(0, 3))),
+        tempo_estudo_semanal=rng.randint(1, 20),
+    )
+
+
+def _lotes(n: int, lote: int, rng: random.Random):
+    for inicio in range(1, n + 1, lote):
+        yield [_perfil(user_id, rng) for user_id in range(inicio, min(inicio + lote, n + 1))]
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--consultas", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensoes", type=int, default=128)
+    parser.add_argument("--bloco", type=int, default=65536)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as pasta:
+        indice = IndicePares(os.path.join(pasta, "pares.npy"), dimensoes=args.dimensoes, bloco=args.bloco)
+
+        inicio = time.perf_counter()
+        indice.construir(_lotes(args.n, 10000, rng), args.n)
+        build = time.perf_counter() - inicio
+        tamanho_mb = os.path.getsize(indice.caminho) / 1024 / 1024
+        print(f"build: {args.n} usuários em {build:.1f}s ({args.n / build:,.0f}/s) | arquivo {tamanho_mb:,.0f} MB")
+
+        # Primeira consulta traz as páginas para o page cache; as seguintes medem o caso quente
+        indice.vizinhos(1, args.k)
+        tempos = []
+        for _ in range(args.consultas):
+            user_id = rng.randint(1, args.n)
+            antes = time.perf_counter()
+            indice.vizinhos(user_id, args.k)
+            tempos.append((time.perf_counter() - antes) * 1000)
+        print(f"top-{args.k}: p50 {_percentil(tempos, 0.5):.1f} ms | p99 {_percentil(tempos, 0.99):.1f} ms "
+              f"({args.consultas} consultas)")
+
+        antes = time.perf_counter()
+        for user_id in range(1, 101):
+            indice.atualizar([_perfil(user_id, rng)])
+        print(f"atualização incremental: {(time.perf_counter() - antes) * 10:.2f} ms por usuário")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Compara a vazão do setup atual com o ponto de entrada de produção.
+
+    python -m benchmarks.bench_servidor --segundos 15 --conexoes 64
+
+"atual": `uvicorn app.main:app` num processo, mais o app de login noutro processo (o `uvicorn.run`
+do login.py). "producao": `python -m app.server`, com gunicorn, N workers, preload e /auth montado.
+Cada conexão do cliente é keep-alive e alterna GET /users/{id} e POST de login. Usa um SQLite
+temporário e requer uvicorn e gunicorn instalados, e PUBSUB_URL (Redis) para os vários workers.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+LOGIN = json.dumps({"email": "aluno@fiap.com", "password": "123456"})
+USUARIO = json.dumps({
+    "name": "Usuário Bench", "email": "bench@servidor.com", "currentProfession": "Analista",
+    "experienceLevel": "iniciante", "weeklyStudyTime": 5, "interests": "Dados", "qualities": [],
+})
+
+
+def _subir(comando, env, porta):
+    processo = subprocess.Popen(comando, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=1)
+            conexao.request("GET", "/")
+            conexao.getresponse().read()
+            return processo
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError(f"Servidor não subiu: {' '.join(comando)}")
+
+
+def _carga(porta_api, porta_login, caminho_login, user_id, segundos, conexoes):
+    latencias = []
+    erros = [0]
+    lock = threading.Lock()
+    fim = time.time() + segundos
+
+    def cliente():
+        api = http.client.HTTPConnection("127.0.0.1", porta_api)
+        login = api if porta_login == porta_api else http.client.HTTPConnection("127.0.0.1", porta_login)
+        locais = []
+        i = 0
+        while time.time() < fim:
+            antes = time.perf_counter()
+            try:
+                if i % 2:
+                    login.request("POST", caminho_login, body=LOGIN, headers={"Content-Type": "application/json"})
+                    resposta = login.getresponse()
+                else:
+                    api.request("GET", f"/users/{user_id}")
+                    resposta = api.getresponse()
+                resposta.read()
+                if resposta.status >= 400:
+                    erros[0] += 1
+            except (OSError, http.client.HTTPException):
+                erros[0] += 1
+                api = http.client.HTTPConnection("127.0.0.1", porta_api)
+                login = api if porta_login == porta_api else http.client.HTTPConnection("127.0.0.1", porta_login)
+            locais.append((time.perf_counter() - antes) * 1000)
+            i += 1
+        with lock:
+            latencias.extend(locais)
+
+    threads = [threading.Thread(target=cliente) for _ in range(conexoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencias.sort()
+    return {
+        "req_s": len(latencias) / segundos,
+        "p50": latencias[len(latencias) // 2] if latencias else 0.0,
+        "p99": latencias[int(len(latencias) * 0.99)] if latencias else 0.0,
+        "erros": erros[0],
+    }
+
+
+def _criar_usuario(porta) -> int:
+    conexao = http.client.HTTPConnection("127.0.0.1", porta)
+    conexao.request("POST", "/users", body=USUARIO, headers={"Content-Type": "application/json"})
+    resposta = conexao.getresponse()
+    dados = json.loads(resposta.read())
+    return dados["id"] if "id" in dados else 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segundos", type=int, default=15)
+    parser.add_argument("--conexoes", type=int, default=64)
+    args = parser.parse_args()
+    if not os.getenv("PUBSUB_URL"):
+        # O app.server com vários workers não sobe sem o pub/sub (ver gunicorn_conf.verificar_workers)
+        raise SystemExit("Defina PUBSUB_URL (Redis) para o modo producao, que sobe um worker por núcleo")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{pasta}/bench.db", "WEB_ACCESS_LOG": "",
+               "RATE_LIMIT_ATIVO": "0"}
+
+        api = _subir([sys.executable, "-m", "uvicorn", "app.main:app", "--port", "8101", "--log-level", "warning"],
+                     env, 8101)
+        login = _subir([sys.executable, "-m", "uvicorn", "app.login:app", "--port", "8102", "--log-level", "warning"],
+                       env, 8102)
+        try:
+            user_id = _criar_usuario(8101)
+            atual = _carga(8101, 8102, "/", user_id, args.segundos, args.conexoes)
+        finally:
+            api.terminate()
+            login.terminate()
+            api.wait()
+            login.wait()
+
+        producao = _subir([sys.executable, "-m", "app.server"], {**env, "WEB_BIND": "127.0.0.1:8103"}, 8103)
+        try:
+            novo = _carga(8103, 8103, "/auth/", user_id, args.segundos, args.conexoes)
+        finally:
+            producao.terminate()
+            producao.wait()
+
+    for nome, r in (("atual (2 processos)", atual), ("producao (app.server)", novo)):
+        print(f"{nome:24} {r['req_s']:8.0f} req/s | p50 {r['p50']:6.1f} ms | p99 {r['p99']:6.1f} ms "
+              f"| erros {r['erros']}")
+
+
+if __name__ == "__main__":
+    main()